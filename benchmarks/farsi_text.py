@@ -0,0 +1,92 @@
+"""Benchmarks reshaping Persian lyrics for PDFs
+
+Uses the Persian translation album in tests/data. Like the bot,
+it needs the environment variables read by geniust.constants.
+
+Usage:
+    python -m benchmarks.farsi_text [--rounds N]
+"""
+import argparse
+import json
+import pathlib
+import timeit
+from typing import Any, Dict, List
+
+from bidi.algorithm import get_display
+from rtl import reshaper
+
+from geniust.functions.album_conversion import pdf
+
+DATA_PATH = pathlib.Path(__file__).parent.parent.resolve() / "tests" / "data"
+
+
+def load_album() -> Dict[str, Any]:
+    with open(DATA_PATH / "persian_album.json", encoding="utf8") as f:
+        return json.load(f)
+
+
+def album_lines(album: Dict[str, Any]) -> List[str]:
+    return [
+        line
+        for track in album["tracks"]
+        for line in track["song"]["lyrics"].split("<br/>\n")
+    ]
+
+
+def uncached(lines: List[str]) -> None:
+    """How lines were reshaped before memoizing the words"""
+    for line in lines:
+        if reshaper.has_arabic_letters(line):
+            get_display(reshaper.reshape(line))
+
+
+def cached(lines: List[str]) -> None:
+    for line in lines:
+        pdf.get_farsi_text(line)
+
+
+def cold_cached(lines: List[str]) -> None:
+    pdf.reshape_word.cache_clear()
+    cached(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="Number of rounds.")
+    args = parser.parse_args()
+
+    album = load_album()
+    lines = album_lines(album)
+    with open(DATA_PATH / "cover_art.jpg", "rb") as f:
+        cover_art = f.read()
+    writer = pdf.PDFAlbumWriter(
+        album, {"lyrics_lang": "English + Non-English", "include_annotations": True}
+    )
+    for track in album["tracks"]:
+        writer.add_track(track)
+    payload = {
+        "name": album["name"],
+        "artist": album["artist"]["name"],
+        "description": album["description_annotation"]["annotations"][0]["body"][
+            "html"
+        ],
+        "cover_art": cover_art,
+        "tracks": writer.tracks,
+    }
+
+    print(f"{len(lines)} lines, {args.rounds} rounds")
+    for name, func in (
+        ("uncached", uncached),
+        ("cached (cold)", cold_cached),
+        ("cached (warm)", cached),
+    ):
+        seconds = timeit.timeit(lambda: func(lines), number=args.rounds)
+        print(f"{name:>15}: {seconds / args.rounds * 1000:8.2f} ms per album")
+
+    pdf.register_fonts()
+    seconds = timeit.timeit(lambda: pdf.build_pdf(payload), number=1)
+    print(f"{'build_pdf':>15}: {seconds * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
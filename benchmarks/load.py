@@ -0,0 +1,539 @@
+"""Load tests the bot's handlers with synthetic Telegram updates
+
+The handlers of geniust.bot are added to a dispatcher whose Telegram
+Bot API and other upstream services are served by benchmarks/upstream.py.
+Each simulated user picks a scenario from the mix, puts its updates in
+the dispatcher's queue one after the other and waits for the handler of
+each update to finish, so the latencies include the time the updates
+waited for one of the dispatcher's run_async workers. Like the bot,
+it needs the environment variables read by geniust.constants.
+
+Scenarios:
+    song: /song and then the name of a song.
+    lyrics: The .lyrics inline query.
+    album_pdf: Downloading the PDF of an album.
+    lyric_card: /lyric_card and then a line of the lyrics.
+    shuffle: /shuffle of a user with preferences.
+
+Usage:
+    python -m benchmarks.load [--users N] [--duration SECONDS]
+        [--updates N] [--workers N] [--mix song=2,lyrics=2,...]
+        [--latency SECONDS] [--error-rate RATE] [--output FILE]
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.upstream import Faults, UpstreamServer
+
+# id of the album in tests/data/album.json
+ALBUM_ID = 517831
+# matches the first hit of tests/data/search_lyrics.json
+CARD_LYRICS = "Got a glass house in the Palisades"
+DEFAULT_MIX = "song=3,lyrics=3,album_pdf=1,lyric_card=2,shuffle=1"
+# Seconds between the samples of the thread count and memory usage
+SAMPLE_INTERVAL = 0.2
+
+update_ids = itertools.count(1)
+message_ids = itertools.count(1)
+
+
+def user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+
+
+def message(user_id: int, text: str) -> Dict[str, Any]:
+    payload = {
+        "message_id": next(message_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        payload["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(command)}
+        ]
+    return payload
+
+
+def chat(text: str) -> Callable[[int], Dict[str, Any]]:
+    return lambda user_id: {"message": message(user_id, text)}
+
+
+def callback_query(data: str) -> Callable[[int], Dict[str, Any]]:
+    def update(user_id: int) -> Dict[str, Any]:
+        query_message = message(1, "menu")
+        query_message["chat"]["id"] = user_id
+        return {
+            "callback_query": {
+                "id": str(next(update_ids)),
+                "from": user(user_id),
+                "chat_instance": str(user_id),
+                "message": query_message,
+                "data": data,
+            }
+        }
+
+    return update
+
+
+def inline_query(query: str) -> Callable[[int], Dict[str, Any]]:
+    return lambda user_id: {
+        "inline_query": {
+            "id": str(next(update_ids)),
+            "from": user(user_id),
+            "query": query,
+            "offset": "",
+        }
+    }
+
+
+# Scenario -> (step name, update of the step) pairs
+SCENARIOS: Dict[str, List[Tuple[str, Callable[[int], Dict[str, Any]]]]] = {
+    "song": [
+        ("song.type_song", chat("/song")),
+        ("song.search_songs", chat("glass house")),
+    ],
+    "lyrics": [("inline_query.search_lyrics", inline_query(".lyrics glass house"))],
+    "album_pdf": [
+        ("album.thread_get_album", callback_query(f"album_{ALBUM_ID}_lyrics_pdf"))
+    ],
+    "lyric_card": [
+        ("lyric_card.type_lyrics", chat("/lyric_card")),
+        ("lyric_card.search_lyrics", chat(CARD_LYRICS)),
+    ],
+    "shuffle": [("recommender.display_recommendations", chat("/shuffle"))],
+}
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Returns the weights of the scenarios in a mix like song=2,lyrics=1"""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name}")
+        weights[name] = int(weight) if weight else 1
+    return weights
+
+
+def rss() -> int:
+    """Returns the resident set size of the process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # peak RSS in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Returns the percentile of the values using the nearest rank"""
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Tracker:
+    """Tracks the promises of the updates the dispatcher runs asynchronously
+
+    Every handler of the bot runs asynchronously (see the Defaults of
+    bot.main), so the first promise of an update is the one of its handler.
+    The ones after it are for the error handler.
+
+    Handlers like the album download do their work in threads whose
+    errors don't reach the dispatcher, so the threads started while
+    a handler runs (and the threads they start) are tracked as well
+    and their uncaught errors are counted against the handler's update.
+    """
+
+    def __init__(self, dispatcher: Any):
+        self.promises: Dict[int, Any] = {}
+        self.thread_errors: Counter = Counter()
+        self._failed_updates: Counter = Counter()
+        self._thread_updates: "weakref.WeakKeyDictionary[threading.Thread, int]"
+        self._thread_updates = weakref.WeakKeyDictionary()
+        self._handler = threading.local()
+        self._condition = threading.Condition()
+        run_async = dispatcher.run_async
+        start_thread = threading.Thread.start
+        excepthook = threading.excepthook
+
+        def tracked_run_async(func, *args, update=None, **kwargs):
+            update_id = getattr(update, "update_id", None)
+
+            def run_handler(*args, **kwargs):
+                self._handler.update_id = update_id
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._handler.update_id = None
+
+            promise = run_async(run_handler, *args, update=update, **kwargs)
+            if update_id is not None:
+                with self._condition:
+                    self.promises.setdefault(update_id, promise)
+                    self._condition.notify_all()
+            return promise
+
+        def tracked_start(thread: threading.Thread) -> None:
+            update_id = getattr(self._handler, "update_id", None)
+            if update_id is None:
+                update_id = self._thread_updates.get(threading.current_thread())
+            if update_id is not None:
+                self._thread_updates[thread] = update_id
+            start_thread(thread)
+
+        def count_thread_errors(hook_args: Any) -> None:
+            update_id = self._thread_updates.get(hook_args.thread)
+            with self._condition:
+                self.thread_errors[repr(hook_args.exc_value)] += 1
+                if update_id is not None:
+                    self._failed_updates[update_id] += 1
+            excepthook(hook_args)
+
+        dispatcher.run_async = tracked_run_async
+        threading.Thread.start = tracked_start  # type: ignore[assignment]
+        threading.excepthook = count_thread_errors
+
+    def thread_failed(self, update_id: int) -> bool:
+        """Returns whether a thread started for the update raised an error"""
+        with self._condition:
+            return self._failed_updates.pop(update_id, 0) > 0
+
+    def wait(self, update_id: int, timeout: float) -> Optional[Any]:
+        """Waits for the handler of the update and returns its promise
+
+        Returns None if no handler ran the update before the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._condition.wait_for(lambda: update_id in self.promises, timeout)
+            promise = self.promises.get(update_id)
+        if promise is None or not promise.done.wait(deadline - time.monotonic()):
+            return None
+        return promise
+
+
+class Sampler(threading.Thread):
+    """Samples the thread count and RSS of the process"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.threads: List[int] = []
+        self.rss: List[int] = []
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self.threads.append(threading.active_count())
+            self.rss.append(rss())
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def setup_dispatcher(upstream_url: str, workers: int, database_url: str) -> Any:
+    """Returns the dispatcher of the bot with the upstream services replaced
+
+    geniust reads UPSTREAM_URL when it's imported,
+    so it's imported after the server has started.
+    """
+    os.environ["UPSTREAM_URL"] = upstream_url
+    import lyricsgenius as lg
+    import tekore as tk
+    from telegram.ext import Defaults, Updater
+
+    from geniust import bot, texts
+    from geniust.api import GeniusT, Recommender, use_upstream
+    from geniust.constants import BOT_TOKEN, GENIUS_TOKEN
+    from geniust.db import Database
+    from geniust.utils import upstream_url as redirect
+
+    updater = Updater(
+        token=BOT_TOKEN,
+        base_url=redirect("https://api.telegram.org/bot"),
+        base_file_url=redirect("https://api.telegram.org/file/bot"),
+        workers=workers,
+        defaults=Defaults(
+            parse_mode="html", disable_web_page_preview=True, run_async=True
+        ),
+    )
+    dp = updater.dispatcher
+    dp.bot_data["texts"] = texts
+    dp.bot_data["db"] = Database(database_url)
+    dp.bot_data["genius"] = GeniusT()
+    dp.bot_data["lyricsgenius"] = lg.Genius(
+        GENIUS_TOKEN, retries=2, sleep_time=0, verbose=False
+    )
+    use_upstream(dp.bot_data["lyricsgenius"]._session)
+    # none of the scenarios use Spotify which can't be redirected
+    dp.bot_data["spotify"] = tk.Spotify("load-test")
+    dp.bot_data["recommender"] = Recommender()
+    bot.add_handlers(dp)
+    # the debug logs of every handler would flood the output
+    for name in ("geniust", "telegram"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return dp
+
+
+def setup_users(dp: Any, user_ids: List[int]) -> None:
+    """Adds the users to the database and lets them download albums"""
+    from geniust.constants import DEVELOPERS, Preferences
+
+    database = dp.bot_data["db"]
+    for user_id in user_ids:
+        database.user(user_id, {})
+        # so /shuffle shows recommendations instead of asking for preferences
+        database.update_preferences(user_id, Preferences(genres=["pop"]))
+    # album downloads are only available to the developers
+    DEVELOPERS.extend(user_ids)
+
+
+def run_user(
+    dp: Any,
+    tracker: Tracker,
+    user_id: int,
+    weights: Dict[str, int],
+    rng: random.Random,
+    should_stop: Callable[[], bool],
+    timeout: float,
+    results: List[Tuple[str, str, float, str]],
+) -> None:
+    """Runs scenarios as the user until should_stop returns True"""
+    from telegram import Update
+
+    scenarios = list(weights)
+    cum_weights = list(itertools.accumulate(weights.values()))
+    while not should_stop():
+        (scenario,) = rng.choices(scenarios, cum_weights=cum_weights)
+        for step, payload in SCENARIOS[scenario]:
+            data = payload(user_id)
+            data["update_id"] = next(update_ids)
+            update = Update.de_json(data, dp.bot)
+            start = time.perf_counter()
+            dp.update_queue.put(update)
+            promise = tracker.wait(update.update_id, timeout)
+            latency = (time.perf_counter() - start) * 1000
+            if promise is None:
+                outcome = "timeout"
+            elif promise.exception is not None or tracker.thread_failed(
+                update.update_id
+            ):
+                outcome = "error"
+            else:
+                outcome = "ok"
+            results.append((scenario, step, latency, outcome))
+            if outcome != "ok":
+                # the rest of the conversation can't go on
+                break
+
+
+def summarize(latencies: List[float], outcomes: List[str]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {
+        "updates": len(outcomes),
+        "errors": outcomes.count("error"),
+        "timeouts": outcomes.count("timeout"),
+    }
+    if latencies:
+        summary.update(
+            {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies),
+            }
+        )
+    return summary
+
+
+def report(
+    results: List[Tuple[str, str, float, str]], elapsed: float
+) -> Dict[str, Any]:
+    """Returns the throughput and the latencies of the handlers in milliseconds"""
+    steps: Dict[str, Tuple[List[float], List[str]]] = defaultdict(lambda: ([], []))
+    for _, step, latency, outcome in results:
+        latencies, outcomes = steps[step]
+        outcomes.append(outcome)
+        if outcome == "ok":
+            latencies.append(latency)
+    all_latencies = [latency for _, _, latency, outcome in results if outcome == "ok"]
+    all_outcomes = [outcome for *_, outcome in results]
+    return {
+        "elapsed": elapsed,
+        "throughput": all_outcomes.count("ok") / elapsed if elapsed else 0.0,
+        "total": summarize(all_latencies, all_outcomes),
+        "handlers": {
+            step: summarize(latencies, outcomes)
+            for step, (latencies, outcomes) in sorted(steps.items())
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8, help="Simultaneous users.")
+    parser.add_argument(
+        "--duration", type=float, default=30.0, help="Seconds the test runs."
+    )
+    parser.add_argument(
+        "--updates", type=int, help="Stop after this many updates instead."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="run_async workers of the dispatcher."
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weights of scenarios.")
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Max seconds of a handler."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds upstreams are delayed."
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Max random seconds added."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 502 responses."
+    )
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0.0, help="Share of 429 responses."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the mix.")
+    parser.add_argument("--output", help="Save the results in this file.")
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    server = UpstreamServer(faults, seed=args.seed)
+    database_dir = tempfile.TemporaryDirectory()
+    database_url = f"sqlite:///{os.path.join(database_dir.name, 'load.db')}"
+    dp = setup_dispatcher(server.start(), args.workers, database_url)
+    tracker = Tracker(dp)
+    user_ids = [10_000 + i for i in range(args.users)]
+    setup_users(dp, user_ids)
+
+    dispatcher_thread = threading.Thread(target=dp.start, daemon=True)
+    dispatcher_thread.start()
+    dp.job_queue.start()
+    sampler = Sampler()
+    sampler.start()
+
+    results: List[Tuple[str, str, float, str]] = []
+    start = time.monotonic()
+    deadline = start + args.duration
+
+    def should_stop() -> bool:
+        if args.updates is not None:
+            return len(results) >= args.updates
+        return time.monotonic() >= deadline
+
+    rng = random.Random(args.seed)
+    users = [
+        threading.Thread(
+            target=run_user,
+            args=(
+                dp,
+                tracker,
+                user_id,
+                weights,
+                random.Random(rng.random()),
+                should_stop,
+                args.timeout,
+                results,
+            ),
+        )
+        for user_id in user_ids
+    ]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    elapsed = time.monotonic() - start
+    sampler.stop()
+
+    dp.job_queue.stop()
+    dp.stop()
+    server.stop()
+    database_dir.cleanup()
+    from geniust.functions import lyric_card_builder
+    from geniust.functions.album_conversion import pdf
+
+    lyric_card_builder.card_pool.shutdown(wait=False)
+    pdf.pdf_pool.shutdown(wait=False)
+
+    results_json: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "users": args.users,
+            "workers": args.workers,
+            "mix": weights,
+            "faults": vars(faults),
+        },
+        **report(results, elapsed),
+        "thread_errors": dict(tracker.thread_errors),
+        "threads": {"max": max(sampler.threads), "end": sampler.threads[-1]},
+        "rss_mb": {
+            "start": sampler.rss[0] / 1024 ** 2,
+            "max": max(sampler.rss) / 1024 ** 2,
+            "end": sampler.rss[-1] / 1024 ** 2,
+        },
+    }
+
+    print(
+        f"{results_json['total']['updates']} updates in {elapsed:.1f} s, "
+        f"{results_json['throughput']:.1f} updates/s, "
+        f"max {results_json['threads']['max']} threads, "
+        f"max RSS {results_json['rss_mb']['max']:.1f} MB",
+        file=sys.stderr,
+    )
+    for step, summary in results_json["handlers"].items():
+        latencies = (
+            f"p50 {summary['p50']:8.1f} ms  p95 {summary['p95']:8.1f} ms"
+            f"  p99 {summary['p99']:8.1f} ms"
+            if "p50" in summary
+            else "no successful updates"
+        )
+        print(
+            f"{step:>38}: {summary['updates']:5} updates  {latencies}"
+            f"  {summary['errors']} errors  {summary['timeouts']} timeouts",
+            file=sys.stderr,
+        )
+
+    for error, count in tracker.thread_errors.items():
+        print(f"{count} errors in handler threads: {error}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results_json, f, indent=2)
+    else:
+        print(json.dumps(results_json, indent=2))
+
+
+if __name__ == "__main__":
+    main()
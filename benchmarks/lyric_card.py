@@ -0,0 +1,108 @@
+"""Benchmarks preparing cover arts and encoding lyric cards
+
+Uses tests/data/cover_art.jpg as it is and scaled up to the sizes
+Genius sometimes serves originals in. Like the bot, it needs
+the environment variables read by geniust.constants.
+
+Usage:
+    python -m benchmarks.lyric_card [--rounds N]
+"""
+import argparse
+import pathlib
+import time
+from io import BytesIO
+from typing import Callable
+
+from PIL import Image, ImageFilter
+
+from geniust.functions import lyric_card_builder as builder
+
+DATA_PATH = pathlib.Path(__file__).parent.parent.resolve() / "tests" / "data"
+SIZES = (None, (2000, 2000), (3000, 3000))
+ENCODINGS = (
+    ("PNG", {}),
+    ("JPEG (default)", dict(format="JPEG")),
+    ("JPEG", dict(format="JPEG", quality=builder.CARD_QUALITY)),
+    ("JPEG budget", dict(format="JPEG", max_bytes=builder.CARD_MAX_BYTES)),
+    ("WebP", dict(format="WEBP", quality=builder.CARD_QUALITY)),
+)
+
+
+def full_decode(cover_art: bytes) -> Image.Image:
+    """How cover arts were prepared before the reduced decode"""
+    im = Image.open(BytesIO(cover_art)).convert("RGB")
+    im = builder.change_brightness(im, builder.COVER_ART_BRIGHTNESS)
+    original_size = im.size
+    if original_size != builder.BUILDER_IMAGE_SIZE:
+        im = im.resize(builder.BUILDER_IMAGE_SIZE, Image.BOX)
+        if original_size[0] <= 700:
+            ratio = builder.BUILDER_IMAGE_SIZE[0] / original_size[0]
+            im = im.filter(ImageFilter.BoxBlur(radius=ratio))
+    return im
+
+
+def decoded_size(cover_art: bytes, reduced: bool) -> float:
+    """Returns the size of the decoded image in MB"""
+    if reduced:
+        im, _ = builder.decode_cover_art(cover_art)
+    else:
+        im = Image.open(BytesIO(cover_art)).convert("RGB")
+    return len(im.tobytes()) / 1024 ** 2
+
+
+def cpu_time(func: Callable[[bytes], Image.Image], data: bytes, rounds: int) -> float:
+    """Returns the CPU time of a call in milliseconds"""
+    start = time.process_time()
+    for _ in range(rounds):
+        func(data)
+    return (time.process_time() - start) / rounds * 1000
+
+
+def encode(im: Image.Image, options: dict) -> BytesIO:
+    """Encodes the card like build_lyric_card did before encode_image"""
+    if options == {}:
+        options = dict(format="PNG")
+    if options == dict(format="JPEG"):
+        card = BytesIO()
+        im.save(card, **options)
+        return card
+    return builder.encode_image(im, **options)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="Number of rounds.")
+    args = parser.parse_args()
+
+    with open(DATA_PATH / "cover_art.jpg", "rb") as f:
+        original = f.read()
+
+    print(f"{args.rounds} rounds, CPU time and decoded image size per cover art")
+    for size in SIZES:
+        data = original
+        if size is not None:
+            scaled = BytesIO()
+            Image.open(BytesIO(original)).resize(size).save(scaled, "JPEG")
+            data = scaled.getvalue()
+        name = "x".join(map(str, Image.open(BytesIO(data)).size))
+        for label, func in (
+            ("full", full_decode),
+            ("reduced", builder.prepare_cover_art),
+        ):
+            ms = cpu_time(func, data, args.rounds)
+            mb = decoded_size(data, reduced=func is not full_decode)
+            print(f"{name:>9} {label:>8}: {ms:8.2f} ms {mb:8.2f} MB")
+
+    card = builder.prepare_cover_art(original)
+    builder.draw_layout(
+        card, builder.layout_card("Lyrics of\nthe card", "Song", ["Artist"])
+    )
+    print(f"{args.rounds} rounds, CPU time and size per encoded card")
+    for label, options in ENCODINGS:
+        ms = cpu_time(lambda _: encode(card, options), original, args.rounds)
+        kb = len(encode(card, options).getvalue()) / 1024
+        print(f"{label:>14}: {ms:8.2f} ms {kb:8.2f} KB")
+
+
+if __name__ == "__main__":
+    main()
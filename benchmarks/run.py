@@ -0,0 +1,269 @@
+"""Runs the offline benchmark suite and saves the results as JSON
+
+Every benchmark uses the data in tests/data and the network is mocked,
+so the results of different commits can be compared. Like the bot,
+it needs the environment variables read by geniust.constants.
+
+Usage:
+    python -m benchmarks.run [--rounds N] [-k NAME] [--output FILE]
+        [--compare FILE]
+"""
+import argparse
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional
+from unittest.mock import MagicMock, patch
+
+from geniust import api, utils
+from geniust.functions import lyric_card_builder as builder
+from geniust.functions.album_conversion import create_pdf, create_zip, tgf
+
+DATA_PATH = pathlib.Path(__file__).parent.parent.resolve() / "tests" / "data"
+USER_DATA = {"lyrics_lang": "English + Non-English", "include_annotations": True}
+IDENTIFIERS = ("!--!", "!__!")
+
+# Benchmark name -> function that sets it up and returns the benchmarked call
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    def decorator(setup: Callable[[], Callable[[], Any]]) -> Callable:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def load_json(name: str) -> Any:
+    with open(DATA_PATH / name, encoding="utf8") as f:
+        return json.load(f)
+
+
+def load_text(name: str) -> str:
+    with open(DATA_PATH / name, encoding="utf8") as f:
+        return f.read()
+
+
+def load_bytes(name: str) -> bytes:
+    with open(DATA_PATH / name, "rb") as f:
+        return f.read()
+
+
+@benchmark("api.lyrics")
+def lyrics() -> Callable[[], Any]:
+    genius = api.GeniusT()
+    page = load_text("song_page.html")
+    genius._make_request = MagicMock(return_value=page)  # type: ignore
+    url = "https://genius.com/Machine-gun-kelly-glass-house-lyrics"
+    return lambda: genius.lyrics(4589365, url, include_annotations=False)
+
+
+@benchmark("utils.format_annotations")
+def format_annotations() -> Callable[[], Any]:
+    songs = [track["song"] for track in load_json("full_album.json")["tracks"]]
+
+    def run() -> None:
+        for song in songs:
+            utils.format_annotations(
+                song["lyrics"], song["annotations"], True, IDENTIFIERS
+            )
+
+    return run
+
+
+@benchmark("utils.format_language")
+def format_language() -> Callable[[], Any]:
+    songs = [track["song"] for track in load_json("full_album.json")["tracks"]]
+
+    def run() -> None:
+        for song in songs:
+            for language in ("English", "Non-English"):
+                utils.format_language(song["lyrics"], language)
+
+    return run
+
+
+@benchmark("album.create_pdf")
+def pdf_album() -> Callable[[], Any]:
+    album = load_json("full_album.json")
+    cover_art = MagicMock(content=load_bytes("cover_art.jpg"))
+
+    def run() -> None:
+        with patch("requests.get", return_value=cover_art):
+            create_pdf(album, USER_DATA)
+
+    return run
+
+
+@benchmark("album.create_zip")
+def zip_album() -> Callable[[], Any]:
+    album = load_json("full_album.json")
+    return lambda: create_zip(album, USER_DATA)
+
+
+@benchmark("album.telegraph_pages")
+def telegraph_pages() -> Callable[[], Any]:
+    album = load_json("full_album.json")
+    artist = album["artist"]["name"]
+
+    def run() -> None:
+        for track in album["tracks"]:
+            tgf.song_page(track, artist, USER_DATA)
+
+    return run
+
+
+@benchmark("utils.check_length")
+def check_length() -> Callable[[], Any]:
+    album = load_json("full_album.json")
+    caption = "\n".join(
+        f"<b>{track['song']['title']}</b>: {track['song']['description_preview']}"
+        for track in album["tracks"]
+    )
+    return lambda: utils.check_length(caption)
+
+
+@benchmark("utils.find_matching_lyrics")
+def find_matching_lyrics() -> Callable[[], Any]:
+    page = load_text("song_page.html")
+    genius = api.GeniusT()
+    genius._make_request = MagicMock(return_value=page)  # type: ignore
+    song_lyrics, _ = genius.lyrics(1, "https://genius.com/song")
+    song_lyrics = utils.extract_lyrics_for_card(song_lyrics)
+    lines = [line for line in song_lyrics.split("\n") if line.strip()]
+    found_lyrics = lines[len(lines) // 2 : len(lines) // 2 + 2]
+    return lambda: utils.find_matching_lyrics(found_lyrics, song_lyrics)
+
+
+def build_lyric_card(cover_art: bytes) -> BytesIO:
+    return builder.build_lyric_card(
+        BytesIO(cover_art),
+        "I got a glass house in the Palisades\nThat A-K-A white",
+        "glass house",
+        ["Machine Gun Kelly"],
+        ["Naomi Wild"],
+        format="JPEG",
+        max_bytes=builder.CARD_MAX_BYTES,
+        cover_art_url="https://images.genius.com/cover_art.jpg",
+    )
+
+
+@benchmark("lyric_card.build")
+def lyric_card() -> Callable[[], Any]:
+    cover_art = load_bytes("cover_art.jpg")
+    builder.warmup()
+
+    def run() -> None:
+        builder.BASE_IMAGES.clear()
+        builder.layout_lyrics.cache_clear()
+        builder.layout_metadata.cache_clear()
+        build_lyric_card(cover_art)
+
+    return run
+
+
+@benchmark("lyric_card.build_cached")
+def lyric_card_cached() -> Callable[[], Any]:
+    cover_art = load_bytes("cover_art.jpg")
+    build_lyric_card(cover_art)
+    return lambda: build_lyric_card(cover_art)
+
+
+def measure(func: Callable[[], Any], rounds: int, warmup: int) -> Dict[str, Any]:
+    """Runs the function and returns its timings in milliseconds"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "rounds": rounds,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "stdev": statistics.stdev(timings) if rounds > 1 else 0.0,
+        "max": max(timings),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=DATA_PATH,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Returns the median change of each benchmark compared to the baseline"""
+    lines = []
+    for name, result in results["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            lines.append(f"{name:>28}: new")
+            continue
+        change = (result["median"] / old["median"] - 1) * 100
+        lines.append(
+            f"{name:>28}: {old['median']:9.2f} ms -> {result['median']:9.2f} ms"
+            f" ({change:+.1f}%)"
+        )
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10, help="Number of rounds.")
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Untimed rounds before the timed ones."
+    )
+    parser.add_argument(
+        "-k", dest="keyword", help="Only run benchmarks that have this in their name."
+    )
+    parser.add_argument("--output", help="Save the results in this file.")
+    parser.add_argument("--compare", help="Results file of a previous run.")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "benchmarks": {},
+    }
+    for name, setup in BENCHMARKS.items():
+        if args.keyword and args.keyword not in name:
+            continue
+        results["benchmarks"][name] = measure(setup(), args.rounds, args.warmup)
+        print(
+            f"{name:>28}: {results['benchmarks'][name]['median']:9.2f} ms",
+            file=sys.stderr,
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("\n".join(compare(results, baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""Serves the data in tests/data in place of the services the bot uses
+
+Genius (API, public API and web pages), Telegram's Bot API, Telegraph,
+imgbb, image hosts and the recommender are served at their real paths
+with the host as the first part of the path, e.g.
+/api.genius.com/songs/1. The songs, lyrics and annotations of the
+album's tracks come from full_album.json and the other songs are
+song.json with the lyrics of song_page.html. Start the bot with UPSTREAM_URL set to the
+address of this server to send its requests here instead. Responses can
+be delayed and a share of them can fail or be rate limited (429).
+
+It doesn't need the environment variables of the bot.
+
+Usage:
+    python -m benchmarks.upstream [--port PORT] [--latency SECONDS]
+        [--jitter SECONDS] [--error-rate RATE] [--rate-limit-rate RATE]
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import pathlib
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+from bs4 import BeautifulSoup
+from tornado.web import RequestHandler, url
+
+DATA_PATH = pathlib.Path(__file__).parent.parent.resolve() / "tests" / "data"
+
+# Genius API and public API paths -> data file of the response
+GENIUS_ENDPOINTS: List[Tuple[str, str]] = [
+    (r"songs/\d+", "song.json"),
+    (r"albums/\d+", "album.json"),
+    (r"albums/\d+/tracks", "album_tracks.json"),
+    (r"albums/\d+/cover_arts|cover_arts", "album_cover_arts.json"),
+    (r"artists/\d+", "artist.json"),
+    (r"artists/\d+/albums", "artist_albums.json"),
+    (r"artists/\d+/songs", "artist_songs.json"),
+    (r"annotations/\d+", "annotation.json"),
+    (r"voters", "annotation_voters.json"),
+    (r"users/\d+", "user.json"),
+    (r"users/\d+/contributions/pyongs", "user_pyongs.json"),
+    (r"account", "account.json"),
+    (r"search/(lyric|song|album|artist|user)s?", "search_{0}s.json"),
+]
+# Recommender paths -> data file of the response
+RECOMMENDER_ENDPOINTS: List[Tuple[str, str]] = [
+    (r"songs/len", "recommender_num_songs.json"),
+    (r"songs/\d+", "recommender_song.json"),
+    (r"genres", "recommender_genres.json"),
+    (r"artists/\d+", "recommender_artist.json"),
+    (r"search/artists", "recommender_search_artists.json"),
+    (r"preferences", "recommender_preferences.json"),
+    (r"recommendations", "recommender_recommendations.json"),
+]
+
+
+@dataclass
+class Faults:
+    """Delays and failures of the responses
+
+    Attributes:
+        latency (float): Seconds every response is delayed.
+        jitter (float): Max random seconds added to the latency.
+        error_rate (float): Share of responses that are server errors (502).
+        rate_limit_rate (float): Share of responses that are rate limited (429).
+        retry_after (int): Seconds rate limited clients are asked to wait.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+
+
+@functools.lru_cache(maxsize=None)
+def data_file(name: str) -> bytes:
+    with open(DATA_PATH / name, "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def json_file(name: str) -> Any:
+    return json.loads(data_file(name).decode("utf-8-sig"))
+
+
+@functools.lru_cache(maxsize=None)
+def song_page_data() -> Dict[str, Any]:
+    """Returns page data of the song made from song.json and song_page.html"""
+    html = BeautifulSoup(data_file("song_page.html"), "html.parser")
+    containers = html.find_all("div", class_=re.compile("^lyrics$|Lyrics__Container"))
+    lyrics = "<br>".join(div.decode_contents() for div in containers)
+    return {
+        "page_data": {
+            "song": json_file("song.json")["song"],
+            "lyrics_data": {"body": {"html": f"<p>{lyrics}</p>"}},
+        }
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def album_songs() -> Dict[int, Dict[str, Any]]:
+    """Returns the songs of full_album.json keyed by their ID"""
+    return {
+        track["song"]["id"]: track["song"]
+        for track in json_file("full_album.json")["tracks"]
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def album_song_paths() -> Dict[str, int]:
+    """Returns the IDs of the songs of full_album.json keyed by their page path"""
+    return {song["path"].strip("/"): song["id"] for song in album_songs().values()}
+
+
+def song_data(song_id: int) -> Dict[str, Any]:
+    """Returns the song of full_album.json with the ID or song.json"""
+    song = album_songs().get(song_id)
+    if song is None:
+        return json_file("song.json")
+    exclude = ("lyrics", "annotations")
+    return {"song": {k: v for k, v in song.items() if k not in exclude}}
+
+
+@functools.lru_cache(maxsize=None)
+def song_page(song_id: int) -> bytes:
+    """Returns the page of the song of full_album.json with the ID
+
+    The annotation IDs of the lyrics are put back in
+    the href attributes of referent fragments.
+    """
+    lyrics = re.sub(
+        r'<a href="(\d+)">',
+        r'<a href="/\1/fragment" class="ReferentFragment">',
+        album_songs()[song_id]["lyrics"].replace("<br/>\n", "<br/>"),
+    )
+    html = f'<html><body><div class="Lyrics__Container">{lyrics}</div></body></html>'
+    return html.encode("utf8")
+
+
+def make_referents(annotations: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Returns referents made from referents.json with the annotations
+
+    Args:
+        annotations (Dict[str, Optional[str]]): HTML bodies keyed by the IDs
+            of the referents. The bodies of referents.json are kept
+            for the IDs without a body.
+
+    Returns:
+        Dict[str, Any]: The referents.
+    """
+    templates = itertools.cycle(json_file("referents.json")["referents"])
+    referents = []
+    for (referent_id, body), template in zip(annotations.items(), templates):
+        referent = dict(template, id=int(referent_id))
+        referent["api_path"] = f"/referents/{referent_id}"
+        if body is not None:
+            annotation = template["annotations"][0]
+            plain = BeautifulSoup(body, "html.parser").get_text()
+            referent["annotations"] = [
+                dict(annotation, body={"html": body, "plain": plain})
+            ]
+        referents.append(referent)
+    return {"referents": referents}
+
+
+@functools.lru_cache(maxsize=None)
+def song_referents(song_id: Optional[int] = None) -> Dict[str, Any]:
+    """Returns the referents of the song
+
+    The annotations in the lyrics of the song's page must have a referent,
+    so the referents of songs that aren't in full_album.json have
+    the IDs of song_page.html.
+    """
+    song = album_songs().get(song_id) if song_id is not None else None
+    if song is not None:
+        return make_referents(song["annotations"])
+    html = data_file("song_page.html").decode("utf8")
+    ids = re.findall(r'annotation-fragment="(\d+)"', html)
+    return make_referents(dict.fromkeys(ids))
+
+
+def find_endpoint(endpoints: List[Tuple[str, str]], path: str) -> Optional[str]:
+    """Returns the data file of the first endpoint that matches the path"""
+    for pattern, name in endpoints:
+        match = re.fullmatch(pattern, path.strip("/"))
+        if match:
+            return name.format(*match.groups())
+    return None
+
+
+class UpstreamHandler(RequestHandler):
+    """Delays the response and fails some of them based on the faults"""
+
+    def initialize(self, faults: Faults, rng: random.Random) -> None:
+        self.faults = faults
+        self.rng = rng
+
+    async def prepare(self) -> None:
+        delay = self.faults.latency + self.rng.uniform(0, self.faults.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self.rng.random()
+        if roll < self.faults.rate_limit_rate:
+            retry_after = self.faults.retry_after
+            self.set_status(429)
+            self.set_header("Retry-After", str(retry_after))
+            # Telegram's format, which the other clients only see as a 429
+            self.finish(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                }
+            )
+        elif roll < self.faults.rate_limit_rate + self.faults.error_rate:
+            self.set_status(502)
+            self.finish({"ok": False, "error_code": 502, "description": "Bad Gateway"})
+
+    def params(self) -> Dict[str, Any]:
+        """Returns the query, form and JSON parameters of the request"""
+        params = {k: self.get_argument(k) for k in self.request.arguments}
+        if self.request.headers.get("Content-Type", "").startswith("application/json"):
+            params.update(json.loads(self.request.body or b"{}"))
+        return params
+
+    def write_json(self, data: Union[dict, list]) -> None:
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(data))
+
+    def not_found(self) -> None:
+        self.set_status(404)
+        self.write_json({"meta": {"status": 404, "message": "Not Found"}})
+
+
+class GeniusAPIHandler(UpstreamHandler):
+    def get(self, path: str) -> None:
+        song = re.fullmatch(r"songs/(\d+)", path.strip("/"))
+        if path.strip("/") == "page_data/song":
+            response: Any = song_page_data()
+        elif path.strip("/") == "referents":
+            song_id = self.get_argument("song_id", None)
+            response = song_referents(int(song_id) if song_id else None)
+        elif song:
+            response = song_data(int(song[1]))
+        else:
+            name = find_endpoint(GENIUS_ENDPOINTS, path)
+            if name is None:
+                return self.not_found()
+            response = json_file(name)
+        self.write_json({"meta": {"status": 200}, "response": response})
+
+
+class GeniusWebHandler(UpstreamHandler):
+    def get(self, path: str) -> None:
+        self.set_header("Content-Type", "text/html; charset=utf-8")
+        song_id = album_song_paths().get(path.strip("/"))
+        if song_id is not None:
+            self.write(song_page(song_id))
+        else:
+            self.write(data_file("song_page.html"))
+
+
+class ImageHandler(UpstreamHandler):
+    def get(self, path: str) -> None:
+        self.set_header("Content-Type", "image/jpeg")
+        self.write(data_file("cover_art.jpg"))
+
+
+class ImgbbHandler(UpstreamHandler):
+    def post(self) -> None:
+        image = f"{self.request.protocol}://{self.request.host}/i.ibb.co/{uuid4().hex}"
+        self.write_json(
+            {
+                "data": {"url": f"{image}.jpg", "thumb": {"url": f"{image}_t.jpg"}},
+                "success": True,
+                "status": 200,
+            }
+        )
+
+
+class TelegraphUploadHandler(UpstreamHandler):
+    def post(self) -> None:
+        self.write_json([{"src": f"/file/{uuid4().hex}.jpg"}])
+
+
+class TelegraphAPIHandler(UpstreamHandler):
+    def get(self, method: str, path: str) -> None:
+        params = self.params()
+        if method in ("createPage", "editPage"):
+            page = path.strip("/") or f"{params.get('title', 'Page')}-{uuid4().hex}"
+            result = {
+                "path": page,
+                "url": f"https://telegra.ph/{page}",
+                "title": params.get("title", ""),
+                "views": 0,
+            }
+        elif method == "createAccount":
+            result = {"short_name": params.get("short_name"), "access_token": "token"}
+        else:
+            result = {}
+        self.write_json({"ok": True, "result": result})
+
+    post = get
+
+
+class TelegramHandler(UpstreamHandler):
+    message_ids = itertools.count(1)
+
+    async def get(self, token: str, method: str) -> None:
+        params = self.params()
+        result: Any = True
+        if method == "getMe":
+            result = {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "GeniusT",
+                "username": "geniust_bot",
+                "can_join_groups": True,
+                "can_read_all_group_messages": False,
+                "supports_inline_queries": True,
+            }
+        elif method == "getUpdates":
+            # updates of load tests are put in the dispatcher directly
+            await asyncio.sleep(min(float(params.get("timeout", 0)), 1.0))
+            result = []
+        elif (
+            method.startswith(("send", "edit", "copy", "forward"))
+            and "inline_message_id" not in params
+        ):
+            result = self.message(method, params)
+        self.write_json({"ok": True, "result": result})
+
+    post = get
+
+    def message(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        file_id = uuid4().hex
+        message: Dict[str, Any] = {
+            "message_id": int(params.get("message_id", next(self.message_ids))),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 1)), "type": "private"},
+        }
+        if method == "sendPhoto":
+            message["photo"] = [
+                {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "width": 1000,
+                    "height": 1000,
+                }
+            ]
+        elif method == "sendDocument":
+            message["document"] = {"file_id": file_id, "file_unique_id": file_id}
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+
+class RecommenderHandler(UpstreamHandler):
+    def get(self, path: str) -> None:
+        name = find_endpoint(RECOMMENDER_ENDPOINTS, path)
+        if name is None:
+            return self.not_found()
+        if name == "recommender_genres.json" and self.get_argument("age", None):
+            name = "recommender_genres_age_20.json"
+        self.write_json(json_file(name))
+
+
+def make_app(faults: Faults, seed: Optional[int] = None) -> tornado.web.Application:
+    """Returns the application of the server
+
+    Args:
+        faults (Faults): Delays and failures of the responses.
+        seed (Optional[int], optional): Seed of the failures. Defaults to None.
+
+    Returns:
+        tornado.web.Application: The application.
+    """
+    options = dict(faults=faults, rng=random.Random(seed))
+    genius_api = GeniusAPIHandler
+    routes: List[Tuple[str, Callable]] = [
+        (r"/api\.genius\.com/(.*)", genius_api),
+        (r"/genius\.com/api/(.*)", genius_api),
+        (r"/(?:images|t2|assets)\.genius\.com/(.*)", ImageHandler),
+        (r"/i\.ibb\.co/(.*)", ImageHandler),
+        (r"/telegra\.ph/file/(.*)", ImageHandler),
+        (r"/api\.telegram\.org/file/bot[^/]+/(.*)", ImageHandler),
+        (r"/genius\.com/(.*)", GeniusWebHandler),
+        (r"/api\.imgbb\.com/1/upload", ImgbbHandler),
+        (r"/telegra\.ph/upload", TelegraphUploadHandler),
+        (r"/api\.telegra\.ph/(\w+)(/.*)?", TelegraphAPIHandler),
+        (r"/api\.telegram\.org/bot([^/]+)/(\w+)", TelegramHandler),
+        (r"/geniust-recommender\.herokuapp\.com/(.*)", RecommenderHandler),
+    ]
+    return tornado.web.Application(
+        [url(pattern, handler, options) for pattern, handler in routes]
+    )
+
+
+class UpstreamServer:
+    """Runs the server in a background thread
+
+    Args:
+        faults (Faults, optional): Delays and failures of the responses.
+        port (int, optional): Port of the server. Defaults to 0
+            which means a free port.
+        seed (Optional[int], optional): Seed of the failures. Defaults to None.
+    """
+
+    def __init__(
+        self, faults: Faults = None, port: int = 0, seed: Optional[int] = None
+    ):
+        self.faults = faults if faults is not None else Faults()
+        self.port = port
+        self.seed = seed
+        self._loop: Optional[tornado.ioloop.IOLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> str:
+        """Starts the server and returns its URL"""
+        started = threading.Event()
+
+        def run() -> None:
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            server = tornado.httpserver.HTTPServer(make_app(self.faults, self.seed))
+            (socket,) = tornado.netutil.bind_sockets(self.port, "127.0.0.1")
+            self.port = socket.getsockname()[1]
+            server.add_sockets([socket])
+            self._loop = tornado.ioloop.IOLoop.current()
+            started.set()
+            self._loop.start()
+            server.stop()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def stop(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            self._loop.add_callback(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8888, help="Port of the server.")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds responses are delayed."
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Max random seconds added."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 502 responses."
+    )
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0.0, help="Share of 429 responses."
+    )
+    parser.add_argument(
+        "--retry-after", type=int, default=1, help="Retry-After of 429 responses."
+    )
+    parser.add_argument("--seed", type=int, help="Seed of the failures.")
+    args = parser.parse_args()
+
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+    app = make_app(faults, args.seed)
+    app.listen(args.port, "127.0.0.1")
+    print(f"Start the bot with UPSTREAM_URL=http://127.0.0.1:{args.port}")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
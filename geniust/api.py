@@ -8,17 +8,19 @@ from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from io import BytesIO
 from json.decoder import JSONDecodeError
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import requests
 import telethon
 from bs4 import BeautifulSoup
 from lyricsgenius import Genius, PublicAPI
 from lyricsgenius.utils import clean_str
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError, Timeout
 from telethon import types
 from telethon.sessions import StringSession
 
+from geniust import metrics, utils
 from geniust.constants import (
     ANNOTATIONS_CHANNEL_HANDLE,
     GENIUS_TOKEN,
@@ -32,6 +34,36 @@ from geniust.constants import (
 
 logger = logging.getLogger("geniust")
 IMGBB_API_URL = "https://api.imgbb.com/1/upload"
+# Max number of kept-alive connections to imgbb
+IMGBB_POOL_SIZE = 8
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """Transport adapter of the requests to the upstream services
+
+    Records the metrics of the requests (see geniust.metrics) and
+    sends them to UPSTREAM_URL if it's set. Used for the clients
+    whose URLs can't be configured as well.
+    """
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs):
+        url = request.url
+        request.url = utils.upstream_url(url)
+        with metrics.track_upstream(url):
+            response = super().send(request, *args, **kwargs)
+        metrics.record_upstream_status(url, response.status_code)
+        return response
+
+
+def use_upstream(session: requests.Session) -> requests.Session:
+    """Mounts UpstreamAdapter for the HTTPS requests of the session"""
+    session.mount("https://", UpstreamAdapter())
+    return session
+
+
+# Uploads from different threads reuse the connections of this session
+imgbb_session = requests.Session()
+imgbb_session.mount("https://", UpstreamAdapter(pool_maxsize=IMGBB_POOL_SIZE))
 
 
 def get_channel() -> types.TypeInputPeer:
@@ -120,7 +152,7 @@ def telegram_annotation(a: str) -> Tuple[str, bool]:
 
 def replace_hrefs(
     lyrics: BeautifulSoup,
-    posted_annotations: Optional[List[Tuple[int, str]]] = None,
+    posted_annotations: Optional[List[Tuple[str, str]]] = None,
     telegram_song: bool = False,
 ) -> None:
     """Replaced the href of <a> tags with annotation IDs or links
@@ -132,7 +164,7 @@ def replace_hrefs(
 
     Args:
         lyrics (BeautifulSoup): song lyrics as a BeautifulSoup object
-        posted_annotations (List[Tuple[int, str]], optional):
+        posted_annotations (List[Tuple[str, str]], optional):
             List of uploaded annotations to Telegram with tuples of
             annotation IDs and their corresponding Telegram post. Defaults to [].
         telegram_song (bool, optional): Indicates if it's the lyrics is meant
@@ -182,6 +214,15 @@ def replace_hrefs(
                     tag["href"] = match[0] if match else "0"
 
 
+def available_cores() -> int:
+    """Returns the number of available cores"""
+    try:
+        return len(os.sched_getaffinity(0))  # type: ignore
+    except AttributeError:  # pragma: no cover - isn't available in non-Unix systems
+        cpu_count = os.cpu_count()
+        return cpu_count if cpu_count is not None else 4
+
+
 class GeniusT(Genius):
     """Interface to Genius
 
@@ -198,6 +239,7 @@ class GeniusT(Genius):
         self.timeout = 5
         self.public_api = True
         self.annotations_channel = None
+        use_upstream(self._session)
 
     def artist(
         self,
@@ -346,7 +388,7 @@ class GeniusT(Genius):
         include_annotations: bool = False,
         remove_section_headers: bool = False,
         telegram_song: bool = False,
-    ) -> Union[Tuple[str, Dict[int, str]], str]:
+    ) -> Union[Tuple[str, Dict[str, str]], str]:
         """Uses BeautifulSoup to scrape song info off of a Genius song URL
 
         Args:
@@ -372,8 +414,8 @@ class GeniusT(Genius):
             :attr:`Genius.remove_section_headers` attribute.
 
         """
-        annotations: Dict[int, str] = {}
-        posted_annotations: List[Tuple[int, str]] = []
+        annotations: Dict[str, str] = {}
+        posted_annotations: List[Tuple[str, str]] = []
 
         path = song_url.replace("https://genius.com/", "")
 
@@ -478,7 +520,7 @@ class GeniusT(Genius):
 
     def song_annotations(
         self, song_id: int, text_format: Optional[str] = None
-    ) -> Dict[int, str]:
+    ) -> Dict[str, str]:
         """Return song's annotations with associated fragment in list of tuple.
 
         Args:
@@ -487,7 +529,7 @@ class GeniusT(Genius):
                 ('dom', 'html', 'markdown' or 'plain').
 
         Returns:
-            list: list of tuples(fragment, [annotations])
+            dict: annotations keyed by their ID as in the href attributes.
 
         Note:
             This method uses :meth:`Genius.referents`, but provides convenient
@@ -503,11 +545,12 @@ class GeniusT(Genius):
             song_id=song_id, text_format=text_format, per_page=50
         )
 
-        all_annotations: Dict[int, str] = {}
+        all_annotations: Dict[str, str] = {}
         for r in referents["referents"]:
             # r['id'] isn't always the one ued in href attributes
+            # and the IDs are kept as strings to match the href attributes
             api_path = r["api_path"]
-            annotation_id = int(api_path[api_path.rfind("/") + 1 :])
+            annotation_id = api_path[api_path.rfind("/") + 1 :]
             annotation = r["annotations"][0]["body"][text_format]
 
             if annotation_id not in all_annotations.keys():
@@ -527,7 +570,7 @@ class GeniusT(Genius):
         """
         song = track["song"]
 
-        annotations: Dict[int, str] = {}
+        annotations: Dict[str, str] = {}
 
         if song["lyrics_state"] == "complete" and not song["instrumental"]:
             lyrics, annotations = self.lyrics(  # type: ignore
@@ -571,12 +614,7 @@ class GeniusT(Genius):
             album_id, per_page=50, text_format=text_format
         )["tracks"]
 
-        # Get number of available cores
-        try:
-            threads = len(os.sched_getaffinity(0))  # type: ignore
-        except AttributeError:  # pragma: no cover - isn't available in non-Unix systems
-            cpu_count = os.cpu_count()
-            threads = cpu_count if cpu_count is not None else 4
+        threads = available_cores()
         with ThreadPoolExecutor(threads * 2) as executor:
             loop = asyncio.get_event_loop()
             tasks = [
@@ -613,6 +651,82 @@ class GeniusT(Genius):
         new_loop.close()
         return q.get()
 
+    def album_stream(
+        self,
+        album_id: int,
+        include_annotations: bool = False,
+        text_format: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Gets the album and lets its tracks be consumed as they are fetched
+
+        Unlike async_album_search, this method returns as soon as the album
+        and its tracklist are available. The "tracks" key of the album is
+        an AlbumTracks object which fetches the lyrics of the tracks
+        concurrently when it's iterated and yields them in order.
+
+        Args:
+            album_id (int): Album ID.
+            include_annotations (bool, optional): Include annotations
+                in album. Defaults to False.
+            text_format (bool, optional): Text format of the response.
+
+        Returns:
+            Dict[str, Any]: Album data.
+        """
+        album = self.album(album_id, text_format)["album"]
+        tracks = self.album_tracks(album_id, per_page=50, text_format=text_format)
+        album["tracks"] = AlbumTracks(self, tracks["tracks"], include_annotations)
+        return album
+
+
+class AlbumTracks:
+    """Tracks of an album whose lyrics are fetched concurrently
+
+    Iterating over the object starts fetching the lyrics of all tracks
+    and yields each track as soon as it and the tracks before it
+    are fetched, so consumers get the tracks in order while the rest
+    are still being fetched.
+
+    Args:
+        genius (GeniusT): Genius client to fetch the tracks with.
+        tracks (List[Dict[str, Any]]): Tracks of the album.
+        include_annotations (bool): Retrieve annotations for each song.
+        workers (int, optional): Number of tracks fetched at the same time.
+            Defaults to twice the number of available cores.
+    """
+
+    def __init__(
+        self,
+        genius: GeniusT,
+        tracks: List[Dict[str, Any]],
+        include_annotations: bool,
+        workers: Optional[int] = None,
+    ):
+        self.genius = genius
+        self.tracks = tracks
+        self.include_annotations = include_annotations
+        self.workers = workers if workers is not None else available_cores() * 2
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if not self.tracks:
+            return
+        with ThreadPoolExecutor(min(self.workers, len(self.tracks))) as executor:
+            futures = [
+                executor.submit(self.genius.fetch, track, self.include_annotations)
+                for track in self.tracks
+            ]
+            try:
+                for track, future in zip(self.tracks, futures):
+                    future.result()
+                    yield track
+            finally:
+                # the consumer stopped or a track couldn't be fetched
+                for future in futures:
+                    future.cancel()
+
 
 @dataclass
 class SimpleArtist:
@@ -743,6 +857,7 @@ class Sender:
         }  # type: ignore
         if access_token:
             self._session.headers["Authorization"] = f"Bearer {access_token}"
+        use_upstream(self._session)
         self.timeout: int = timeout
         self.retries: int = retries
 
@@ -788,7 +903,7 @@ def get_description(e: HTTPError) -> str:  # pragma: no cover
 
 
 def upload_to_imgbb(image: BytesIO, expiration_date: int = 60) -> dict:
-    req = requests.post(
+    req = imgbb_session.post(
         IMGBB_API_URL,
         data=dict(key=IMGBB_TOKEN, expiration_date=expiration_date),
         files=dict(image=image),
@@ -2,7 +2,7 @@ import logging
 import re
 import traceback
 import warnings
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import lyricsgenius as lg
 import tekore as tk
@@ -18,7 +18,9 @@ from telegram.ext import (
     CommandHandler,
     ConversationHandler,
     Defaults,
+    Dispatcher,
     Filters,
+    Handler,
     InlineQueryHandler,
     MessageFilter,
     MessageHandler,
@@ -26,8 +28,8 @@ from telegram.ext import (
     Updater,
 )
 
-from geniust import auths, get_user, texts, username
-from geniust.api import GeniusT, Recommender
+from geniust import auths, get_user, metrics, texts, username
+from geniust.api import GeniusT, Recommender, use_upstream
 
 # from geniust.constants import SERVER_ADDRESS
 from geniust.constants import (
@@ -74,14 +76,21 @@ from geniust.functions import (
     annotation,
     artist,
     customize,
+    developer,
     inline_query,
     lyric_card,
+    lyric_card_builder,
     recommender,
     song,
     user,
 )
 from geniust.server import WebhookThread
-from geniust.utils import check_callback_query_user, log
+from geniust.utils import (
+    PROGRESS_LISTENERS,
+    check_callback_query_user,
+    log,
+    upstream_url,
+)
 
 warnings.filterwarnings(
     "ignore", message="If 'per_", module="telegram.ext.conversationhandler"
@@ -262,8 +271,8 @@ def send_feedback(update: Update, context: CallbackContext) -> int:
 
     context.user_data["feedback_message_id"] = update.message.message_id
 
-    for developer in DEVELOPERS:
-        context.bot.send_message(chat_id=developer, text=text, reply_markup=keyboard)
+    for developer_id in DEVELOPERS:
+        context.bot.send_message(chat_id=developer_id, text=text, reply_markup=keyboard)
     context.bot.send_message(chat_id=update.message.chat.id, text=reply_text)
     return END
 
@@ -461,33 +470,15 @@ def error_handler(update: Update, context: CallbackContext) -> None:
             context.bot.send_message(chat_id=chat_id, text=msg)
 
 
-def main():
-    """Main function that holds the handlers and starts the bot"""
-    updater = Updater(
-        token=BOT_TOKEN,
-        defaults=Defaults(
-            parse_mode="html", disable_web_page_preview=True, run_async=True
-        ),
-    )
+def add_handlers(dp: Dispatcher) -> None:
+    """Adds the handlers of the bot to the dispatcher
 
-    dp = updater.dispatcher
-    dp.bot_data["texts"]: Dict[Any, str] = texts
-    database = Database(DATABASE_URL.replace("postgres", "postgresql+psycopg2"))
-    dp.bot_data["db"]: Database = database
-    dp.bot_data["genius"]: GeniusT = GeniusT()
-    dp.bot_data["lyricsgenius"]: lg.Genius = lg.Genius(
-        GENIUS_TOKEN,
-        retries=2,
-        sleep_time=0,
-        verbose=False,
-    )
-    dp.bot_data["spotify"]: tk.Spotify = tk.Spotify(
-        tk.RefreshingCredentials(
-            SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
-        ).request_client_token()
-    )
-    dp.bot_data["recommender"] = Recommender()
+    The handlers expect the bot_data objects set up in main()
+    (db, genius, lyricsgenius, spotify, recommender and texts).
 
+    Args:
+        dp (Dispatcher): Dispatcher of the bot.
+    """
     # ----------------- MAIN MENU -----------------
 
     main_menu_handler = CommandHandler("start", main_menu, Filters.regex(r"^\D*$"))
@@ -586,7 +577,7 @@ def main():
         CallbackQueryHandler(reply_to_user, pattern=r"^reply_to_[0-9]+$"),
     ]
 
-    user_input = {
+    user_input: Dict[object, List[Handler]] = {
         TYPING_ALBUM: [
             MessageHandler(Filters.text & (~Filters.command), album.search_albums),
             CallbackQueryHandler(album.type_album, pattern="^(?!" + str(END) + ").*$"),
@@ -629,7 +620,7 @@ def main():
         ],
     }
 
-    commands = [
+    commands: List[Handler] = [
         CommandHandler("album", album.type_album),
         CommandHandler("artist", artist.type_artist),
         CommandHandler("lyric_card", lyric_card.type_lyrics),
@@ -662,9 +653,14 @@ def main():
     for command in non_input_commands:
         dp.add_handler(command)
 
-    # Tuple of (command, description) tuples
-    commands = tuple(texts["en"]["commands"].items())
-    dp.bot.set_my_commands(commands)
+    # ----------------- DEVELOPERS -----------------
+
+    developer_commands = [
+        CommandHandler("profile", developer.profile, Filters.user(DEVELOPERS)),
+        CommandHandler("memory", developer.memory_usage, Filters.user(DEVELOPERS)),
+    ]
+    for command in developer_commands:
+        dp.add_handler(command)
 
     # ----------------- INLINE QUERIES -----------------
 
@@ -783,7 +779,7 @@ def main():
             CommandHandler(
                 "shuffle",
                 recommender.welcome_to_shuffle,
-                NewShuffleUser(database=database, user_data=dp.user_data),
+                NewShuffleUser(database=dp.bot_data["db"], user_data=dp.user_data),
             ),
             CallbackQueryHandler(
                 recommender.welcome_to_shuffle,
@@ -829,10 +825,48 @@ def main():
     dp.add_handler(shuffle_preferences_conv_handler)
 
     # log all errors
-    dp.add_error_handler(error_handler)
+    dp.add_error_handler(error_handler)  # type: ignore[arg-type]
+
 
-    # web hook server to respond to GET cron jobs at /notify
-    # and receive user tokens at /callback
+def main():
+    """Main function that sets up the bot and starts it"""
+    updater = Updater(
+        token=BOT_TOKEN,
+        base_url=upstream_url("https://api.telegram.org/bot"),
+        base_file_url=upstream_url("https://api.telegram.org/file/bot"),
+        defaults=Defaults(
+            parse_mode="html", disable_web_page_preview=True, run_async=True
+        ),
+    )
+
+    dp = updater.dispatcher
+    dp.bot_data["texts"]: Dict[Any, str] = texts
+    database = Database(DATABASE_URL.replace("postgres", "postgresql+psycopg2"))
+    dp.bot_data["db"]: Database = database
+    dp.bot_data["genius"]: GeniusT = GeniusT()
+    dp.bot_data["lyricsgenius"]: lg.Genius = lg.Genius(
+        GENIUS_TOKEN,
+        retries=2,
+        sleep_time=0,
+        verbose=False,
+    )
+    use_upstream(dp.bot_data["lyricsgenius"]._session)
+    dp.bot_data["spotify"]: tk.Spotify = tk.Spotify(
+        tk.RefreshingCredentials(
+            SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
+        ).request_client_token()
+    )
+    dp.bot_data["recommender"] = Recommender()
+
+    add_handlers(dp)
+
+    # Tuple of (command, description) tuples
+    commands = tuple(texts["en"]["commands"].items())
+    dp.bot.set_my_commands(commands)
+
+    # web hook server to respond to GET cron jobs at /notify,
+    # receive user tokens at /callback and serve the metrics at /metrics
+    PROGRESS_LISTENERS.append(metrics.record_progress)
     if SERVER_PORT:
         webhook_thread = WebhookThread(
             BOT_TOKEN, SERVER_PORT, auths, database, texts, username, dp
@@ -845,6 +879,10 @@ def main():
     # else:
     updater.start_polling()
 
+    # load the lyric card fonts in the card workers
+    # instead of when the first card is requested
+    lyric_card_builder.card_pool.start()
+
     updater.idle()
 
 
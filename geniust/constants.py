@@ -24,6 +24,14 @@ DEVELOPERS: List[int] = (
 )
 SERVER_PORT: Optional[int] = int(os.environ["PORT"]) if "PORT" in os.environ else None
 SERVER_ADDRESS: Optional[str] = os.environ.get("SERVER_ADDRESS")
+UPSTREAM_URL: Optional[str] = os.environ.get("UPSTREAM_URL")
+# /metrics is only served to requests with this bearer token
+METRICS_TOKEN: Optional[str] = os.environ.get("METRICS_TOKEN")
+# each worker process imports the bot and its fonts, so only one by default
+PDF_WORKERS: int = int(os.environ.get("PDF_WORKERS", 1))
+CARD_WORKERS: int = int(os.environ.get("CARD_WORKERS", 1))
+# prepared cover arts are about 3MB each and every card worker keeps its own
+BASE_IMAGE_CACHE_SIZE: int = int(os.environ.get("BASE_IMAGE_CACHE_SIZE", 4))
 TELETHON_API_ID: str = os.environ["TELETHON_API_ID"]
 TELETHON_API_HASH: str = os.environ["TELETHON_API_HASH"]
 TELETHON_SESSION_STRING: str = os.environ["TELETHON_SESSION_STRING"]
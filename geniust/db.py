@@ -152,6 +152,65 @@ class Preferences(Base):
         )
 
 
+class TelegraphPages(Base):
+    __tablename__ = "telegraph_pages"
+    song_id = Column(BigInteger, primary_key=True)
+    include_annotations = Column(Boolean, primary_key=True)
+    lyrics_lang = Column(String, primary_key=True)
+    lyrics_hash = Column(String)
+    path = Column(String)
+
+    def __init__(
+        self,
+        song_id: int,
+        lyrics_hash: str,
+        include_annotations: bool,
+        lyrics_lang: str,
+        path: str,
+    ):
+        self.song_id = song_id
+        self.lyrics_hash = lyrics_hash
+        self.include_annotations = include_annotations
+        self.lyrics_lang = lyrics_lang
+        self.path = path
+
+    def __repr__(self):
+        return "TelegraphPages(song_id={song_id!r}, path={path!r})".format(
+            song_id=self.song_id, path=self.path
+        )
+
+
+class AlbumFiles(Base):
+    __tablename__ = "album_files"
+    album_id = Column(BigInteger, primary_key=True)
+    album_format = Column(String, primary_key=True)
+    include_annotations = Column(Boolean, primary_key=True)
+    lyrics_lang = Column(String, primary_key=True)
+    content_hash = Column(String)
+    file_id = Column(String)
+
+    def __init__(
+        self,
+        album_id: int,
+        album_format: str,
+        include_annotations: bool,
+        lyrics_lang: str,
+        content_hash: str,
+        file_id: str,
+    ):
+        self.album_id = album_id
+        self.album_format = album_format
+        self.include_annotations = include_annotations
+        self.lyrics_lang = lyrics_lang
+        self.content_hash = content_hash
+        self.file_id = file_id
+
+    def __repr__(self):
+        return "AlbumFiles(album_id={album_id!r}, file_id={file_id!r})".format(
+            album_id=self.album_id, file_id=self.file_id
+        )
+
+
 class Database:
     """Database class for all communications with the database."""
 
@@ -362,3 +421,129 @@ class Database:
             chat_id (int): Chat ID.
         """
         session.query(Preferences).filter(Preferences.chat_id == chat_id).delete()
+
+    @get_session
+    def get_telegraph_pages(
+        self,
+        song_ids: List[int],
+        include_annotations: bool,
+        lyrics_lang: str,
+        session=None,
+    ) -> Dict[Tuple[int, str], str]:
+        """Gets the Telegraph pages created for songs
+
+        Args:
+            song_ids (List[int]): Song IDs.
+            include_annotations (bool): Whether the pages include annotations.
+            lyrics_lang (str): Lyrics language of the pages.
+
+        Returns:
+            Dict[Tuple[int, str], str]: Telegraph page paths keyed
+                by song ID and lyrics hash.
+        """
+        pages = session.query(TelegraphPages).filter(
+            TelegraphPages.song_id.in_(song_ids),
+            TelegraphPages.include_annotations == include_annotations,
+            TelegraphPages.lyrics_lang == lyrics_lang,
+        )
+        return {(page.song_id, page.lyrics_hash): page.path for page in pages}
+
+    @get_session
+    def add_telegraph_pages(
+        self,
+        pages: Dict[Tuple[int, str], str],
+        include_annotations: bool,
+        lyrics_lang: str,
+        session=None,
+    ) -> None:
+        """Upserts Telegraph pages created for songs
+
+        The page of an older lyrics hash is replaced.
+
+        Args:
+            pages (Dict[Tuple[int, str], str]): Telegraph page paths keyed
+                by song ID and lyrics hash.
+            include_annotations (bool): Whether the pages include annotations.
+            lyrics_lang (str): Lyrics language of the pages.
+        """
+        for (song_id, lyrics_hash), path in pages.items():
+            session.merge(
+                TelegraphPages(
+                    song_id=song_id,
+                    lyrics_hash=lyrics_hash,
+                    include_annotations=include_annotations,
+                    lyrics_lang=lyrics_lang,
+                    path=path,
+                )
+            )
+
+    @get_session
+    def get_album_file(
+        self,
+        album_id: int,
+        album_format: str,
+        include_annotations: bool,
+        lyrics_lang: str,
+        content_hash: str,
+        session=None,
+    ) -> Optional[str]:
+        """Gets the Telegram file ID of an album sent before
+
+        Args:
+            album_id (int): Genius album ID.
+            album_format (str): Album format (pdf or zip).
+            include_annotations (bool): Whether the file includes annotations.
+            lyrics_lang (str): Lyrics language of the file.
+            content_hash (str): Hash of the current album content.
+
+        Returns:
+            Optional[str]: File ID or None if the album wasn't sent
+                with these preferences or its content has changed since.
+        """
+        album_file = (
+            session.query(AlbumFiles)
+            .filter(
+                AlbumFiles.album_id == album_id,
+                AlbumFiles.album_format == album_format,
+                AlbumFiles.include_annotations == include_annotations,
+                AlbumFiles.lyrics_lang == lyrics_lang,
+            )
+            .first()
+        )
+        if album_file is None or album_file.content_hash != content_hash:
+            return None
+        return album_file.file_id
+
+    @get_session
+    def add_album_file(
+        self,
+        album_id: int,
+        album_format: str,
+        include_annotations: bool,
+        lyrics_lang: str,
+        content_hash: str,
+        file_id: str,
+        session=None,
+    ) -> None:
+        """Upserts the Telegram file ID of a sent album
+
+        The file of an older content hash is replaced.
+
+        Args:
+            album_id (int): Genius album ID.
+            album_format (str): Album format (pdf or zip).
+            include_annotations (bool): Whether the file includes annotations.
+            lyrics_lang (str): Lyrics language of the file.
+            content_hash (str): Hash of the album content.
+            file_id (str): Telegram file ID.
+        """
+        session.merge(
+            AlbumFiles(
+                album_id=album_id,
+                album_format=album_format,
+                include_annotations=include_annotations,
+                lyrics_lang=lyrics_lang,
+                content_hash=content_hash,
+                file_id=file_id,
+            )
+        )
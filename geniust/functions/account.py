@@ -132,7 +132,7 @@ def display_account(update: Update, context: CallbackContext) -> int:
 
     avatar = account["avatar"]["medium"]["url"]
     caption = account_caption(update, context, account, texts["caption"])
-    context.bot.send_photo(chat_id, avatar, caption)
+    utils.send_photo(context.bot, chat_id, avatar, caption)
 
     return END
 
@@ -1,22 +1,36 @@
+import hashlib
+import json
 import logging
 import threading
-from typing import Any, Dict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple, Union
 
+import requests
+import telegraph
 from telegram import ForceReply
 from telegram import InlineKeyboardButton as IButton
 from telegram import InlineKeyboardMarkup as IBKeyboard
 from telegram import InputMediaPhoto, Update
-from telegram.error import NetworkError, TimedOut
+from telegram.error import NetworkError, TelegramError, TimedOut
 from telegram.ext import CallbackContext
 
 from geniust import api, get_user, utils
 from geniust.constants import DEVELOPERS, END, TYPING_ALBUM
-from geniust.utils import check_callback_query_user, log
+from geniust.utils import PoolBusyError, check_callback_query_user, log
 
-from .album_conversion import create_pages, create_pdf, create_zip
+from .album_conversion import (
+    AlbumFile,
+    PDFAlbumWriter,
+    TelegraphAlbumWriter,
+    ZipAlbumWriter,
+)
 
 logger = logging.getLogger("geniust")
 
+# Min seconds between two edits of the progress message of an album
+ALBUM_PROGRESS_INTERVAL = 3.0
+
 
 @log
 @get_user
@@ -134,7 +148,6 @@ def display_album(update: Update, context: CallbackContext) -> int:
             return END
 
     album = genius.album(album_id)["album"]
-    cover_art = utils.fix_image_format(genius, album["cover_art_url"])
     caption = album_caption(update, context, album, text["caption"])
 
     buttons = [
@@ -153,10 +166,12 @@ def display_album(update: Update, context: CallbackContext) -> int:
         )
         buttons[0].append(button)
 
-    bot.send_photo(
+    utils.send_photo(
+        bot,
         chat_id,
-        cover_art,
+        album["cover_art_url"],
         caption,
+        genius=genius,
         reply_markup=IBKeyboard(buttons),
         reply_to_message_id=reply_to_message_id,
     )
@@ -189,8 +204,12 @@ def display_album_covers(update: Update, context: CallbackContext) -> int:
 
     if len(covers) == 1:
         text = text[1].replace("{}", album)
-        context.bot.send_photo(
-            chat_id, covers[0], text, reply_to_message_id=reply_to_message_id
+        utils.send_photo(
+            context.bot,
+            chat_id,
+            covers[0],
+            text,
+            reply_to_message_id=reply_to_message_id,
         )
     elif len(covers) > 1:
         for media in utils.grouper(10, [InputMediaPhoto(x) for x in covers]):
@@ -227,19 +246,25 @@ def display_album_tracks(update: Update, context: CallbackContext) -> int:
         album_id = int(context.args[0].split("_")[1])
         reply_to_message_id = None
 
-    songs = []
-    for track in genius.album_tracks(album_id, per_page=50)["tracks"]:
-        num = track["number"]
-        num = f"{num:02d}" if num is not None else "--"
-        song = track["song"]
-        song = utils.deep_link(song["title"], song["id"], "song", "genius")
-        text = f"""\n{num}. {song}"""
-
-        songs.append(text)
+    songs = utils.deep_links(
+        (
+            {
+                "id": track["song"]["id"],
+                "title": track["song"]["title"],
+                "num": f"{track['number']:02d}"
+                if track["number"] is not None
+                else "--",
+            }
+            for track in genius.album_tracks(album_id, per_page=50)["tracks"]
+        ),
+        "song",
+        template="\n{num}. {link}",
+        name_key="title",
+    )
 
     album = genius.album(album_id)["album"]["name"]
 
-    text = f"{msg.replace('{}', album)}{''.join(songs)}"
+    text = f"{msg.replace('{}', album)}{songs}"
 
     context.bot.send_message(chat_id, text, reply_to_message_id=reply_to_message_id)
 
@@ -303,6 +328,66 @@ def thread_get_album(update: Update, context: CallbackContext) -> int:
     return END
 
 
+def album_hash(album: Dict[str, Any]) -> str:
+    """Returns the hash of the album content used to find changed albums.
+
+    Only the album and tracklist data is used, so the hash is available
+    before the lyrics are fetched. Editing the lyrics of a song
+    updates its lyrics_updated_at which changes the hash, but editing
+    its annotations doesn't, so it's only used for albums without them.
+
+    Args:
+        album (Dict[str, Any]): Album data (see GeniusT.album_stream).
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    tracks = album["tracks"]
+    if isinstance(tracks, api.AlbumTracks):
+        tracks = tracks.tracks
+    content = {
+        "name": album["name"],
+        "artist": album["artist"]["name"],
+        "tracks": [
+            [
+                track["number"],
+                track["song"]["id"],
+                track["song"]["title"],
+                track["song"].get("lyrics_updated_at"),
+                track["song"].get("updated_by_human_at"),
+            ]
+            for track in tracks
+        ],
+    }
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def send_album_file(
+    context: CallbackContext, chat_id: int, file_id: str, album: Dict[str, Any]
+) -> bool:
+    """Sends an album file that was sent before by its file ID.
+
+    Args:
+        context (CallbackContext): Context object.
+        chat_id (int): Chat ID.
+        file_id (str): Telegram file ID of the album file.
+        album (Dict[str, Any]): Album data.
+
+    Returns:
+        bool: True if the file was sent.
+    """
+    try:
+        context.bot.send_document(
+            chat_id=chat_id,
+            document=file_id,
+            caption=utils.format_title(album["artist"]["name"], album["name"]),
+        )
+    except TelegramError as e:
+        logger.warning("Couldn't send album file %s: %s", file_id, e)
+        return False
+    return True
+
+
 @log
 def get_album(
     update: Update,
@@ -337,52 +422,145 @@ def get_album(
 
     progress = context.bot.send_message(chat_id, msg)
 
-    # get album
-    album = genius_t.async_album_search(
-        album_id=album_id, include_annotations=include_annotations
-    )
-
-    # result should be a dict if the operation was successful
-    if not isinstance(album, dict):
-        msg = text["failed"]
-        progress.edit_text(msg)
-        logging.error(
-            f"Couldn't get album:\n" f"Album ID:{album_id}\n" f"Returned: {album}"
+    stage_texts = {
+        "fetched": text["downloading"],
+        "converted": text["publishing" if album_format == "tgf" else "converting"],
+    }
+
+    def show_progress(stages: Dict[str, Tuple[int, int]]) -> None:
+        msg = "\n".join(
+            text["progress"]
+            .replace("{stage}", stage_texts[stage])
+            .replace("{bar}", utils.progress_bar(done, total))
+            .replace("{done}", str(done))
+            .replace("{total}", str(total))
+            for stage, (done, total) in stages.items()
         )
+        try:
+            progress.edit_text(msg)
+        except TelegramError as e:
+            logger.debug("Couldn't update album progress: %s", e)
+
+    reporter = utils.ProgressReporter("album", show_progress, ALBUM_PROGRESS_INTERVAL)
+
+    def show_published(done: int, total: int) -> None:
+        reporter.update("converted", done, total)
+
+    writer: Optional[Union[PDFAlbumWriter, TelegraphAlbumWriter, ZipAlbumWriter]]
+    writer = None
+    file_writer: Union[PDFAlbumWriter, ZipAlbumWriter]
+    file: Union[BytesIO, AlbumFile]
+    database = context.bot_data["db"]
+    try:
+        album = genius_t.album_stream(album_id, include_annotations)
+
+        # albums sent before are sent again by their file ID
+        # unless their tracks have changed since then. Annotated albums
+        # aren't reused since editing an annotation doesn't change the hash.
+        reuse_file = album_format != "tgf" and not include_annotations
+        content_hash = ""
+        if reuse_file:
+            content_hash = album_hash(album)
+            file_id = database.get_album_file(
+                album_id,
+                album_format,
+                include_annotations,
+                ud["lyrics_lang"],
+                content_hash,
+            )
+            if file_id is not None and send_album_file(
+                context, chat_id, file_id, album
+            ):
+                progress.delete()
+                return
+
+        if album_format == "tgf":
+            tgf_writer = TelegraphAlbumWriter(
+                album,
+                ud,
+                progress=show_published,
+                database=database,
+                release_lyrics=True,
+            )
+            writer = tgf_writer
+        else:
+            if album_format == "pdf":
+                file_writer = PDFAlbumWriter(album, ud, release_lyrics=True)
+            else:
+                file_writer = ZipAlbumWriter(ud, release_lyrics=True)
+            writer = file_writer
+
+        # each track is converted as soon as it's fetched
+        # while the tracks after it are still being fetched
+        total = len(album["tracks"])
+        for done, track in enumerate(album["tracks"], 1):
+            reporter.update("fetched", done, total)
+            writer.add_track(track)
+            # Telegraph pages are published in the background
+            if album_format != "tgf":
+                reporter.update("converted", done, total)
+
+        if album_format == "tgf":
+            link = tgf_writer.close(album)
+            context.bot.send_message(chat_id=chat_id, text=link)
+            progress.delete()
+            return
+
+        # convert
+        msg = text["converting"]
+        progress.edit_text(msg)
+        file = file_writer.close(album)
+    except PoolBusyError:
+        progress.edit_text(text["busy"])
         return
-
-    # convert
-    msg = text["converting"]
-    progress.edit_text(msg)
-
-    if album_format == "pdf":
-        file = create_pdf(album, context.user_data)
-    elif album_format == "zip":
-        file = create_zip(album, context.user_data)
-    else:  # TELEGRA.PH
-        link = create_pages(album, context.user_data)
-        context.bot.send_message(chat_id=chat_id, text=link)
-        progress.delete()
+    except FutureTimeoutError:
+        progress.edit_text(text["failed"])
+        logger.error("Rendering the PDF of album %s timed out.", album_id)
         return
+    except (requests.RequestException, telegraph.TelegraphException) as e:
+        progress.edit_text(text["failed"])
+        logger.error("Couldn't get album %s: %s", album_id, e)
+        return
+    finally:
+        # releases the files and workers of writers that weren't closed
+        if writer is not None:
+            writer.abort()
 
     msg = text["uploading"]
     update.effective_chat.send_chat_action("upload_document")
     progress.edit_text(msg)
 
     # send the file
-    i = 1
-    while True:
-        if i <= 5:
+    try:
+        for _ in range(5):
+            # the file is read from the start on each attempt
+            file.seek(0)
             try:
-                context.bot.send_document(
+                message = context.bot.send_document(
                     chat_id=chat_id,
                     document=file,
+                    filename=file.name,
                     caption=file.name[:-4],
                     timeout=20,
                 )
-                break
             except (TimedOut, NetworkError):
-                i += 1
+                continue
+            if reuse_file:
+                database.add_album_file(
+                    album_id,
+                    album_format,
+                    include_annotations,
+                    ud["lyrics_lang"],
+                    content_hash,
+                    message.document.file_id,
+                )
+            break
+        else:
+            progress.edit_text(text["failed"])
+            logger.error("Couldn't upload album %s.", album_id)
+            return
+    finally:
+        file.close()
 
     progress.delete()
 
@@ -423,20 +601,10 @@ def album_caption(
 
     for x in album.get("song_performances", []):
         if x["label"] == "Featuring":
-            features = ", ".join(
-                [
-                    utils.deep_link(x["name"], x["id"], "artist", "genius")
-                    for x in x["artists"]
-                ]
-            )
+            features = utils.deep_links(x["artists"], "artist", sep=", ")
             features = caption["features"].replace("{}", features)
         elif x["label"] == "Label":
-            labels = ", ".join(
-                [
-                    utils.deep_link(x["name"], x["id"], "artist", "genius")
-                    for x in x["artists"]
-                ]
-            )
+            labels = utils.deep_links(x["artists"], "artist", sep=", ")
             labels = caption["labels"].replace("{}", labels)
 
     string = (
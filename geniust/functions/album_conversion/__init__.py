@@ -1,3 +1,3 @@
-from .pdf import create_pdf
-from .tgf import create_pages
-from .zip import create_zip
+from .pdf import PDFAlbumWriter, create_pdf
+from .tgf import TelegraphAlbumWriter, create_pages
+from .zip import AlbumFile, ZipAlbumWriter, create_zip
@@ -1,8 +1,10 @@
+import functools
 import json
 import pathlib
 import re
+import threading
 from io import BytesIO
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
 
 import reportlab
 import requests
@@ -20,6 +22,7 @@ from reportlab.platypus.tableofcontents import TableOfContents
 from rtl import reshaper
 
 from geniust import utils
+from geniust.constants import PDF_WORKERS
 
 here = pathlib.Path(__file__).parent.resolve()
 reportlab.rl_config.TTFSearchPath.append(here / "fonts")
@@ -28,20 +31,58 @@ font_regular = "Regular"
 font_bold = "Bold"
 font_persian = "Persian"
 
-# English fonts
-pdfmetrics.registerFont(TTFont(font_regular, "Barlow-Regular.ttf"))
-pdfmetrics.registerFont(TTFont(font_bold, "Barlow-Bold.ttf"))
-pdfmetrics.registerFont(TTFont("barlow-italic", "Barlow-Italic.ttf"))
-pdfmetrics.registerFontFamily(
-    font_regular, normal=font_regular, bold=font_bold, italic="barlow-italic"
+# Max number of PDFs waiting to be rendered or being rendered
+PDF_MAX_PENDING = PDF_WORKERS * 2
+# Seconds to wait for a PDF to be rendered
+PDF_TIMEOUT = 120.0
+
+fonts_registered = False
+fonts_lock = threading.Lock()
+
+
+def register_fonts() -> None:
+    """Registers the fonts used in the PDFs
+
+    The fonts are only registered once per process. It's the
+    initializer of the workers of the PDF pool.
+    """
+    global fonts_registered
+    with fonts_lock:
+        if fonts_registered:
+            return
+
+        # English fonts
+        pdfmetrics.registerFont(TTFont(font_regular, "Barlow-Regular.ttf"))
+        pdfmetrics.registerFont(TTFont(font_bold, "Barlow-Bold.ttf"))
+        pdfmetrics.registerFont(TTFont("barlow-italic", "Barlow-Italic.ttf"))
+        pdfmetrics.registerFontFamily(
+            font_regular, normal=font_regular, bold=font_bold, italic="barlow-italic"
+        )
+
+        # Persian fonts
+        pdfmetrics.registerFont(TTFont(font_persian, "Nahid.ttf"))
+        pdfmetrics.registerFont(TTFont("vazir-bold", "Vazir-Bold.ttf"))
+        pdfmetrics.registerFont(TTFont("vazir-thin", "Vazir-Thin.ttf"))
+        pdfmetrics.registerFontFamily(
+            font_persian, normal=font_persian, bold="vazir-bold", italic="vazir-thin"
+        )
+        fonts_registered = True
+
+
+# Max number of reshaped Arabic/Farsi words to memoize
+FARSI_WORD_CACHE_SIZE = 8192
+# Characters that are reshaped by the reshaper
+arabic_letters = re.compile(
+    "[{}]".format(
+        re.escape("".join(reshaper.ARABIC_GLYPHS) + "".join(reshaper.HARAKAT))
+    )
 )
+# The reshaper reshapes each line and each word of the lines separately
+line_separators = re.compile(r"\r?\n")
+word_separators = re.compile(r"\s")
 
-# Persian fonts
-pdfmetrics.registerFont(TTFont(font_persian, "Nahid.ttf"))
-pdfmetrics.registerFont(TTFont("vazir-bold", "Vazir-Bold.ttf"))
-pdfmetrics.registerFont(TTFont("vazir-thin", "Vazir-Thin.ttf"))
-pdfmetrics.registerFontFamily(
-    font_persian, normal=font_persian, bold="vazir-bold", italic="vazir-thin"
+pdf_pool = utils.WorkerPool(
+    workers=PDF_WORKERS, max_pending=PDF_MAX_PENDING, initializer=register_fonts
 )
 
 styles = getSampleStyleSheet()
@@ -122,48 +163,263 @@ class MyDocTemplate(BaseDocTemplate):
                 self.notify("TOCEntry", (0, text, self.page, key))
 
 
+@functools.lru_cache(maxsize=FARSI_WORD_CACHE_SIZE)
+def reshape_word(word: str) -> str:
+    """Reshapes (joins the letters of) an Arabic/Farsi word
+
+    Lyrics repeat the same words over and over, so the
+    reshaped words are memoized.
+
+    Args:
+        word (str): Word without spaces.
+
+    Returns:
+        str: Reshaped word.
+    """
+    return reshaper.reshape(word) if arabic_letters.search(word) else word
+
+
+@functools.lru_cache(maxsize=FARSI_WORD_CACHE_SIZE)
+def display_word(word: str) -> str:
+    """Reshapes an Arabic/Farsi word and puts it in display (RTL) order
+
+    Args:
+        word (str): Word without spaces.
+
+    Returns:
+        str: Reshaped word in display order.
+    """
+    return get_display(reshape_word(word)) if arabic_letters.search(word) else word
+
+
 def get_farsi_text(text: str, long_text: bool = False) -> Tuple[str, bool]:
     """Reshapes Arabic/Farsi words to be displayed properly in the PDF
 
     from https://stackoverflow.com/a/41346589/4249434
 
+    Text without Arabic letters is returned as is. Otherwise
+    the words are reshaped separately (reshaping doesn't go past
+    spaces) using the memoized reshape_word and the whole text
+    is put in display order.
+
     Args:
         text (str): string.
         long_text (bool, optional): If True, splits the string by space
-            (although it might be inaccurate) to avoid long processing times.
+            (although it might be inaccurate) and puts each word
+            in display order to avoid long processing times.
             Defaults to False.
 
     Returns:
         Tuple[str, bool]: Formatted string and True if string had Arabic letters.
     """
-    arabic = False
-    if reshaper.has_arabic_letters(text):
-        arabic = True
-        if long_text:
-            words = text.split()
-        else:
-            words = text.split(r"(\W)")
-        reshaped_words = []
-        for word in words:
-            if reshaper.has_arabic_letters(word):
-                # for reshaping and concating words
-                reshaped_text = reshaper.reshape(word)
-                # for right to left
-                bidi_text = get_display(reshaped_text)
-                reshaped_words.append(bidi_text)
-            else:
-                reshaped_words.append(word)
-        reshaped_words.reverse()
-        return " ".join(reshaped_words), arabic
-    return text, arabic
+    if not arabic_letters.search(text):
+        return text, False
+
+    if long_text:
+        words = [display_word(word) for word in text.split()]
+        words.reverse()
+        return " ".join(words), True
+
+    reshaped_text = "\n".join(
+        " ".join(reshape_word(word) for word in word_separators.split(line))
+        for line in line_separators.split(text)
+    )
+    return get_display(reshaped_text), True
 
 
 valid_tags = list(valid_attributes.keys())
 
 
+def check_persian(line: str) -> str:
+    """Formats line if it has Arabic/Persian characters.
+
+    If the line contains Arabic/Persian characters, the
+    font will also be changed to font_persian to correctly
+    render these characters which the normal font doesn't
+    contain.
+
+    Args:
+        line (str): string.
+
+    Returns:
+        str: Formatted string.
+    """
+    line, persian_char = get_farsi_text(line)
+    if persian_char:
+        line = f"<font name={font_persian}>{line}</font>"
+    return line
+
+
+def is_translation(album_name: str) -> bool:
+    """Returns True if the album is a Genius translation"""
+    return "ترجمه" in album_name or "Genius" in album_name
+
+
+translated_title = re.compile(r"^[\S\s]*-\s|\([^\x00-\x7F][\s\S]*")
+
+
+def pdf_track(
+    track: Dict[str, Any], user_data: Dict[str, Any], translation: bool
+) -> Dict[str, Any]:
+    """Converts the track to the paragraphs of its PDF page
+
+    Args:
+        track (Dict[str, Any]): Track including song data and lyrics.
+        user_data (Dict[str, Any]): User preferences.
+        translation (bool): Whether the album is a Genius translation.
+
+    Returns:
+        Dict[str, Any]: Title of the track and its lines
+            as (style name, line) tuples.
+    """
+    song = track["song"]
+    lyrics = song["lyrics"]
+    title = song["title"]
+    if translation:
+        sep = title.find("-")
+        title = translated_title.sub("", title[sep:]).strip()
+        title = get_farsi_text(title)[0]
+
+    # format annotations
+    lyrics = utils.format_annotations(
+        lyrics,
+        song["annotations"],
+        user_data["include_annotations"],
+        format_type="pdf",
+    )
+    lyrics = utils.format_language(lyrics, user_data["lyrics_lang"])
+    if lyrics.find("div"):
+        lyrics.find("div").unwrap()
+    elif lyrics.find("p"):
+        lyrics.find("p").unwrap()
+
+    lines = []
+    for tag in lyrics:
+        if not isinstance(tag, str):
+            utils.remove_unsupported_tags(tag, supported=valid_tags)
+        line = check_persian(str(tag)).strip().replace("\n", "<br/>")
+        if tag.name == "a":
+            lines.append(("Song Annotated", line))
+        elif tag.name == "annotation" or tag.parent.name == "annotation":
+            lines.append(("Song Annotations", line))
+        else:
+            lines.append(("Song Lyrics", line))
+    return {"title": title, "lines": lines}
+
+
+class PDFAlbumWriter:
+    """Converts album tracks to PDF pages as they are added
+
+    The tracks must be added in order. The tracks are converted to
+    picklable paragraphs which are laid out when the writer is closed.
+
+    Args:
+        album (Dict[str, Any]): Album data (without tracks).
+        user_data (Dict[str, Any]): User preferences.
+        release_lyrics (bool, optional): Remove the lyrics and annotations
+            of the track after it's converted to free memory. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        album: Dict[str, Any],
+        user_data: Dict[str, Any],
+        release_lyrics: bool = False,
+    ):
+        self.user_data = user_data
+        self.translation = is_translation(album["name"])
+        self.release_lyrics = release_lyrics
+        self.tracks: List[Dict[str, Any]] = []
+
+    def add_track(self, track: Dict[str, Any]) -> None:
+        """Converts the track and adds it to the album
+
+        Args:
+            track (Dict[str, Any]): Track including song data and lyrics.
+        """
+        self.tracks.append(pdf_track(track, self.user_data, self.translation))
+        if self.release_lyrics:
+            track["song"].pop("lyrics", None)
+            track["song"].pop("annotations", None)
+
+    def payload(self, album: Dict[str, Any]) -> Dict[str, Any]:
+        """Returns the data needed to build the PDF of the album
+
+        Downloads the cover art and only keeps the needed parts
+        of the album data, so that it can be sent to a worker process.
+
+        Args:
+            album (Dict[str, Any]): Album data.
+
+        Returns:
+            Dict[str, Any]: Picklable album payload.
+        """
+        return {
+            "name": album["name"],
+            "artist": album["artist"]["name"],
+            "description": album["description_annotation"]["annotations"][0]["body"][
+                "html"
+            ],
+            "cover_art": requests.get(
+                utils.upstream_url(album["cover_art_url"])
+            ).content,
+            "tracks": self.tracks,
+        }
+
+    def close(self, album: Dict[str, Any], timeout: float = PDF_TIMEOUT) -> BytesIO:
+        """Builds the PDF in the PDF pool
+
+        Building PDFs holds the GIL for seconds, so it's done in another
+        process to avoid blocking the other handlers.
+
+        Args:
+            album (Dict[str, Any]): Album data.
+            timeout (float, optional): Seconds to wait for the PDF.
+                Defaults to PDF_TIMEOUT.
+
+        Raises:
+            utils.PoolBusyError: If too many PDFs are being rendered.
+            concurrent.futures.TimeoutError: If the PDF isn't built in time.
+
+        Returns:
+            BytesIO: PDF file seeked to the 0 position.
+        """
+        bio = BytesIO(pdf_pool.run(build_pdf, self.payload(album), timeout=timeout))
+        bio.name = pdf_filename(album)
+        return bio
+
+    def abort(self) -> None:
+        """Removes the converted tracks to free memory"""
+        self.tracks = []
+
+
+def pdf_payload(data: Dict[str, Any], user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the data needed to build the PDF of the album
+
+    Args:
+        data (Dict[str, Any]): Album data.
+        user_data (Dict[str, Any]): User preferences.
+
+    Returns:
+        Dict[str, Any]: Picklable album payload.
+    """
+    writer = PDFAlbumWriter(data, user_data)
+    for track in data["tracks"]:
+        writer.add_track(track)
+    return writer.payload(data)
+
+
+def pdf_filename(data: Dict[str, Any]) -> str:
+    """Returns the file name of the album PDF"""
+    return f"{utils.format_title(data['artist']['name'], data['name'])}.pdf"
+
+
 def create_pdf(data: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
     """Creates a PDF file from supplied album data
 
+    The PDF is built in the current thread.
+    PDFAlbumWriter builds it in the PDF pool.
+
     Args:
         data (Dict[str, Any]): Album data.
         user_data (Dict[str, Any]): User preferences.
@@ -171,6 +427,21 @@ def create_pdf(data: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
     Returns:
         BytesIO: PDF file seeked to the 0 position.
     """
+    bio = BytesIO(build_pdf(pdf_payload(data, user_data)))
+    bio.name = pdf_filename(data)
+    return bio
+
+
+def build_pdf(payload: Dict[str, Any]) -> bytes:
+    """Builds the PDF of the album
+
+    Args:
+        payload (Dict[str, Any]): Album payload (see PDFAlbumWriter.payload).
+
+    Returns:
+        bytes: PDF file.
+    """
+    register_fonts()
     bio = BytesIO()
     doc = MyDocTemplate(
         bio, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18
@@ -179,25 +450,20 @@ def create_pdf(data: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
     # check_char = re.compile(r'[^\x00-\x7F]')  # Check for Non-English chars
     # Title
     page_break = PageBreak()
-    artist = data["artist"]["name"]
-    name = data["name"]
+    artist = payload["artist"]
+    name = payload["name"]
     persian = False
-    translation = False
 
-    bio.name = f"{utils.format_title(artist, name)}.pdf"
     if "ترجمه" in name:
         persian = True
-        translation = True
     elif "Genius" in name:
-        translation = True
-
         # The artist is "Genius Farsi Translations"
         # so we need to replace it with the actual artist name
         artist = name[: name.find("-")].strip()
         name = name[name.find("-") :].strip()
 
-        artist = get_farsi_text(artist)
-        name = get_farsi_text(name)
+        artist = get_farsi_text(artist)[0]
+        name = get_farsi_text(name)[0]
 
     # -------------- Cover Page --------------
 
@@ -216,8 +482,7 @@ def create_pdf(data: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
     Story.append(Spacer(1, 50))
 
     # Image
-    album_art = requests.get(data["cover_art_url"]).content
-    im = Image(BytesIO(album_art), width=A4[0], height=A4[0])
+    im = Image(BytesIO(payload["cover_art"]), width=A4[0], height=A4[0])
     Story.append(im)
     Story.append(page_break)
 
@@ -227,9 +492,7 @@ def create_pdf(data: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
     ptext = f'<font name={font_bold} size="25">Biography</font>'
     Story.append(Paragraph(ptext, styles["Titles"]))
     Story.append(Spacer(1, 20))
-    biography = BeautifulSoup(
-        data["description_annotation"]["annotations"][0]["body"]["html"], "html.parser"
-    )
+    biography = BeautifulSoup(payload["description"], "html.parser")
 
     utils.remove_unsupported_tags(biography, supported=valid_tags + ["href"])
 
@@ -285,72 +548,21 @@ def create_pdf(data: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
     Story.append(page_break)
 
     # -------------- Songs --------------
-    def check_persian(line: str) -> str:
-        """Formats line if it has Arabic/Persian characters.
-
-        If the line contains Arabic/Persian characters, the
-        font will also be changed to font_persian to correctly
-        render these characters which the normal font doesn't
-        contain.
-
-        Args:
-            line (str): string.
-
-        Returns:
-            str: Formatted string.
-        """
-        line, persian_char = get_farsi_text(str(tag))
-        if persian_char:
-            line = f"<font name={font_persian}>{line}</font>"
-        return line
-
-    format_title = re.compile(r"^[\S\s]*-\s|\([^\x00-\x7F][\s\S]*")
-    lyrics_language = user_data["lyrics_lang"]
-    include_annotations = user_data["include_annotations"]
-
-    for track in data["tracks"]:
-        song = track["song"]
-        lyrics = song["lyrics"]
-        title = song["title"]
-        if translation:
-            sep = title.find("-")
-            title = format_title.sub("", title[sep:]).strip()
-            title = get_farsi_text(title)[0]
-        Story.append(Paragraph(title, styles["Songs"]))
+    for song in payload["tracks"]:
+        Story.append(Paragraph(song["title"], styles["Songs"]))
         Story.append(Spacer(1, 50))
 
-        # format annotations
-        lyrics = utils.format_annotations(
-            lyrics,
-            song["annotations"],
-            include_annotations,
-            format_type="pdf",
-        )
-        lyrics = utils.format_language(lyrics, lyrics_language)
-        if lyrics.find("div"):
-            lyrics.find("div").unwrap()
-        elif lyrics.find("p"):
-            lyrics.find("p").unwrap()
-
-        for tag in lyrics:
-            if not isinstance(tag, str):
-                utils.remove_unsupported_tags(tag, supported=valid_tags)
-            if tag.name == "a":
-                line = check_persian(str(tag)).strip().replace("\n", "<br/>")
-                Story.append(Paragraph(line, styles["Song Annotated"]))
-            elif tag.name == "annotation" or tag.parent.name == "annotation":
-                line = check_persian(str(tag)).strip().replace("\n", "<br/>")
+        for style, line in song["lines"]:
+            if style == "Song Annotations":
                 Story.append(Spacer(1, 6))
-                Story.append(Paragraph(line, styles["Song Annotations"]))
+                Story.append(Paragraph(line, styles[style]))
                 Story.append(Spacer(1, 12))
             else:
-                line = check_persian(str(tag)).strip().replace("\n", "<br/>")
-                Story.append(Paragraph(line, styles["Song Lyrics"]))
+                Story.append(Paragraph(line, styles[style]))
         Story.append(page_break)
 
     doc.multiBuild(Story)
-    bio.seek(0)
-    return bio
+    return bio.getvalue()
 
 
 def test(json_file: str, lyrics_language: str, include_annotations: bool) -> None:
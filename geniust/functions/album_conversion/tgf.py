@@ -1,253 +1,626 @@
-import asyncio
+import functools
+import hashlib
 import json
 import logging
+import os
 import re
-from concurrent.futures import ThreadPoolExecutor
-from socket import timeout
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from http.client import HTTPException
+from io import BytesIO
 from time import sleep
-from typing import Any, Dict, List, Tuple, Union
-from urllib.error import HTTPError, URLError
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 
+import requests
 import telegraph
 from bs4 import BeautifulSoup
 
-from geniust import utils
-from geniust.constants import TELEGRAPH_TOKEN
+from geniust import api, utils
+from geniust.constants import TELEGRAPH_TOKEN, UPSTREAM_URL
+from geniust.db import Database
 
 logger = logging.getLogger("geniust")
 
-
-def fetch(img: str) -> Tuple[str, str]:
+TELEGRAPH_UPLOAD_URL = "https://telegra.ph/upload"
+
+# Max number of song pages created at the same time
+TELEGRAPH_WORKERS = 4
+# Number of attempts to create a page before giving up
+TELEGRAPH_RETRIES = 5
+# Delay between attempts which is doubled after each failed attempt
+TELEGRAPH_RETRY_DELAY = 0.2
+TELEGRAPH_MAX_RETRY_DELAY = 5.0
+
+# Max number of cover arts mirrored at the same time
+COVER_ART_WORKERS = 8
+# Seconds to wait for a cover art download
+COVER_ART_TIMEOUT = 10.0
+# Number of attempts to mirror a cover art before giving up
+COVER_ART_RETRIES = 3
+# Pool of cover art mirroring shared between albums
+COVER_ART_POOL = ThreadPoolExecutor(COVER_ART_WORKERS, thread_name_prefix="cover_art")
+# Telegraph URLs of mirrored cover arts keyed by the original URL
+MIRRORED_COVER_ARTS: utils.LRUCache[str] = utils.LRUCache(maxsize=1024)
+# Cover arts that are being mirrored, so that albums
+# and tracks that share a cover art only mirror it once
+MIRRORING_COVER_ARTS: Dict[str, "Future[Tuple[str, str]]"] = {}
+MIRRORING_LOCK = threading.RLock()
+
+
+def fetch(
+    img: str, timeout: float = COVER_ART_TIMEOUT, retries: int = COVER_ART_RETRIES
+) -> Tuple[str, str]:
     """Downloads the image and uploads it to telegraph
 
     Args:
         img (str): Genius image URL.
+        timeout (float, optional): Download timeout in seconds.
+            Defaults to COVER_ART_TIMEOUT.
+        retries (int, optional): Number of attempts.
+            Defaults to COVER_ART_RETRIES.
 
     Returns:
         Tuple[str, str]: The original image URL and the uploaded one.
+            The uploaded one is an empty string if the image couldn't be mirrored.
     """
-    req = Request(img, headers={"User-Agent": "Mozilla/5.0"})
-    while True:
+    req = Request(utils.upstream_url(img), headers={"User-Agent": "Mozilla/5.0"})
+    # Telegraph uses the file name to find out the image type
+    name = os.path.basename(urlparse(img).path)
+    for attempt in range(1, retries + 1):
         try:
-            webpage = urlopen(req)
-            path = telegraph.upload.upload_file(webpage)[0]
-            cover_art = "https://telegra.ph" + path
-        except timeout:
-            print("Timeout raised and caught")
-            continue
-        except (HTTPError, URLError) as e:
-            logger.critical(f"Error raised and caught: {e}")
-            cover_art = ""
-        break
-    return img, cover_art
-
-
-async def download_cover_arts(data: Dict[str, Any], q) -> None:  # type: ignore
-    """Downloads covert arts.
-
-    Download and uploads song cover arts asynchronously
-    and also avoids downloading and uploading images
-    with equal URLs.
+            with urlopen(req, timeout=timeout) as webpage:
+                image = BytesIO(webpage.read())
+            path = upload_image(image, name)
+            return img, "https://telegra.ph" + path
+        except (telegraph.TelegraphException, requests.RequestException) as e:
+            logger.debug(f"Couldn't upload {img} ({attempt}/{retries}): {e}")
+        except (OSError, HTTPException) as e:
+            # timeouts, URLErrors and connections that were reset
+            # or closed while reading the image
+            logger.debug(f"Couldn't download {img} ({attempt}/{retries}): {e}")
+    logger.error(f"Couldn't mirror {img}")
+    return img, ""
+
+
+def upload_image(image: BytesIO, name: str) -> str:
+    """Uploads the image to Telegraph
 
     Args:
-        data (Dict[str, Any]): Album data.
-        q (queue.Queue): Queue to put results in.
+        image (BytesIO): The image.
+        name (str): File name of the image which decides its type.
+
+    Raises:
+        telegraph.TelegraphException: If Telegraph rejects the image.
+
+    Returns:
+        str: Path of the image on telegra.ph.
     """
-    all_pics: List[Union[int, str]] = []
-    for track in data["tracks"]:
-        song = track["song"]
-        img = song["song_art_image_url"]
-        for i, uploaded_img in enumerate(all_pics):
-            if img == uploaded_img:
-                all_pics.append(i)
-                break
-        else:
-            all_pics.append(img)
-    all_pics.append(data["cover_art_url"])
-    with ThreadPoolExecutor(5) as executor:
-        loop = asyncio.get_event_loop()
-        tasks = [
-            loop.run_in_executor(executor, fetch, pic)
-            for pic in [x for x in all_pics if type(x) is str]
-        ]
-        for response in await asyncio.gather(*tasks):
-            all_pics = [response[1] if response[0] == x else x for x in all_pics]
-    q.put(all_pics)
+    if not UPSTREAM_URL:
+        return telegraph.upload.upload_file((image, name))[0]
+    # the telegraph package doesn't allow changing its URLs
+    response = requests.post(
+        utils.upstream_url(TELEGRAPH_UPLOAD_URL), files={"file": (name, image)}
+    ).json()
+    if isinstance(response, dict):
+        raise telegraph.TelegraphException(response.get("error"))
+    return response[0]["src"]
 
 
-def create_album_songs(
-    account: telegraph.Telegraph, album: Dict[str, Any], user_data: Dict[str, Any]
-) -> List[List[str]]:
-    """Creates Telegraph pages for songs of the album.
+def mirror_result(img: str, future: "Future[Tuple[str, str]]") -> str:
+    """Returns the mirrored URL of a finished mirroring
 
     Args:
-        account (telegraph.Telegraph): Telegraph account to upload songs with.
-        album (Dict[str, Any]): Album data.
+        img (str): Original URL of the image.
+        future (Future[Tuple[str, str]]): Future of fetch.
+
+    Returns:
+        str: Mirrored URL or an empty string if the mirroring failed.
+    """
+    try:
+        return future.result()[1]
+    except Exception as e:
+        logger.error(f"Couldn't mirror {img}: {e!r}")
+        return ""
+
+
+def mirrored_cover_art(img: str, future: "Future[Tuple[str, str]]") -> None:
+    """Caches the mirrored cover art once its mirroring is done.
+
+    Args:
+        img (str): Original URL of the cover art.
+        future (Future[Tuple[str, str]]): Future of fetch.
+    """
+    cover_art = ""
+    try:
+        cover_art = mirror_result(img, future)
+    finally:
+        with MIRRORING_LOCK:
+            if cover_art:
+                MIRRORED_COVER_ARTS.set(img, cover_art)
+            MIRRORING_COVER_ARTS.pop(img, None)
+
+
+def mirror_cover_arts(
+    urls: Iterable[str], timeout: Optional[float] = None
+) -> Dict[str, str]:
+    """Mirrors cover arts on Telegraph.
+
+    Downloads and uploads the images concurrently using the shared
+    cover art pool. Duplicate URLs and URLs that are already
+    being mirrored are only mirrored once and the mirrored URLs
+    are cached. Images that couldn't be mirrored keep their original URL.
+
+    Args:
+        urls (Iterable[str]): Image URLs.
+        timeout (Optional[float], optional): Max seconds to wait for
+            the images. Defaults to enough time for all the attempts.
+
+    Returns:
+        Dict[str, str]: Mirrored URLs keyed by the original ones.
+    """
+    futures: Dict[str, "Future[Tuple[str, str]]"] = {}
+    with MIRRORING_LOCK:
+        mirrored = {
+            url: MIRRORED_COVER_ARTS.get(url, "") for url in dict.fromkeys(urls)
+        }
+        for url, mirror in mirrored.items():
+            if mirror:
+                continue
+            future = MIRRORING_COVER_ARTS.get(url)
+            if future is None:
+                future = COVER_ART_POOL.submit(fetch, url)
+                MIRRORING_COVER_ARTS[url] = future
+                future.add_done_callback(functools.partial(mirrored_cover_art, url))
+            futures[url] = future
+    if timeout is None:
+        timeout = COVER_ART_TIMEOUT * COVER_ART_RETRIES * 2
+    done, not_done = wait(futures.values(), timeout=timeout)
+    for url, future in futures.items():
+        if future in done:
+            mirrored[url] = mirror_result(url, future)
+    if not_done:
+        logger.error(f"Mirroring {len(not_done)} cover arts timed out.")
+    return {url: mirror if mirror else url for url, mirror in mirrored.items()}
+
+
+def create_page(
+    account: telegraph.Telegraph,
+    title: str,
+    html_content: str,
+    retries: int = TELEGRAPH_RETRIES,
+) -> Dict[str, Any]:
+    """Creates a Telegraph page retrying on failures.
+
+    The delay between attempts starts at TELEGRAPH_RETRY_DELAY
+    and is doubled after each failed attempt up to TELEGRAPH_MAX_RETRY_DELAY.
+
+    Args:
+        account (telegraph.Telegraph): Telegraph account to create the page with.
+        title (str): Page title.
+        html_content (str): Page content.
+        retries (int, optional): Number of attempts. Defaults to TELEGRAPH_RETRIES.
+
+    Raises:
+        telegraph.TelegraphException: If all attempts fail.
+        requests.RequestException: If all attempts fail.
+
+    Returns:
+        Dict[str, Any]: Created page.
+    """
+    delay = TELEGRAPH_RETRY_DELAY
+    for attempt in range(1, retries + 1):
+        try:
+            return account.create_page(title=title, html_content=html_content)
+        except (telegraph.TelegraphException, requests.RequestException) as e:
+            if attempt == retries:
+                raise
+            logger.debug(f"Couldn't create {title} ({attempt}/{retries}): {e}")
+            sleep(delay)
+            delay = min(delay * 2, TELEGRAPH_MAX_RETRY_DELAY)
+    raise ValueError("retries must be a positive number.")
+
+
+def cover_art_figure(url: str, caption: str) -> str:
+    """Returns the HTML figure of a cover art.
+
+    Args:
+        url (str): Image URL.
+        caption (str): Figure caption.
+
+    Returns:
+        str: HTML figure.
+    """
+    return f'<figure><img src="{url}"><figcaption>{caption}</figcaption></figure>'
+
+
+def song_page(
+    track: Dict[str, Any], artist: str, user_data: Dict[str, Any]
+) -> Tuple[str, str]:
+    """Creates the Telegraph page content of a song.
+
+    Args:
+        track (Dict[str, Any]): Track including song data and lyrics.
+        artist (str): Album artist.
         user_data (Dict[str, Any]): User data.
 
     Returns:
-        List[List[str]]: List of song title and links.
+        Tuple[str, str]: Page title and page content.
     """
     # lyrics customizations
     include_annotations = user_data["include_annotations"]
     lyrics_language = user_data["lyrics_lang"]
     identifiers = ("!--!", "!__!")
-    song_links = []
 
-    artist = album["artist"]["name"]
-    translation = True if "Genius" in artist else False
+    song = track["song"]
+    lyrics = song["lyrics"]
+    title = song["title"]
+
+    # format annotations
+    lyrics = utils.format_annotations(
+        lyrics,
+        song["annotations"],
+        include_annotations,
+        identifiers,
+        format_type="telegraph",
+    )
 
-    # create pages
-    for track in album["tracks"]:
+    # formatting language
+    lyrics = utils.format_language(lyrics, lyrics_language)
+
+    for tag in lyrics.find_all("blockquote"):
+        tag.unwrap()
+        tag.decompose()
+
+    # convert annotation text style to quotes
+    for tag in lyrics.find_all("annotation"):
+        tag.name = "blockquote"
+
+    # include song description
+    description = ""
+    if song["description"]["html"]:
+        description = BeautifulSoup(song["description"]["html"], "html.parser")
+        for tag in description:
+            if tag.name in ("div", "script"):
+                tag.decompose()
+        description = str(description) + "<br><br>"
+
+    cover_art = cover_art_figure(song["song_art_image_url"], title) + "<br>"
+
+    if lyrics.find("div"):
+        lyrics.find("div").unwrap()
+
+    for a in lyrics.find_all("a"):
+        if a.get("href") is None:
+            a.name = "u"
+
+    for p in lyrics.find_all("p"):
+        p.unwrap()
+
+    for div in lyrics.find_all("div"):
+        div.unwrap()
+        div.decompose()
+
+    for img in lyrics.find_all("img"):
+        img.decompose()
+
+    # lyrics = re.sub(r'<br\s*[/]*>', '\n', str(lyrics))
+    lyrics = str(lyrics)
+    lyrics = utils.remove_extra_newlines(lyrics)
+    lyrics = lyrics.replace("\n", "<br>").replace("</u>", "</u><br>")
+
+    lyrics = f"{cover_art}" f"{description}" f"<aside>{lyrics}</aside>"
+
+    return utils.format_title(artist, title), lyrics
+
+
+def song_link_title(title: str, translation: bool) -> str:
+    """Returns the title of the song used in the album page.
+
+    Args:
+        title (str): Song title.
+        translation (bool): Whether the album is a Genius translation.
+
+    Returns:
+        str: Song title.
+    """
+    if translation:
+        # remove artist name from song title
+        title = re.sub(r".*[\s]* - ", "", title)
+        # remove "(this_language translation) from title"
+        # sometimes it's in brackets because the title itself
+        # already has word(s) in parantheses
+        if title.rfind(")") < title.rfind("]"):
+            title = title[: title.rfind(" [")]
+        else:
+            title = title[: title.rfind(" (")]
+    return title
+
+
+def page_hash(title: str, content: str) -> str:
+    """Returns the hash of a page used to find changed pages.
+
+    Args:
+        title (str): Page title.
+        content (str): Page content.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    return hashlib.sha256(f"{title}\n{content}".encode()).hexdigest()
+
+
+class TelegraphAlbumWriter:
+    """Publishes album tracks on Telegraph as they are added
+
+    Each track's page is published in the background as soon as it's
+    added, so the tracks can be published while the rest of the album
+    is being fetched. Tracks must be added in order. The cover arts of
+    the created pages are mirrored on Telegraph. If a database is passed,
+    songs that were already published with the same content and lyrics
+    preferences reuse their previous page.
+
+    Args:
+        album (Dict[str, Any]): Album data. Only the number of tracks and
+            their song IDs are used from the album's tracks.
+        user_data (Dict[str, Any]): User data.
+        account (telegraph.Telegraph, optional): Telegraph account to upload
+            songs with. Defaults to the bot's account.
+        workers (int, optional): Max number of pages created at the same time.
+            Defaults to TELEGRAPH_WORKERS.
+        progress (Callable[[int, int], Any], optional): Called with the number
+            of created pages and the total number of pages after each page.
+            Calls of concurrent pages can be out of order.
+        database (Database, optional): Database of published pages.
+        release_lyrics (bool, optional): Remove the lyrics and annotations
+            of the track after its page is made to free memory. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        album: Dict[str, Any],
+        user_data: Dict[str, Any],
+        account: Optional[telegraph.Telegraph] = None,
+        workers: int = TELEGRAPH_WORKERS,
+        progress: Optional[Callable[[int, int], Any]] = None,
+        database: Optional[Database] = None,
+        release_lyrics: bool = False,
+    ):
+        if account is None:
+            account = telegraph.api.Telegraph(access_token=TELEGRAPH_TOKEN)
+            # the telegraph package doesn't allow changing its URLs,
+            # but its requests can be recorded and redirected by the adapter
+            api.use_upstream(account._telegraph.session)
+        self.account = account
+        self.user_data = user_data
+        self.include_annotations = user_data["include_annotations"]
+        self.lyrics_language = user_data["lyrics_lang"]
+        self.artist = album["artist"]["name"]
+        self.translation = True if "Genius" in self.artist else False
+        self.total = len(album["tracks"])
+        self.progress = progress
+        self.database = database
+        self.release_lyrics = release_lyrics
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="telegraph")
+        self._pages: List[Tuple[str, "Future[str]"]] = []
+        self._created: Dict[Tuple[int, str], str] = {}
+        self._done = 0
+        self._lock = threading.Lock()
+
+        # the pages of the whole album are looked up at once
+        self._published: Dict[Tuple[int, str], str] = {}
+        if database is not None:
+            tracks = album["tracks"]
+            if isinstance(tracks, api.AlbumTracks):
+                tracks = tracks.tracks
+            self._published = database.get_telegraph_pages(
+                [track["song"]["id"] for track in tracks],
+                self.include_annotations,
+                self.lyrics_language,
+            )
+
+    def add_track(self, track: Dict[str, Any]) -> None:
+        """Publishes the track's page in the background
+
+        Args:
+            track (Dict[str, Any]): Track including song data and lyrics.
+        """
         song = track["song"]
-        lyrics = song["lyrics"]
-        title = song["title"]
-
-        # format annotations
-        lyrics = utils.format_annotations(
-            lyrics,
-            song["annotations"],
-            include_annotations,
-            identifiers,
-            format_type="telegraph",
+        page_title, content = song_page(track, self.artist, self.user_data)
+        key = (song["id"], page_hash(page_title, content))
+
+        path = self._published.get(key, "")
+        if path:
+            future: "Future[str]" = Future()
+            future.set_result(path)
+            self._page_done()
+        else:
+            future = self._executor.submit(
+                self._publish,
+                key,
+                page_title,
+                content,
+                song["song_art_image_url"],
+                song["title"],
+            )
+        self._pages.append((song_link_title(song["title"], self.translation), future))
+
+        if self.release_lyrics:
+            song.pop("lyrics", None)
+            song.pop("annotations", None)
+
+    def _publish(
+        self,
+        key: Tuple[int, str],
+        page_title: str,
+        content: str,
+        cover_art: str,
+        title: str,
+    ) -> str:
+        # the hash is computed with the original cover art, so that
+        # mirroring it again doesn't change the hash of the page
+        original_art = cover_art_figure(cover_art, title)
+        mirrored_art = cover_art_figure(
+            mirror_cover_arts([cover_art])[cover_art], title
         )
+        content = content.replace(original_art, mirrored_art, 1)
+
+        response = create_page(self.account, page_title, content)
+        logger.debug(f"Created {page_title} at {response['path']}")
+        with self._lock:
+            self._created[key] = response["path"]
+        self._page_done()
+        return response["path"]
+
+    def _page_done(self) -> None:
+        with self._lock:
+            self._done += 1
+            done = self._done
+        # reported after releasing the lock, since reporting edits a message
+        # and would block the other pages. The reports of concurrent pages
+        # can arrive out of order (utils.ProgressReporter drops stale ones).
+        if self.progress is not None:
+            self.progress(done, self.total)
+
+    def song_links(self) -> List[List[str]]:
+        """Waits for the song pages and returns their links
+
+        Raises:
+            telegraph.TelegraphException: If a page couldn't be created.
+            requests.RequestException: If a page couldn't be created.
+
+        Returns:
+            List[List[str]]: List of song links and titles in track order.
+        """
+        try:
+            links = [
+                [f"https://telegra.ph/{future.result()}", title]
+                for title, future in self._pages
+            ]
+        finally:
+            # only the pages after a failed one could still be pending
+            for _, future in self._pages:
+                future.cancel()
+            self._executor.shutdown(wait=False)
+            with self._lock:
+                created = dict(self._created)
+            if self.database is not None and created:
+                self.database.add_telegraph_pages(
+                    created, self.include_annotations, self.lyrics_language
+                )
+        return links
+
+    def abort(self) -> None:
+        """Cancels the pages that haven't been created and stops the workers
+
+        Pages that are being created are finished in the background.
+        """
+        for _, future in self._pages:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def close(self, album: Dict[str, Any]) -> str:
+        """Waits for the song pages and creates the album page
+
+        Args:
+            album (Dict[str, Any]): Album data.
+
+        Returns:
+            str: Telegraph album URL.
+        """
+        song_links = self.song_links()
+
+        # include album description
+        description = album["description_annotation"]["annotations"][0]["body"]["html"]
+        if description:
+            description = f"<br>{description}<br><br>"
+
+        # put the links in an HTML list
+        links = "".join(
+            [
+                f'<li><a href="{song_link.encode().decode()}">{song_title}</a></li>'
+                for song_link, song_title in song_links
+            ]
+        )
+        songs = f"<ol>{links}</ol>"
 
-        # formatting language
-        lyrics = utils.format_language(lyrics, lyrics_language)
-
-        for tag in lyrics.find_all("blockquote"):
-            tag.unwrap()
-            tag.decompose()
-
-        # convert annotation text style to quotes
-        for tag in lyrics.find_all("annotation"):
-            tag.name = "blockquote"
-
-        # include song description
-        description = ""
-        if song["description"]["html"]:
-            description = BeautifulSoup(song["description"]["html"], "html.parser")
-            for tag in description:
-                if tag.name in ("div", "script"):
-                    tag.decompose()
-            description = str(description) + "<br><br>"
-
-        cover_art = song["song_art_image_url"]
-        caption = f"<figcaption>{title}</figcaption>"
-        cover_art = f'<figure><img src="{cover_art}">{caption}</figure><br>'
-
-        if lyrics.find("div"):
-            lyrics.find("div").unwrap()
-
-        for a in lyrics.find_all("a"):
-            if a.get("href") is None:
-                a.name = "u"
-
-        for p in lyrics.find_all("p"):
-            p.unwrap()
-
-        for div in lyrics.find_all("div"):
-            div.unwrap()
-            div.decompose()
-
-        for img in lyrics.find_all("img"):
-            img.decompose()
-
-        # lyrics = re.sub(r'<br\s*[/]*>', '\n', str(lyrics))
-        lyrics = str(lyrics)
-        lyrics = utils.remove_extra_newlines(lyrics)
-        lyrics = lyrics.replace("\n", "<br>").replace("</u>", "</u><br>")
-
-        lyrics = f"{cover_art}" f"{description}" f"<aside>{lyrics}</aside>"
-
-        page_title = utils.format_title(artist, title)
-        # create telegraph page
-        j = 0.2
-        while True:
-            try:
-                response = account.create_page(title=page_title, html_content=lyrics)
-                break
-            except telegraph.TelegraphException:
-                sleep(j)
-                j += 0.2
-                continue
+        # add album cover art to the album post
+        album_art = album["cover_art_url"]
+        album_art = cover_art_figure(
+            mirror_cover_arts([album_art])[album_art], album["name"]
+        )
 
-        # store song page link
-        respone_link = f'https://telegra.ph/{response["path"]}'
+        page_text = f"{album_art}" f"{description}" f"Songs:<br>{songs}"
 
-        if translation:
-            # remove artist name from song title
-            title = re.sub(r".*[\s]* - ", "", title)
-            # remove "(this_language translation) from title"
-            # sometimes it's in brackets because the title itself
-            # already has word(s) in parantheses
-            if title.rfind(")") < title.rfind("]"):
-                title = title[: title.rfind(" [")]
-            else:
-                title = title[: title.rfind(" (")]
+        title = utils.format_title(album["artist"]["name"], album["name"])
 
-        song_links.append([respone_link, title])
-        logger.debug(f"Created {title} at {respone_link}")
-    return song_links
+        # create the album post
+        response = create_page(self.account, title, page_text)
+        response_link = f'https://telegra.ph/{response["path"]}'
 
+        return response_link
 
-def create_pages(album: Dict[str, Any], user_data: Dict[str, Any]) -> str:
-    """Creates Telegraph album.
 
-    Creates a Telegraph page for each song and a final
-    album page with links to all the tracks.
+def create_album_songs(
+    account: telegraph.Telegraph,
+    album: Dict[str, Any],
+    user_data: Dict[str, Any],
+    workers: int = TELEGRAPH_WORKERS,
+    progress: Optional[Callable[[int, int], Any]] = None,
+    database: Optional[Database] = None,
+) -> List[List[str]]:
+    """Creates Telegraph pages for songs of the album.
 
     Args:
+        account (telegraph.Telegraph): Telegraph account to upload songs with.
         album (Dict[str, Any]): Album data.
         user_data (Dict[str, Any]): User data.
+        workers (int, optional): Max number of pages created at the same time.
+            Defaults to TELEGRAPH_WORKERS.
+        progress (Callable[[int, int], Any], optional): Called with the number
+            of created pages and the total number of pages after each page.
+        database (Database, optional): Database of published pages.
 
     Returns:
-        str: Telegraph album URL.
+        List[List[str]]: List of song title and links.
     """
-    # download cover arts async
-    # q = queue.Queue()
-    # new_loop = asyncio.new_event_loop()
-    # asyncio.set_event_loop(new_loop)
-    # future = asyncio.ensure_future(download_cover_arts(album, q))
-    # new_loop.run_until_complete(future)
-    # cover_arts = q.get()
-    # logger.debug(f'Uploaded cover arts')
-
-    # connect to Telegraph account
-    account = telegraph.api.Telegraph(access_token=TELEGRAPH_TOKEN)
-
-    # create song pages
-    song_links = create_album_songs(account, album, user_data)
-
-    # include album description
-    description = album["description_annotation"]["annotations"][0]["body"]["html"]
-    if description:
-        description = f"<br>{description}<br><br>"
-
-    # put the links in an HTML list
-    links = "".join(
-        [
-            f'<li><a href="{song_link.encode().decode()}">{song_title}</a></li>'
-            for song_link, song_title in song_links
-        ]
+    writer = TelegraphAlbumWriter(
+        album, user_data, account, workers, progress=progress, database=database
     )
-    songs = f"<ol>{links}</ol>"
+    for track in album["tracks"]:
+        writer.add_track(track)
+    return writer.song_links()
 
-    # add album cover art to the album post
-    album_art = album["cover_art_url"]
-    caption = f'<figcaption>{album["name"]}</figcaption>'
-    album_art = f'<figure><img src="{album_art}">{caption}</figure>'
 
-    page_text = f"{album_art}" f"{description}" f"Songs:<br>{songs}"
+def create_pages(
+    album: Dict[str, Any],
+    user_data: Dict[str, Any],
+    progress: Optional[Callable[[int, int], Any]] = None,
+    database: Optional[Database] = None,
+) -> str:
+    """Creates Telegraph album.
 
-    title = utils.format_title(album["artist"]["name"], album["name"])
+    Creates a Telegraph page for each song and a final
+    album page with links to all the tracks. Song pages that
+    are in the database are reused.
 
-    # create the album post
-    response = account.create_page(title=title, html_content=page_text)
-    response_link = f'https://telegra.ph/{response["path"]}'
+    Args:
+        album (Dict[str, Any]): Album data.
+        user_data (Dict[str, Any]): User data.
+        progress (Callable[[int, int], Any], optional): Called with the number
+            of created song pages and the total number of song pages.
+        database (Database, optional): Database of published pages.
 
-    return response_link
+    Returns:
+        str: Telegraph album URL.
+    """
+    writer = TelegraphAlbumWriter(
+        album, user_data, progress=progress, database=database
+    )
+    for track in album["tracks"]:
+        writer.add_track(track)
+    return writer.close(album)
 
 
 def test(json_file: str, lyrics_language: str, include_annotations: bool) -> None:
@@ -1,53 +1,93 @@
 import json
 import re
-from io import BytesIO
+import threading
+from tempfile import SpooledTemporaryFile
 from typing import Any, Dict
 from zipfile import ZIP_DEFLATED, ZipFile
 
 from geniust import utils
 
+# Archives bigger than this are moved from memory to a file on disk.
+ZIP_SPOOL_THRESHOLD = 10 * 1024 * 1024
 
-def create_zip(album: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
-    """Creates zipped album
-
-    Creates the album from the album data, applyting user_data,
-    and returns an in-memory file.
 
-    Args:
-        album (Dict[str, Any]): Album data
-        user_data (Dict[str, Any]): User data.
+class AlbumFile(SpooledTemporaryFile):
+    """A spooled temporary file that has a display name
 
-    Returns:
-        BytesIO: ZIP file seeked to the 0 position.
+    SpooledTemporaryFile doesn't allow setting its name and
+    once it rolls over to disk, its name becomes a file descriptor.
+    send_document uses the name as the file name of the document.
     """
-    bio = BytesIO()
-    zip_file = ZipFile(bio, "a", compression=ZIP_DEFLATED)
 
-    # put user_data in variables
-    lyrics_language = user_data["lyrics_lang"]
-    include_annotations = user_data["include_annotations"]
-    identifiers = ("!--!", "!__!")
+    def __init__(self, name: str = "", max_size: int = ZIP_SPOOL_THRESHOLD):
+        super().__init__(max_size=max_size, mode="w+b")
+        self._name = name
 
-    # set zip file name
-    name = album["name"]
-    artist = album["artist"]["name"]
-    full_title = utils.format_title(artist, name)
-    full_title = utils.format_filename(full_title)
-    bio.name = f"{full_title}.zip"
+    @property
+    def name(self) -> str:  # type: ignore
+        return self._name
 
-    # Save the songs as text
-    for track in album["tracks"]:
+    @name.setter
+    def name(self, value: str) -> None:
+        self._name = value
+
+    # Not defined by SpooledTemporaryFile before Python 3.11,
+    # but needed by ZipFile to read the archive.
+    def readable(self) -> bool:
+        return self._file.readable()  # type: ignore
+
+    def seekable(self) -> bool:
+        return self._file.seekable()  # type: ignore
+
+
+class ZipAlbumWriter:
+    """Streams album tracks into a ZIP file
+
+    Each track is compressed as soon as it's added, so the tracks can
+    be written as they are fetched. The archive is kept in memory
+    until it gets bigger than max_size and is moved to disk after that.
+    Adding tracks is thread-safe.
+
+    Args:
+        user_data (Dict[str, Any]): User data.
+        max_size (int, optional): Max size of the archive in memory.
+            Defaults to ZIP_SPOOL_THRESHOLD.
+        release_lyrics (bool, optional): Remove the lyrics and annotations
+            of the track after it's written to free memory. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        user_data: Dict[str, Any],
+        max_size: int = ZIP_SPOOL_THRESHOLD,
+        release_lyrics: bool = False,
+    ):
+        self.lyrics_language = user_data["lyrics_lang"]
+        self.include_annotations = user_data["include_annotations"]
+        self.release_lyrics = release_lyrics
+        self.file = AlbumFile(max_size=max_size)
+        self._zip_file = ZipFile(self.file, "w", compression=ZIP_DEFLATED)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def add_track(self, track: Dict[str, Any]) -> None:
+        """Compresses the track's lyrics and adds it to the archive
+
+        Args:
+            track (Dict[str, Any]): Track including song data and lyrics.
+        """
+        identifiers = ("!--!", "!__!")
         song = track["song"]
         number = track["number"]
         lyrics = song["lyrics"]
 
         # format annotations
         lyrics = utils.format_annotations(
-            lyrics, song["annotations"], include_annotations, identifiers
+            lyrics, song["annotations"], self.include_annotations, identifiers
         )
 
         # formatting lyrics language
-        lyrics = utils.format_language(lyrics, lyrics_language)
+        lyrics = utils.format_language(lyrics, self.lyrics_language)
 
         # newlines in text files inside zip files need to be
         # \r\n on Windows
@@ -60,12 +100,77 @@ def create_zip(album: Dict[str, Any], user_data: Dict[str, Any]) -> BytesIO:
         title = utils.format_filename(title)
 
         # create lyrics file
-        file_name = f"{number:02d} - {title}.txt"
-        zip_file.writestr(file_name, lyrics)
+        number = f"{number:02d}" if number is not None else "--"
+        file_name = f"{number} - {title}.txt"
+        with self._lock:
+            self._zip_file.writestr(file_name, lyrics)
+
+        if self.release_lyrics:
+            song.pop("lyrics", None)
+            song.pop("annotations", None)
+
+    def close(self, album: Dict[str, Any]) -> AlbumFile:
+        """Finalizes the archive and names it after the album
+
+        Args:
+            album (Dict[str, Any]): Album data.
+
+        Returns:
+            AlbumFile: ZIP file seeked to the 0 position.
+        """
+        with self._lock:
+            self._zip_file.close()
+            self._closed = True
+
+        # set zip file name
+        name = album["name"]
+        artist = album["artist"]["name"]
+        full_title = utils.format_title(artist, name)
+        full_title = utils.format_filename(full_title)
+        self.file.name = f"{full_title}.zip"
+
+        self.file.seek(0)
+        return self.file
+
+    def abort(self) -> None:
+        """Closes the archive and its file if the writer wasn't closed
+
+        The file of a closed writer belongs to the caller of close.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._zip_file.close()
+            self.file.close()
+
+
+def create_zip(
+    album: Dict[str, Any],
+    user_data: Dict[str, Any],
+    max_size: int = ZIP_SPOOL_THRESHOLD,
+) -> AlbumFile:
+    """Creates zipped album
+
+    Creates the album from the album data, applyting user_data,
+    and returns a spooled file.
+
+    Args:
+        album (Dict[str, Any]): Album data
+        user_data (Dict[str, Any]): User data.
+        max_size (int, optional): Max size of the archive in memory.
+            Defaults to ZIP_SPOOL_THRESHOLD.
+
+    Returns:
+        AlbumFile: ZIP file seeked to the 0 position.
+    """
+    writer = ZipAlbumWriter(user_data, max_size=max_size)
+
+    # Save the songs as text
+    for track in album["tracks"]:
+        writer.add_track(track)
 
-    zip_file.close()
-    bio.seek(0)
-    return bio
+    return writer.close(album)
 
 
 # driver code
@@ -78,4 +183,4 @@ def test(json_file: str, lyrics_language: str, include_annotations: bool) -> Non
     }
     file = create_zip(data, user_data)
     with open("test.zip", "wb") as f:  # type: ignore
-        f.write(file.getvalue())  # type: ignore
+        f.write(file.read())  # type: ignore
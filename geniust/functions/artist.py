@@ -120,7 +120,6 @@ def display_artist(update: Update, context: CallbackContext) -> int:
             return END
 
     artist = genius.artist(artist_id)["artist"]
-    cover_art = utils.fix_image_format(genius, artist["image_url"])
     caption = artist_caption(update, context, artist, text["caption"], language)
 
     buttons = [
@@ -152,10 +151,12 @@ def display_artist(update: Update, context: CallbackContext) -> int:
         )
         buttons[0].append(button)
 
-    bot.send_photo(
+    utils.send_photo(
+        bot,
         chat_id,
-        cover_art,
+        artist["image_url"],
         caption,
+        genius=genius,
         reply_markup=IBKeyboard(buttons),
         reply_to_message_id=reply_to_message_id,
     )
@@ -243,27 +244,32 @@ def display_artist_songs(update: Update, context: CallbackContext) -> int:
     else:
         sort = "title"
 
-    songs = []
     per_page = 50
     songs_list = genius.artist_songs(artist_id, per_page=per_page, page=page, sort=sort)
     next_page = songs_list["next_page"]
     previous_page = page - 1 if page != 1 else None
 
+    songs = []
     for i, song in enumerate(songs_list["songs"]):
-        num = per_page * (page - 1) + i + 1
-        title = f"\n{num:02} - {utils.deep_link(song['title'], song['id'], 'song', 'genius')}"
-
         views = song["stats"].get("pageviews")
-        if sort == "popularity" and views:
-            views = utils.human_format(views)
-            title += f" ({views})"
-
-        songs.append(title)
+        songs.append(
+            {
+                "id": song["id"],
+                "title": song["title"],
+                "num": per_page * (page - 1) + i + 1,
+                "views": f" ({utils.human_format(views)})"
+                if sort == "popularity" and views
+                else "",
+            }
+        )
 
     if songs:
         artist = songs_list["songs"][0]["primary_artist"]["name"]
         msg = text["songs"].replace("{artist}", artist).replace("{sort}", text[sort])
-        string = f"{msg}\n{''.join(songs)}"
+        songs_text = utils.deep_links(
+            songs, "song", template="\n{num:02} - {link}{views}", name_key="title"
+        )
+        string = f"{msg}\n{songs_text}"
     else:
         artist = genius.artist(artist_id)["artist"]["name"]
         text = text["no_songs"].replace("{}", artist)
@@ -0,0 +1,149 @@
+import html
+import logging
+import re
+from io import BytesIO
+
+from telegram import Bot, Update
+from telegram.ext import CallbackContext
+
+from geniust import memory, profiling, utils
+from geniust.functions import inline_query, lyric_card, lyric_card_builder
+from geniust.functions.album_conversion import pdf, tgf
+from geniust.utils import log
+
+logger = logging.getLogger("geniust")
+
+# Number of handler calls /profile profiles by default
+PROFILE_CALLS = 20
+
+# Max number of handler calls or seconds of a /profile
+PROFILE_MAX_CALLS = 1000
+PROFILE_MAX_SECONDS = 600
+
+# Max number of frames of the tracebacks of /memory start
+MEMORY_MAX_FRAMES = 25
+
+# Longer /memory reports are sent as a file
+MESSAGE_MAX_LENGTH = 4000
+
+# In-memory caches reported by /memory
+MEMORY_CACHES = {
+    "photo_file_ids": utils.PHOTO_FILE_IDS,
+    "deep_linked_url": utils.deep_linked_url,
+    "lyric_cards": lyric_card.LYRIC_CARDS,
+    "pending_lyric_cards": inline_query.PENDING_LYRIC_CARDS,
+    "base_images": lyric_card_builder.BASE_IMAGES,
+    "layout_lyrics": lyric_card_builder.layout_lyrics,
+    "layout_metadata": lyric_card_builder.layout_metadata,
+    "reshape_word": pdf.reshape_word,
+    "display_word": pdf.display_word,
+    "mirrored_cover_arts": tgf.MIRRORED_COVER_ARTS,
+    "mirroring_cover_arts": tgf.MIRRORING_COVER_ARTS,
+}
+
+
+def send_profile_report(
+    bot: Bot, chat_id: int, report: profiling.ProfileReport
+) -> None:
+    """Sends the summary and the stats file of the report"""
+    bot.send_message(chat_id, f"<pre>{html.escape(report.summary())}</pre>")
+    bot.send_document(chat_id, BytesIO(report.dump()), filename="handlers.prof")
+
+
+@log
+def profile(update: Update, context: CallbackContext) -> None:
+    """Profiles the handlers of the next updates (developers only)
+
+    /profile [N] profiles the next N handler calls (20 by default),
+    /profile Ns the handlers that run in the next N seconds
+    and /profile stop stops the profiler and sends its report.
+    """
+    chat_id = update.effective_chat.id
+    argument = context.args[0].lower() if context.args else str(PROFILE_CALLS)
+    profiler = profiling.PROFILER
+
+    if argument == "stop":
+        if profiler.active:
+            profiler.stop()
+        else:
+            update.message.reply_text("The profiler isn't running.")
+        return
+
+    match = re.fullmatch(r"(\d+)(s?)", argument)
+    if match is None:
+        update.message.reply_text("Usage: /profile [calls | seconds(s) | stop]")
+        return
+
+    number = int(match[1])
+    if match[2]:
+        calls, seconds = None, float(min(number, PROFILE_MAX_SECONDS))
+        target = f"for {seconds:.0f} seconds"
+    else:
+        calls, seconds = min(number, PROFILE_MAX_CALLS), None
+        target = f"for the next {calls} handler calls"
+
+    bot = context.bot
+    started = profiler.start(
+        lambda report: send_profile_report(bot, chat_id, report),
+        calls=calls,
+        seconds=seconds,
+    )
+    if started:
+        update.message.reply_text(f"Profiling the handlers {target}.")
+    else:
+        update.message.reply_text("The profiler is already running.")
+
+
+def send_memory_report(bot: Bot, chat_id: int, report: str) -> None:
+    """Sends the report as a message or as a file if it's too long"""
+    if len(report) <= MESSAGE_MAX_LENGTH:
+        bot.send_message(chat_id, f"<pre>{html.escape(report)}</pre>")
+    else:
+        bot.send_document(chat_id, BytesIO(report.encode()), filename="memory.txt")
+
+
+@log
+def memory_usage(update: Update, context: CallbackContext) -> None:
+    """Reports the memory usage of the bot (developers only)
+
+    /memory reports the sizes of user_data, bot_data, the caches and
+    the job queue and, while tracemalloc is tracing, the top allocations
+    and how they changed since the previous /memory.
+    /memory start [frames] starts tracing and /memory stop stops it.
+    """
+    chat_id = update.effective_chat.id
+    argument = context.args[0].lower() if context.args else None
+    tracer = memory.TRACER
+
+    if argument == "start":
+        frames = context.args[1] if len(context.args) > 1 else "1"
+        if not frames.isdigit() or int(frames) < 1:
+            update.message.reply_text("Usage: /memory start [frames]")
+            return
+        if tracer.start(min(int(frames), MEMORY_MAX_FRAMES)):
+            update.message.reply_text(
+                "Tracing allocations. This slows down the bot,"
+                " so stop it with /memory stop when you're done."
+            )
+        else:
+            update.message.reply_text("Already tracing allocations.")
+        return
+    elif argument == "stop":
+        if tracer.tracing:
+            tracer.stop()
+            update.message.reply_text("Stopped tracing allocations.")
+        else:
+            update.message.reply_text("Allocations aren't being traced.")
+        return
+    elif argument is not None:
+        update.message.reply_text("Usage: /memory [start [frames] | stop]")
+        return
+
+    sizes = memory.store_sizes(context.dispatcher, MEMORY_CACHES)
+    report = memory.format_store_sizes(sizes)
+    allocations = tracer.snapshot()
+    if allocations is None:
+        report += "\n\nStart tracing allocations with /memory start."
+    else:
+        report += "\n\n" + allocations.summary()
+    send_memory_report(context.bot, chat_id, report)
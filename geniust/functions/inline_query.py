@@ -1,5 +1,8 @@
 import logging
-from typing import Any, Dict, List
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Union
 from uuid import uuid4
 
 import Levenshtein
@@ -7,6 +10,7 @@ from telegram import InlineKeyboardButton as IButton
 from telegram import InlineKeyboardMarkup as IBKeyboard
 from telegram import (
     InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
     InlineQueryResultPhoto,
     InputTextMessageContent,
     Update,
@@ -16,10 +20,45 @@ from telegram.utils.helpers import create_deep_linked_url
 
 from geniust import get_user, username, utils
 from geniust.api import upload_to_imgbb
-from geniust.functions.lyric_card_builder import build_lyric_card
-from geniust.utils import log
+from geniust.functions.lyric_card import (
+    LYRIC_CARD_EXPIRATION,
+    LYRIC_CARDS,
+    CachedLyricCard,
+    lyric_card_key,
+)
+from geniust.functions.lyric_card_builder import (
+    BUILDER_IMAGE_SIZE,
+    CARD_MAX_BYTES,
+    CARD_MAX_PENDING,
+    CARD_QUALITY,
+    CARDS_PER_QUERY,
+    card_pool,
+    render_lyric_card,
+)
+from geniust.utils import PoolBusyError, log
 
 logger = logging.getLogger("geniust")
+LyricCardResult = Union[InlineQueryResultPhoto, InlineQueryResultCachedPhoto]
+
+# Max number of matching songs to build lyric cards for
+LYRIC_CARD_CANDIDATES = CARDS_PER_QUERY
+# Seconds to wait for lyric cards before answering the inline query
+LYRIC_CARD_LATENCY_BUDGET = 4.0
+# Seconds to wait for the first lyric card if none were ready in the budget
+LYRIC_CARD_MAX_LATENCY = 8.0
+# Seconds to wait for a lyric card to be rendered
+LYRIC_CARD_TIMEOUT = 30.0
+# Seconds the lyric cards that weren't ready in time are kept for the next page
+LYRIC_CARD_PENDING_TTL = 120.0
+
+# Threads that fetch the songs, wait for the renders and upload the cards
+lyric_card_threads = ThreadPoolExecutor(
+    CARD_MAX_PENDING, thread_name_prefix="lyric_card"
+)
+# Lyric cards that weren't ready in time keyed by the next_offset of the answer
+PENDING_LYRIC_CARDS: utils.LRUCache[
+    List["Future[Optional[LyricCardResult]]"]
+] = utils.LRUCache(maxsize=1024, ttl=LYRIC_CARD_PENDING_TTL)
 
 
 @log
@@ -304,46 +343,69 @@ def search_lyrics(update: Update, context: CallbackContext) -> None:
     ]
 
     res = genius.search_lyrics(input_text, per_page=10)
-    articles = []
-    for hit in res["sections"][0]["hits"][:10]:
-        song = hit["result"]
-        title = song["title"]
-        artist = song["primary_artist"]["name"]
-        answer_title = utils.format_title(artist, title)
-        song_id = song["id"]
-
-        answer_text = song_caption(update, context, song, text["caption"], language)
-        song_url = create_deep_linked_url(username, f"song_{song_id}_genius")
-        lyrics_url = create_deep_linked_url(username, f"song_{song_id}_lyrics")
-        buttons = [
-            [IButton(texts["inline_menu"]["full_details"], url=song_url)],
-            [IButton(texts["display_song"]["lyrics"], url=lyrics_url)],
-            search_more,
-        ]
-        keyboard = IBKeyboard(buttons)
-        answer = InlineQueryResultArticle(
-            id=str(uuid4()),
-            title=answer_title,
-            thumb_url=song["song_art_image_thumbnail_url"],
-            input_message_content=InputTextMessageContent(
-                answer_text, disable_web_page_preview=False
-            ),
-            reply_markup=keyboard,
-            description=hit["highlights"][0]["value"],
-        )
-        # It's possible to provide results that are captioned photos
-        # of the song cover art, but that requires using InlineQueryResultPhoto
-        # and user might not be able to choose the right song this way,
-        # since all they get is only the cover arts of the hits.
-        # answer = InlineQueryResultPhoto(id=str(uuid4()),
-        #    photo_url=search_hit['song_art_image_url'],
-        #    thumb_url=search_hit['song_art_image_thumbnail_url'],
-        #    reply_markup=keyboard, description=description)
-        articles.append(answer)
+    articles = [
+        lyrics_article(update, context, hit, search_more)
+        for hit in res["sections"][0]["hits"][:10]
+    ]
 
     update.inline_query.answer(articles)
 
 
+def lyrics_article(
+    update: Update,
+    context: CallbackContext,
+    hit: Dict[str, Any],
+    search_more: List[IButton],
+) -> InlineQueryResultArticle:
+    """Returns the result of a lyrics search hit
+
+    Args:
+        update (Update): Update of the inline query.
+        context (CallbackContext): Context of the inline query.
+        hit (Dict[str, Any]): Lyrics search hit.
+        search_more (List[IButton]): Last row of the result's keyboard.
+
+    Returns:
+        InlineQueryResultArticle: The song's caption and its lyrics highlight.
+    """
+    language = context.user_data["bot_lang"]
+    texts = context.bot_data["texts"][language]
+    text = texts["inline_menu"]["search_lyrics"]
+    song = hit["result"]
+    title = song["title"]
+    artist = song["primary_artist"]["name"]
+    answer_title = utils.format_title(artist, title)
+    song_id = song["id"]
+
+    answer_text = song_caption(update, context, song, text["caption"], language)
+    song_url = create_deep_linked_url(username, f"song_{song_id}_genius")
+    lyrics_url = create_deep_linked_url(username, f"song_{song_id}_lyrics")
+    buttons = [
+        [IButton(texts["inline_menu"]["full_details"], url=song_url)],
+        [IButton(texts["display_song"]["lyrics"], url=lyrics_url)],
+        search_more,
+    ]
+    keyboard = IBKeyboard(buttons)
+    # It's possible to provide results that are captioned photos
+    # of the song cover art, but that requires using InlineQueryResultPhoto
+    # and user might not be able to choose the right song this way,
+    # since all they get is only the cover arts of the hits.
+    # answer = InlineQueryResultPhoto(id=str(uuid4()),
+    #    photo_url=search_hit['song_art_image_url'],
+    #    thumb_url=search_hit['song_art_image_thumbnail_url'],
+    #    reply_markup=keyboard, description=description)
+    return InlineQueryResultArticle(
+        id=str(uuid4()),
+        title=answer_title,
+        thumb_url=song["song_art_image_thumbnail_url"],
+        input_message_content=InputTextMessageContent(
+            answer_text, disable_web_page_preview=False
+        ),
+        reply_markup=keyboard,
+        description=hit["highlights"][0]["value"],
+    )
+
+
 @log
 @get_user
 def search_songs(update: Update, context: CallbackContext) -> None:
@@ -468,33 +530,173 @@ def search_users(update: Update, context: CallbackContext) -> None:
     update.inline_query.answer(articles)
 
 
-@log
-@get_user
-def lyric_card(update: Update, context: CallbackContext) -> None:
-    """Displays a list of lyric cards based on lyrics provided by the user"""
-
-    def add_photo(lyrics):
-        """Builds the lyric card, uploads it and adds it to the inline results"""
-        lyric_card = build_lyric_card(
-            cover_art=cover_art,
-            lyrics=lyrics,
-            song_title=title,
-            primary_artists=primary_artists,
-            featured_artists=featured_artists,
-            rtl_lyrics=is_persian,
-            rtl_metadata=False,
-            format="JPEG",
-        )
-        uploaded_photo = upload_to_imgbb(lyric_card)["data"]
-        photo = InlineQueryResultPhoto(
+def lyric_card_photo(
+    genius: Any,
+    song_id: int,
+    found_lyrics: List[str],
+    keyboard: IBKeyboard,
+) -> Optional[LyricCardResult]:
+    """Builds the lyric card of a song and uploads it
+
+    The card is rendered in the lyric card pool. Cards that are in
+    LYRIC_CARDS are sent by their file ID or imgbb URL instead.
+
+    Args:
+        genius (Any): Genius API client.
+        song_id (int): Genius ID of the song.
+        found_lyrics (List[str]): Lines of the search highlight that
+            matched the query.
+        keyboard (IBKeyboard): Keyboard of the result.
+
+    Returns:
+        Optional[LyricCardResult]: The lyric card or None
+            if the lyrics weren't found in the song's lyrics.
+    """
+    is_persian = bool(utils.PERSIAN_CHARACTERS.search("\n".join(found_lyrics)))
+    key = lyric_card_key(song_id, found_lyrics, is_persian)
+    cached_card = LYRIC_CARDS.get(key)
+    if cached_card is not None and cached_card.file_id is not None:
+        return InlineQueryResultCachedPhoto(
             id=str(uuid4()),
-            photo_url=uploaded_photo["url"],
-            thumb_url=uploaded_photo["thumb"]["url"],
-            photo_width=lyric_card.size[0],
-            photo_height=lyric_card.size[1],
+            photo_file_id=cached_card.file_id,
             reply_markup=keyboard,
         )
-        photos.append(photo)
+
+    if cached_card is None:
+        song_page_data = genius.page_data(song_id=song_id)["page_data"]
+        song = song_page_data["song"]
+        song_lyrics = utils.extract_lyrics_for_card(
+            song_page_data["lyrics_data"]["body"]["html"]
+        )
+
+        lyrics = utils.find_matching_lyrics(found_lyrics, song_lyrics)
+        if lyrics is None:
+            logger.error(
+                "failed to find lyrics despite initial match. Lines: %r", found_lyrics
+            )
+            return None
+
+        title, primary_artists, featured_artists = utils.get_song_metadata(song)
+        cover_art_url = song["song_art_image_url"]
+        cover_art = genius.download_cover_art(cover_art_url)
+        lyric_card = card_pool.run(
+            render_lyric_card,
+            cover_art.getvalue(),
+            lyrics,
+            title,
+            primary_artists,
+            featured_artists,
+            is_persian,
+            False,
+            "JPEG",
+            CARD_QUALITY,
+            CARD_MAX_BYTES,
+            cover_art_url,
+            timeout=LYRIC_CARD_TIMEOUT,
+            slot_timeout=LYRIC_CARD_TIMEOUT,
+        )
+        cached_card = CachedLyricCard(lyric_card)
+        LYRIC_CARDS.set(key, cached_card)
+
+    if cached_card.url is None:
+        uploaded_photo = upload_to_imgbb(
+            BytesIO(cached_card.image), expiration_date=LYRIC_CARD_EXPIRATION
+        )["data"]
+        cached_card.url = uploaded_photo["url"]
+        cached_card.thumb_url = uploaded_photo["thumb"]["url"]
+    return InlineQueryResultPhoto(
+        id=str(uuid4()),
+        photo_url=cached_card.url,
+        thumb_url=cached_card.thumb_url,
+        photo_width=BUILDER_IMAGE_SIZE[0],
+        photo_height=BUILDER_IMAGE_SIZE[1],
+        reply_markup=keyboard,
+    )
+
+
+def lyric_card_result(
+    card: "Future[Optional[LyricCardResult]]",
+) -> Optional[LyricCardResult]:
+    """Returns the result of a finished lyric card or None if it failed"""
+    try:
+        return card.result()
+    except PoolBusyError as e:
+        logger.warning("lyric card pool is busy: %s", e)
+    except Exception:
+        logger.exception("failed to build lyric card")
+    return None
+
+
+def answer_lyric_cards(
+    update: Update,
+    cards: List["Future[Optional[LyricCardResult]]"],
+    fallback: Optional[List[InlineQueryResultArticle]] = None,
+) -> None:
+    """Answers the inline query with the lyric cards that are ready
+
+    Waits for the cards for LYRIC_CARD_LATENCY_BUDGET seconds. The cards
+    that aren't ready by then are kept in PENDING_LYRIC_CARDS and are sent
+    when Telegram asks for the next page of results using next_offset.
+    If none of the cards are ready by then, the first one is waited for
+    until LYRIC_CARD_MAX_LATENCY and if there still isn't one, the
+    fallback results are sent instead.
+
+    Args:
+        update (Update): Update of the inline query.
+        cards (List[Future[Optional[LyricCardResult]]]): Lyric cards
+            in the order they should be displayed.
+        fallback (Optional[List[InlineQueryResultArticle]], optional): Results
+            sent if none of the cards are ready. Defaults to None.
+    """
+    deadline = time.monotonic() + LYRIC_CARD_MAX_LATENCY
+    wait(cards, timeout=LYRIC_CARD_LATENCY_BUDGET)
+    results: List[Any] = []
+    pending = cards
+    while True:
+        unfinished = []
+        for card in pending:
+            if not card.done():
+                unfinished.append(card)
+                continue
+            photo = lyric_card_result(card)
+            if photo is not None:
+                results.append(photo)
+        pending = unfinished
+        remaining = deadline - time.monotonic()
+        if results or not pending or remaining <= 0:
+            break
+        wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    if not results and fallback:
+        results = fallback
+    if pending:
+        next_offset = uuid4().hex
+        PENDING_LYRIC_CARDS.set(next_offset, pending)
+        # the next page is only available until the cards expire
+        update.inline_query.answer(results, cache_time=0, next_offset=next_offset)
+    else:
+        update.inline_query.answer(results, cache_time=3600)
+
+
+@log
+@get_user
+def lyric_card(update: Update, context: CallbackContext) -> None:
+    """Displays a list of lyric cards based on lyrics provided by the user
+
+    Lyric cards of the top LYRIC_CARD_CANDIDATES matching songs are built
+    in parallel and the query is answered with the cards that are ready in
+    LYRIC_CARD_LATENCY_BUDGET seconds. The rest are sent in the next page.
+    If none of them are ready in time, the songs are sent as articles.
+    """
+    offset = update.inline_query.offset
+    if offset:
+        pending = PENDING_LYRIC_CARDS.get(offset)
+        PENDING_LYRIC_CARDS.pop(offset)
+        if pending is None:
+            update.inline_query.answer([])
+        else:
+            answer_lyric_cards(update, pending)
+        return
 
     genius = context.bot_data["genius"]
     language = context.user_data["bot_lang"]
@@ -513,42 +715,29 @@ def lyric_card(update: Update, context: CallbackContext) -> None:
     ]
     keyboard = IBKeyboard([search_more])
 
-    res = genius.search_lyrics(input_text, per_page=5)
-    photos: List[InlineQueryResultPhoto] = []
-    found_lyrics = []
-    for hit in res["sections"][0]["hits"]:
+    res = genius.search_lyrics(input_text, per_page=LYRIC_CARD_CANDIDATES)
+    cards = []
+    articles = []
+    for hit in res["sections"][0]["hits"][:LYRIC_CARD_CANDIDATES]:
         highlight = hit["highlights"][0]
-        for line in highlight["value"].split("\n"):
-            if Levenshtein.ratio(input_text, line) > 0.5:
-                found_lyrics.append(line)
+        found_lyrics = [
+            line
+            for line in highlight["value"].split("\n")
+            if Levenshtein.ratio(input_text, line) > 0.5
+        ]
         if found_lyrics:
-            break
-    else:
-        update.inline_query.answer(photos)
-        return
-
-    song_page_data = genius.page_data(song_id=hit["result"]["id"])["page_data"]
-    song = song_page_data["song"]
-    song_lyrics = utils.extract_lyrics_for_card(
-        song_page_data["lyrics_data"]["body"]["html"]
-    )
-
-    lyrics = utils.find_matching_lyrics(found_lyrics, song_lyrics)
-    if lyrics is None:
-        logger.error(
-            "failed to find lyrics despite initial match. Query: ", repr(input_text)
-        )
-        update.inline_query.answer(photos)
-        return
-
-    title, primary_artists, featured_artists = utils.get_song_metadata(song)
-    cover_art_url = song["song_art_image_url"]
-    cover_art = genius.download_cover_art(cover_art_url)
-    is_persian = bool(utils.PERSIAN_CHARACTERS.search(lyrics))
-
-    add_photo(lyrics)
-
-    update.inline_query.answer(photos, cache_time=3600)
+            cards.append(
+                lyric_card_threads.submit(
+                    lyric_card_photo,
+                    genius,
+                    hit["result"]["id"],
+                    found_lyrics,
+                    keyboard,
+                )
+            )
+            articles.append(lyrics_article(update, context, hit, search_more))
+
+    answer_lyric_cards(update, cards, fallback=articles)
 
 
 def album_caption(
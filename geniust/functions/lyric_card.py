@@ -1,22 +1,78 @@
 import imghdr
 import logging
+from dataclasses import dataclass
 from datetime import timedelta
 from io import BytesIO
-from typing import cast
+from typing import Any, List, Optional, Tuple, cast
 from uuid import uuid4
 
 import Levenshtein
 from lyricsgenius.utils import clean_str
 from telegram import ForceReply, ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
+from telegram.error import BadRequest
 from telegram.ext import CallbackContext
 
 from geniust import DEFAULT_COVER_IMAGE, get_user, utils
 from geniust.constants import END, TYPING_LYRIC_CARD_CUSTOM, TYPING_LYRIC_CARD_LYRICS
-from geniust.functions.lyric_card_builder import build_lyric_card
+from geniust.functions.lyric_card_builder import CARD_MAX_BYTES, build_lyric_card
 from geniust.utils import check_callback_query_user, log
 
 logger = logging.getLogger("geniust")
 
+# Seconds lyric cards are kept on imgbb
+LYRIC_CARD_EXPIRATION = 3600
+# Cached lyric cards expire this many seconds before their imgbb image
+LYRIC_CARD_EXPIRY_MARGIN = 300
+# Max number of lyric cards to keep (about 100KB each)
+LYRIC_CARD_CACHE_SIZE = 128
+
+
+@dataclass
+class CachedLyricCard:
+    """A built lyric card and where it has been uploaded
+
+    Attributes:
+        image (bytes): The lyric card.
+        url (Optional[str]): imgbb URL of the card.
+        thumb_url (Optional[str]): imgbb URL of the card's thumbnail.
+        file_id (Optional[str]): Telegram file ID of the card.
+    """
+
+    image: bytes
+    url: Optional[str] = None
+    thumb_url: Optional[str] = None
+    file_id: Optional[str] = None
+
+
+# Lyric cards of the /lyric_card command and the inline mode
+LYRIC_CARDS: utils.LRUCache[CachedLyricCard] = utils.LRUCache(
+    LYRIC_CARD_CACHE_SIZE, ttl=LYRIC_CARD_EXPIRATION - LYRIC_CARD_EXPIRY_MARGIN
+)
+
+
+def lyric_card_key(
+    song_id: int,
+    lines: List[str],
+    rtl_lyrics: bool,
+    rtl_metadata: bool = False,
+    format: str = "JPEG",
+) -> Tuple[Any, ...]:
+    """Returns the key of a lyric card in LYRIC_CARDS
+
+    Args:
+        song_id (int): Genius ID of the song.
+        lines (List[str]): Lines of the search highlight that matched the query.
+        rtl_lyrics (bool): Whether the lyrics are Right-To-Left or not.
+        rtl_metadata (bool, optional): Whether the metadata are Right-To-Left
+            or not. Defaults to False.
+        format (str, optional): Image format of the card. Defaults to "JPEG".
+
+    Returns:
+        Tuple[Any, ...]: Cache key.
+    """
+    lines = [" ".join(clean_str(line).split()) for line in lines]
+    return (song_id, tuple(filter(None, lines)), rtl_lyrics, rtl_metadata, format)
+
 
 @log
 @get_user
@@ -82,8 +138,59 @@ def search_lyrics(update: Update, context: CallbackContext) -> int:
         )
         return END
 
-    # Get lyrics for lyric card
-    song_page_data = genius.page_data(song_id=hit["result"]["id"])["page_data"]
+    is_persian = bool(utils.PERSIAN_CHARACTERS.search("\n".join(found_lyrics)))
+    key = lyric_card_key(hit["result"]["id"], found_lyrics, is_persian)
+    cached_card = LYRIC_CARDS.get(key)
+    if cached_card is None:
+        lyric_card = get_lyric_card(
+            genius, hit["result"]["id"], found_lyrics, is_persian
+        )
+        if lyric_card is None:
+            logger.error(
+                "No lyrics matched despite initial highlight match. Query: %s",
+                repr(input_text),
+            )
+            update.message.reply_text(
+                text["not_found"], reply_to_message_id=reply_to_message_id
+            )
+            return END
+        cached_card = CachedLyricCard(lyric_card.getvalue())
+        LYRIC_CARDS.set(key, cached_card)
+
+    message = None
+    if cached_card.file_id is not None:
+        try:
+            message = update.message.reply_photo(
+                cached_card.file_id, reply_to_message_id=reply_to_message_id
+            )
+        except BadRequest as e:
+            logger.debug("Lyric card file ID was rejected: %s", e)
+    if message is None:
+        message = update.message.reply_photo(
+            BytesIO(cached_card.image), reply_to_message_id=reply_to_message_id
+        )
+    if message.photo:
+        cached_card.file_id = message.photo[-1].file_id
+    return END
+
+
+def get_lyric_card(
+    genius: Any, song_id: int, found_lyrics: List[str], rtl_lyrics: bool
+) -> Optional[BytesIO]:
+    """Builds the lyric card of the lines of a song
+
+    Args:
+        genius (Any): Genius API client.
+        song_id (int): Genius ID of the song.
+        found_lyrics (List[str]): Lines of the search highlight that
+            matched the query.
+        rtl_lyrics (bool): Whether the lyrics are Right-To-Left or not.
+
+    Returns:
+        Optional[BytesIO]: The lyric card in JPEG or None if the lines
+            weren't found in the song's lyrics.
+    """
+    song_page_data = genius.page_data(song_id=song_id)["page_data"]
     song = song_page_data["song"]
     song_lyrics = utils.extract_lyrics_for_card(
         song_page_data["lyrics_data"]["body"]["html"]
@@ -91,14 +198,7 @@ def search_lyrics(update: Update, context: CallbackContext) -> int:
 
     lyrics = utils.find_matching_lyrics(found_lyrics, song_lyrics)
     if lyrics is None:
-        logger.error(
-            "No lyrics matched despite initial highlight match. Query: %s",
-            repr(input_text),
-        )
-        update.message.reply_text(
-            text["not_found"], reply_to_message_id=reply_to_message_id
-        )
-        return END
+        return None
 
     title, primary_artists, featured_artists = utils.get_song_metadata(song)
     cover_art_url = song["song_art_image_url"]
@@ -115,21 +215,20 @@ def search_lyrics(update: Update, context: CallbackContext) -> int:
 
     if imghdr.what(cover_art) is None:
         cover_art = DEFAULT_COVER_IMAGE
-    is_persian = bool(utils.PERSIAN_CHARACTERS.search(lyrics))
-    lyric_card = build_lyric_card(
+        cover_art_url = None
+    return build_lyric_card(
         cover_art=cover_art,
         lyrics=lyrics,
         song_title=title,
         primary_artists=primary_artists,
         featured_artists=featured_artists,
-        rtl_lyrics=is_persian,
+        rtl_lyrics=rtl_lyrics,
         rtl_metadata=False,  # Genius metadata is in English most of the time
         format="JPEG",
+        max_bytes=CARD_MAX_BYTES,
+        cover_art_url=cover_art_url,
     )
 
-    update.message.reply_photo(lyric_card, reply_to_message_id=reply_to_message_id)
-    return END
-
 
 @log
 def remove_lyric_info(context: CallbackContext) -> None:
@@ -252,6 +351,7 @@ def custom_lyric_card(update: Update, context: CallbackContext) -> int:
         rtl_lyrics=bool(utils.PERSIAN_CHARACTERS.search(lyric_card_info["lyrics"])),
         rtl_metadata=bool(utils.PERSIAN_CHARACTERS.search(metadata)),
         format="JPEG",
+        max_bytes=CARD_MAX_BYTES,
     )
     update.message.reply_photo(lyric_card, reply_markup=ReplyKeyboardRemove())
     ud.pop("lyric_card")
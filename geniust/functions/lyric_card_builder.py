@@ -1,12 +1,26 @@
+import functools
 import textwrap
+import threading
 from dataclasses import astuple, dataclass
 from io import BytesIO
-from typing import Dict, List, Optional, Union
+from typing import (
+    Any,
+    BinaryIO,
+    Container,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from fontTools.ttLib import TTFont
 from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
 
-from geniust import data_path
+from geniust import data_path, utils
+from geniust.constants import BASE_IMAGE_CACHE_SIZE, CARD_WORKERS
 
 
 @dataclass
@@ -26,13 +40,6 @@ class ImmutablePoint:
 # for Arabic/Persian characters
 RTL = True
 LTR = False
-IMAGES: Dict[bool, Dict[str, Image.Image]] = {
-    LTR: {"double_quotes": Image.open(data_path / "double-quotes.png")},
-    RTL: {},
-}
-IMAGES[RTL]["double_quotes"] = IMAGES[LTR]["double_quotes"].transpose(
-    Image.FLIP_LEFT_RIGHT
-)
 COVER_ART_BRIGHTNESS = 0.8
 
 # Fonts
@@ -40,55 +47,131 @@ FONTS_PATH = data_path
 NotoSans = str(FONTS_PATH / "NotoSans-SemiBold.ttf")
 PersianFont = str(FONTS_PATH / "Vazir-Medium.ttf")
 # RTL changes the direction as well as the font to be used for Arabic/Persian glyphs.
-FONTS: Dict[bool, Dict[str, ImageFont.FreeTypeFont]] = {
-    LTR: {
-        "lyrics": ImageFont.truetype(NotoSans, 55),
-        "metadata_big": ImageFont.truetype(NotoSans, 37),
-        "metadata_small": ImageFont.truetype(NotoSans, 30),
-        "featured_artists_big": ImageFont.truetype(NotoSans, 32),
-        "featured_artists_small": ImageFont.truetype(NotoSans, 25),
-    },
-    RTL: {
-        "lyrics": ImageFont.truetype(PersianFont, 55),
-        "metadata_big": ImageFont.truetype(PersianFont, 37),
-        "metadata_small": ImageFont.truetype(PersianFont, 30),
-        "featured_artists_big": ImageFont.truetype(PersianFont, 32),
-        "featured_artists_small": ImageFont.truetype(PersianFont, 25),
-    },
+FONT_FILES = {LTR: NotoSans, RTL: PersianFont}
+FONT_SIZES = {
+    "lyrics": 55,
+    "metadata_big": 37,
+    "metadata_small": 30,
+    "featured_artists_big": 32,
+    "featured_artists_small": 25,
 }
-# Add glyphs of each font (needed in has_glyph)
-for direction in FONTS:
-    FONTS[direction]["glyphs"] = []
-    for table in TTFont(FONTS[direction]["lyrics"].path)["cmap"].tables:
-        FONTS[direction]["glyphs"].extend(table.cmap)
 
 # Colors
 LYRICS_TEXT_COLOR = "#000"
 METADATA_TEXT_COLOR = "#fff"
 BOX_COLOR = "#fff"
 
-# Offsets
-OFFSETS: Dict[bool, Dict[str, ImmutablePoint]] = {
-    LTR: {
-        "offset": ImmutablePoint(18, 451),
-        "box_height": ImmutablePoint(
-            0, FONTS[LTR]["lyrics"].getsize("LOREM IPSUM")[1] + 15
-        ),
-    },
-    RTL: {
-        "offset": ImmutablePoint(18, 451),
-        "box_height": ImmutablePoint(0, FONTS[RTL]["lyrics"].getsize("لورم ایپسوم")[1]),
-    },
-}
-for direction in OFFSETS:
-    OFFSETS[direction]["lyrics_box_offset"] = ImmutablePoint(
-        OFFSETS[direction]["offset"].left + IMAGES[LTR]["double_quotes"].width + 15,
-        OFFSETS[direction]["offset"].top,
-    )
-    OFFSETS[direction]["lyrics_offset"] = ImmutablePoint(
-        OFFSETS[direction]["lyrics_box_offset"].left + 5,
-        OFFSETS[direction]["lyrics_box_offset"].top - 5,
-    )
+
+def font_coverage(path: str) -> FrozenSet[int]:
+    """Returns the code points that have a glyph in the font"""
+    code_points = set()
+    for table in TTFont(path)["cmap"].tables:
+        code_points.update(table.cmap)
+    return frozenset(code_points)
+
+
+class GlyphFilter(dict):
+    """Translation table that deletes the characters a font has no glyph for
+
+    Used with str.translate to filter a whole string in one call.
+    The result for each character is looked up in the coverage
+    the first time the character is seen and stored in the table.
+
+    Args:
+        coverage (FrozenSet[int]): Code points that have a glyph in the font.
+    """
+
+    def __init__(self, coverage: FrozenSet[int]):
+        super().__init__()
+        self.coverage = coverage
+
+    def __missing__(self, code_point: int) -> Optional[int]:
+        value = code_point if code_point in self.coverage else None
+        self[code_point] = value
+        return value
+
+
+class Assets:
+    """Images, fonts, glyphs and offsets of the builder
+
+    The bot imports this module on startup, so the assets are loaded
+    on first use instead. Loading is thread-safe and only happens once.
+    """
+
+    def __init__(self):
+        self.images: Dict[bool, Dict[str, Image.Image]] = {}
+        self.fonts: Dict[bool, Dict[str, ImageFont.FreeTypeFont]] = {}
+        # Code points covered by the fonts of each direction (needed in has_glyph)
+        self.glyphs: Dict[bool, FrozenSet[int]] = {}
+        self.glyph_filters: Dict[bool, GlyphFilter] = {}
+        self.offsets: Dict[bool, Dict[str, ImmutablePoint]] = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self) -> "Assets":
+        """Loads the assets if they aren't loaded yet
+
+        Returns:
+            Assets: The loaded assets.
+        """
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self._load()
+                    self.loaded = True
+        return self
+
+    def _load(self) -> None:
+        double_quotes = Image.open(data_path / "double-quotes.png")
+        self.images = {
+            LTR: {"double_quotes": double_quotes},
+            RTL: {"double_quotes": double_quotes.transpose(Image.FLIP_LEFT_RIGHT)},
+        }
+
+        for direction, path in FONT_FILES.items():
+            self.fonts[direction] = {
+                name: ImageFont.truetype(path, size)
+                for name, size in FONT_SIZES.items()
+            }
+            self.glyphs[direction] = font_coverage(path)
+            self.glyph_filters[direction] = GlyphFilter(
+                self.glyphs[direction] | {ord("\n")}
+            )
+
+        # Offsets
+        self.offsets = {
+            LTR: {
+                "offset": ImmutablePoint(18, 451),
+                "box_height": ImmutablePoint(
+                    0, self.fonts[LTR]["lyrics"].getsize("LOREM IPSUM")[1] + 15
+                ),
+            },
+            RTL: {
+                "offset": ImmutablePoint(18, 451),
+                "box_height": ImmutablePoint(
+                    0, self.fonts[RTL]["lyrics"].getsize("لورم ایپسوم")[1]
+                ),
+            },
+        }
+        for offsets in self.offsets.values():
+            offsets["lyrics_box_offset"] = ImmutablePoint(
+                offsets["offset"].left + double_quotes.width + 15,
+                offsets["offset"].top,
+            )
+            offsets["lyrics_offset"] = ImmutablePoint(
+                offsets["lyrics_box_offset"].left + 5,
+                offsets["lyrics_box_offset"].top - 5,
+            )
+
+
+ASSETS = Assets()
+
+
+def warmup() -> None:
+    """Loads the assets before the first lyric card is built"""
+    ASSETS.load()
+
+
 # All the offsets and font sizes are configured for a 1000x1000 image,
 # so we'll resize the image to the builder image size and then resize it back to
 # its original size
@@ -104,21 +187,60 @@ for direction in OFFSETS:
 #    font size doesn't change linearly.
 # 2. From what I've seen, most of Genius cover arts are available in 1000x1000.
 BUILDER_IMAGE_SIZE = (1000, 1000)
+# Max number of memoized lyrics and metadata layouts
+LAYOUT_CACHE_SIZE = 1024
+# Darkened and resized cover arts keyed by their URL
+BASE_IMAGES: utils.LRUCache[Image.Image] = utils.LRUCache(BASE_IMAGE_CACHE_SIZE)
+# Max number of lyric cards of an inline query
+CARDS_PER_QUERY = 5
+# Max number of inline queries whose lyric cards are rendered at the same time
+CARD_MAX_QUERIES = CARD_WORKERS * 4
+# Max number of lyric cards waiting to be rendered or being rendered
+CARD_MAX_PENDING = CARDS_PER_QUERY * CARD_MAX_QUERIES
+
+# Quality of JPEG and WebP lyric cards
+CARD_QUALITY = 75
+# Lowest quality tried to fit a lyric card in its byte budget
+CARD_MIN_QUALITY = 30
+# Byte budget of lyric cards sent as photos
+CARD_MAX_BYTES = 100 * 1024
+# Formats that are saved with a quality
+LOSSY_FORMATS = ("JPEG", "WEBP")
+
+card_pool = utils.WorkerPool(
+    workers=CARD_WORKERS, max_pending=CARD_MAX_PENDING, initializer=warmup
+)
 
 
-def has_glyphs(font_glyphs: List[int], glyph: str) -> bool:
+def has_glyphs(font_glyphs: Container[int], glyph: str) -> bool:
     # from https://stackoverflow.com/a/53829424
     return True if ord(glyph) in font_glyphs else False
 
 
+def remove_unsupported_glyphs(text: str, rtl: bool) -> str:
+    """Removes the characters the font of the direction has no glyph for
+
+    Newlines are kept.
+
+    Args:
+        text (str): Text.
+        rtl (bool): Text direction which decides the font.
+
+    Returns:
+        str: Text without the unsupported characters.
+    """
+    return text.translate(ASSETS.load().glyph_filters[rtl])
+
+
 def change_brightness(im: Image.Image, value: float) -> Image.Image:
     enhancer = ImageEnhance.Brightness(im)
     return enhancer.enhance(value)
 
 
 def add_double_quotes(im: Image.Image, rtl: bool) -> None:
-    double_quotes_image = IMAGES[rtl]["double_quotes"]
-    box = OFFSETS[rtl]["offset"]
+    assets = ASSETS.load()
+    double_quotes_image = assets.images[rtl]["double_quotes"]
+    box = assets.offsets[rtl]["offset"]
     if rtl:
         box = Point(box.left + 912, box.top)  # type: ignore
     im.paste(double_quotes_image, astuple(box), mask=double_quotes_image)
@@ -132,26 +254,46 @@ def fix_text_direction(text: str, rtl: bool) -> str:
     return text
 
 
-def add_line(
-    draw: ImageDraw.ImageDraw,
+@dataclass(frozen=True)
+class TextLayout:
+    """Position of a text on the card and the box behind it
+
+    Attributes:
+        text (str): Text to draw.
+        font (str): Name of the font in FONT_SIZES.
+        rtl (bool): Direction of the text which decides the font.
+        fill (str): Text color.
+        position (ImmutablePoint): Top left corner of the text.
+        box (Optional[Tuple[ImmutablePoint, ImmutablePoint]]): Corners of the box
+            drawn behind the text. None if no box is drawn.
+    """
+
+    text: str
+    font: str
+    rtl: bool
+    fill: str
+    position: ImmutablePoint
+    box: Optional[Tuple[ImmutablePoint, ImmutablePoint]] = None
+
+
+def layout_line(
     lyric: str,
     last_box_pos: Union[ImmutablePoint, Point],
     rtl: bool,
-) -> Union[ImmutablePoint, Point]:
-    lyrics_box_offset = OFFSETS[rtl]["lyrics_box_offset"]
-    box_height = OFFSETS[rtl]["box_height"].top
-    lyrics_offset = OFFSETS[rtl]["lyrics_offset"]
-    lyrics_font = FONTS[rtl]["lyrics"]
+) -> Tuple[List[TextLayout], Union[ImmutablePoint, Point]]:
+    """Wraps a line of lyrics and lays out its lines below last_box_pos"""
+    assets = ASSETS.load()
+    lyrics_box_offset = assets.offsets[rtl]["lyrics_box_offset"]
+    box_height = assets.offsets[rtl]["box_height"].top
+    lyrics_offset = assets.offsets[rtl]["lyrics_offset"]
+    lyrics_font = assets.fonts[rtl]["lyrics"]
+    layouts = []
     for i, line in enumerate(textwrap.wrap(lyric, 30, drop_whitespace=True)):
         # Remove unsupported glyphs from line
-        line = "".join(
-            char
-            for char in line
-            if char == "\n" or has_glyphs(FONTS[rtl]["glyphs"], char)
-        )
-        # Draw box
+        line = remove_unsupported_glyphs(line, rtl)
+        # Box
         line = fix_text_direction(line, rtl)
-        width, _ = FONTS[rtl]["lyrics"].getsize(line)
+        width, _ = lyrics_font.getsize(line)
         if i == 0:
             last_line_width = width
         else:
@@ -166,47 +308,83 @@ def add_line(
             box_end.top -= 8
             box_start.left += 820 - width
             box_end.left += 820 - width
-        draw.rectangle((astuple(box_start), astuple(box_end)), fill=BOX_COLOR)
 
-        # Draw Lyrics
+        # Lyrics
         top = last_box_pos.top
         pos = Point(lyrics_offset.left + 2, top + 5)
         if rtl:
             pos.top -= 10
             pos.left += 820 - width
-        draw.text(astuple(pos), line, fill=LYRICS_TEXT_COLOR, font=lyrics_font)
+        layouts.append(
+            TextLayout(
+                text=line,
+                font="lyrics",
+                rtl=rtl,
+                fill=LYRICS_TEXT_COLOR,
+                position=ImmutablePoint(*astuple(pos)),
+                box=(
+                    ImmutablePoint(*astuple(box_start)),
+                    ImmutablePoint(*astuple(box_end)),
+                ),
+            )
+        )
         last_box_pos = box_end
-    return last_box_pos
+    return layouts, last_box_pos
+
+
+@functools.lru_cache(LAYOUT_CACHE_SIZE)
+def layout_lyrics(lyrics: str, rtl: bool) -> Tuple[Tuple[TextLayout, ...], int]:
+    """Lays out the lines of the lyrics
 
+    Args:
+        lyrics (str): Lyrics to be put on the card.
+        rtl (bool): Whether the lyrics are Right-To-Left or not.
 
-def add_lyrics(
-    draw: ImageDraw.ImageDraw, lyrics: str, rtl: bool
-) -> Union[ImmutablePoint, Point]:
-    pos_end = lyrics_box_offset = OFFSETS[rtl]["lyrics_box_offset"]  # type: ignore
+    Returns:
+        Tuple[Tuple[TextLayout, ...], int]: Layout of the lines and
+            the bottom of the last box.
+    """
+    lyrics_box_offset = ASSETS.load().offsets[rtl]["lyrics_box_offset"]
+    layouts: List[TextLayout] = []
+    pos_end: Union[ImmutablePoint, Point] = lyrics_box_offset
     for line in lyrics.split("\n"):
-        # add_line moves every box some pixels down,
+        # layout_line moves every box some pixels down,
         # but we don't want that for the first box
         # since it should be aligned with the quotes
         # so we move it the same number of pixels up
-        last_box_pos = (  # type: ignore
+        last_box_pos = (
             Point(lyrics_box_offset.left, lyrics_box_offset.top - 10)
-            if pos_end == lyrics_box_offset
+            if not layouts
             else pos_end
         )
-        pos_end = add_line(draw, line, last_box_pos, rtl=rtl)  # type: ignore
-    return pos_end
+        line_layouts, pos_end = layout_line(line, last_box_pos, rtl=rtl)
+        layouts.extend(line_layouts)
+    return tuple(layouts), pos_end.top
 
 
-def add_metadata(
-    draw: ImageDraw.ImageDraw,
-    last_box_pos: Union[ImmutablePoint, Point],
+@functools.lru_cache(LAYOUT_CACHE_SIZE)
+def layout_metadata(
+    top: int,
     song_title: str,
-    primary_artists: List[str],
-    featured_artists: List[str],
+    primary_artists: Tuple[str, ...],
+    featured_artists: Tuple[str, ...],
     rtl: bool,
-):
-    lyrics_box_offset = OFFSETS[rtl]["lyrics_box_offset"]
-    lang_fonts = FONTS[rtl]
+) -> Tuple[TextLayout, ...]:
+    """Lays out the song title and artists below the lyrics
+
+    Args:
+        top (int): Bottom of the lyrics.
+        song_title (str): Title of the song.
+        primary_artists (Tuple[str, ...]): Primary artists of the song.
+        featured_artists (Tuple[str, ...]): Featured artists of the song.
+        rtl (bool): Whether the metadata are Right-To-Left or not.
+
+    Returns:
+        Tuple[TextLayout, ...]: Layout of the metadata.
+    """
+    assets = ASSETS.load()
+    lyrics_box_offset = assets.offsets[rtl]["lyrics_box_offset"]
+    lang_fonts = assets.fonts[rtl]
     if rtl:
         artist_sep = "و"
         comma = "،"
@@ -216,31 +394,32 @@ def add_metadata(
         comma = ","
         featuring = "FT. "
     # Add main artists and song title
-    pos_metadata = Point(lyrics_box_offset.left, last_box_pos.top + 35)
+    pos_metadata = Point(lyrics_box_offset.left, top + 35)
     text = f" {artist_sep} ".join(primary_artists)
     text += f" «{song_title}»" if rtl else f' "{song_title}"'
     # Remove unsupported glyphs from text
-    text = "".join(
-        char for char in text if char == "\n" or has_glyphs(lang_fonts["glyphs"], char)
-    )
+    text = remove_unsupported_glyphs(text, rtl)
     if len(text) > 42:
         if len(text) > 52:
             text = textwrap.fill(text, 52, drop_whitespace=True)
-        metadata_font = lang_fonts["metadata_small"]
-        featured_font = lang_fonts["featured_artists_small"]
+        metadata_font = "metadata_small"
+        featured_font = "featured_artists_small"
     else:
-        metadata_font = lang_fonts["metadata_big"]
-        featured_font = lang_fonts["featured_artists_big"]
+        metadata_font = "metadata_big"
+        featured_font = "featured_artists_big"
     text = fix_text_direction(text.upper(), rtl)
-    width, height = metadata_font.getsize(text)
+    width, height = lang_fonts[metadata_font].getsize(text)
     if rtl:
         pos_metadata.left += 820 - width
-    draw.text(
-        astuple(pos_metadata),
-        text,
-        fill=METADATA_TEXT_COLOR,
-        font=metadata_font,
-    )
+    layouts = [
+        TextLayout(
+            text=text,
+            font=metadata_font,
+            rtl=rtl,
+            fill=METADATA_TEXT_COLOR,
+            position=ImmutablePoint(*astuple(pos_metadata)),
+        )
+    ]
 
     # Add featured artists
     pos_metadata = Point(lyrics_box_offset.left, pos_metadata.top + height - 10)
@@ -255,24 +434,222 @@ def add_metadata(
                 last_artist=featured_artists[-1],
             )
         # Remove unsupported glyphs from text
-        text = "".join(
-            char
-            for char in text
-            if char == "\n" or has_glyphs(lang_fonts["glyphs"], char)
-        )
+        text = remove_unsupported_glyphs(text, rtl)
         text = textwrap.fill(text, 52)
         text = fix_text_direction(text.upper(), rtl)
-        width, _ = featured_font.getsize(text)
+        width, _ = lang_fonts[featured_font].getsize(text)
         if rtl:
             pos_metadata.left += 820 - width
+        layouts.append(
+            TextLayout(
+                text=text,
+                font=featured_font,
+                rtl=rtl,
+                fill=METADATA_TEXT_COLOR,
+                position=ImmutablePoint(*astuple(pos_metadata)),
+            )
+        )
+    return tuple(layouts)
+
+
+def layout_card(
+    lyrics: str,
+    song_title: str,
+    primary_artists: List[str],
+    featured_artists: Optional[List[str]] = None,
+    rtl_lyrics: bool = False,
+    rtl_metadata: bool = False,
+) -> Tuple[TextLayout, ...]:
+    """Lays out the texts of a lyric card
+
+    The layout doesn't depend on the cover art, so it can be
+    reused for any cover art. Layouts are memoized.
+
+    Args:
+        lyrics (str): Lyrics to be put on the card.
+        song_title (str): Title of the song.
+        primary_artists (List[str]): Primary artists of the song.
+        featured_artists (Optional[List[str]], optional): Featured artists
+            of the song. Defaults to None.
+        rtl_lyrics (bool, optional): Whether the lyrics are Right-To-Left or not.
+            Defaults to False.
+        rtl_metadata (bool, optional): Whether the metadata are Right-To-Left
+            or not. Defaults to False.
+
+    Returns:
+        Tuple[TextLayout, ...]: Layout of the texts in drawing order.
+    """
+    lyrics_layout, bottom = layout_lyrics(lyrics, rtl_lyrics)
+    metadata_layout = layout_metadata(
+        bottom,
+        song_title,
+        tuple(primary_artists),
+        tuple(featured_artists) if featured_artists else (),
+        rtl_metadata,
+    )
+    return lyrics_layout + metadata_layout
+
+
+def draw_layout(im: Image.Image, layouts: Iterable[TextLayout]) -> None:
+    """Draws the laid out texts and their boxes on the image"""
+    fonts = ASSETS.load().fonts
+    draw = ImageDraw.Draw(im)
+    for layout in layouts:
+        if layout.box is not None:
+            box_start, box_end = layout.box
+            draw.rectangle((astuple(box_start), astuple(box_end)), fill=BOX_COLOR)
         draw.text(
-            astuple(pos_metadata),
-            text,
-            fill=METADATA_TEXT_COLOR,
-            font=featured_font,
+            astuple(layout.position),
+            layout.text,
+            fill=layout.fill,
+            font=fonts[layout.rtl][layout.font],
         )
 
 
+def decode_cover_art(cover_art: bytes) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Decodes the cover art close to BUILDER_IMAGE_SIZE
+
+    JPEGs are decoded straight to the smallest scale (down to 1/8)
+    that is still at least as big as BUILDER_IMAGE_SIZE and other
+    formats are reduced by an integer factor after they're decoded.
+    The resampling is done by prepare_cover_art.
+
+    Args:
+        cover_art (bytes): Cover art image.
+
+    Returns:
+        Tuple[Image.Image, Tuple[int, int]]: RGB image and
+            the original size of the image.
+    """
+    im = Image.open(BytesIO(cover_art))
+    original_size = im.size
+    if im.format == "JPEG":
+        im.draft("RGB", BUILDER_IMAGE_SIZE)
+    im = im.convert("RGB")
+    factor = min(
+        im.size[0] // BUILDER_IMAGE_SIZE[0], im.size[1] // BUILDER_IMAGE_SIZE[1]
+    )
+    if factor > 1:
+        im = im.reduce(factor)
+    return im, original_size
+
+
+def prepare_cover_art(cover_art: bytes) -> Image.Image:
+    """Prepares the cover art to be drawn on
+
+    The cover art is darkened and resized to BUILDER_IMAGE_SIZE.
+
+    Args:
+        cover_art (bytes): Cover art image.
+
+    Returns:
+        Image.Image: Base image of lyric cards of the cover art.
+    """
+    im, original_size = decode_cover_art(cover_art)
+    # darken the image while it's at its smallest
+    darken_first = im.size[0] < BUILDER_IMAGE_SIZE[0]
+    if darken_first:
+        im = change_brightness(im, COVER_ART_BRIGHTNESS)
+    if original_size != BUILDER_IMAGE_SIZE:
+        if im.size != BUILDER_IMAGE_SIZE:
+            im = im.resize(BUILDER_IMAGE_SIZE, Image.BOX)
+        # Blur image to cover the loss in quality caused by resizing
+        # Images bigger than 700px don't seem to suffer noticeably
+        if original_size[0] <= 700:
+            ratio = BUILDER_IMAGE_SIZE[0] / original_size[0]
+            im = im.filter(ImageFilter.BoxBlur(radius=ratio))
+    if not darken_first:
+        im = change_brightness(im, COVER_ART_BRIGHTNESS)
+    return im
+
+
+def encode_image(
+    im: Image.Image,
+    format: str = "PNG",
+    quality: int = CARD_QUALITY,
+    max_bytes: Optional[int] = None,
+) -> BytesIO:
+    """Encodes the image in the format
+
+    JPEGs are saved progressive and optimized. If the lossy image
+    is bigger than max_bytes, the highest quality between CARD_MIN_QUALITY
+    and quality that fits in max_bytes is found using binary search.
+    If none fit, the image is saved in CARD_MIN_QUALITY. The search
+    encodes JPEGs without the slower optimizations, which only make
+    them smaller, and the chosen quality is encoded with them.
+
+    Args:
+        im (Image.Image): Image to encode.
+        format (str, optional): Image format passed to `PIL.Image.Image.save`.
+            Defaults to "PNG".
+        quality (int, optional): Quality of JPEG and WebP images.
+            Defaults to CARD_QUALITY.
+        max_bytes (Optional[int], optional): Byte budget of JPEG and WebP images.
+            Defaults to None which means no limit.
+
+    Returns:
+        BytesIO: The encoded image seeked to the 0 position.
+    """
+    format = format.upper()
+
+    def save(quality: Optional[int] = None, optimize: bool = True) -> BytesIO:
+        options: Dict[str, Any] = {}
+        if format == "JPEG":
+            options = dict(quality=quality, optimize=optimize, progressive=optimize)
+        elif format == "WEBP":
+            options = dict(quality=quality, method=4)
+        image = BytesIO()
+        im.save(image, format=format, **options)
+        image.seek(0)
+        return image
+
+    if format not in LOSSY_FORMATS:
+        return save()
+    image = save(quality)
+    if max_bytes is None or len(image.getbuffer()) <= max_bytes:
+        return image
+
+    low, high = CARD_MIN_QUALITY, quality - 1
+    found = CARD_MIN_QUALITY
+    while low <= high:
+        middle = (low + high) // 2
+        if len(save(middle, optimize=False).getbuffer()) <= max_bytes:
+            found = middle
+            low = middle + 1
+        else:
+            high = middle - 1
+    return save(found)
+
+
+def base_image(cover_art: BinaryIO, url: Optional[str] = None) -> Image.Image:
+    """Returns the prepared cover art from the cache or prepares it
+
+    The same song usually gets many lyric cards, so the prepared
+    cover arts are cached by their URL. Cover arts without a URL
+    (e.g. photos sent by users) aren't cached.
+    The returned image must be copied before it's drawn on.
+
+    Args:
+        cover_art (BinaryIO): Cover art image.
+        url (Optional[str], optional): URL of the cover art. Defaults to None.
+
+    Returns:
+        Image.Image: Base image of lyric cards of the cover art.
+    """
+    im = BASE_IMAGES.get(url) if url is not None else None
+    if im is not None:
+        return im
+    if isinstance(cover_art, BytesIO):
+        data = cover_art.getvalue()
+    else:
+        cover_art.seek(0)
+        data = cover_art.read()
+    im = prepare_cover_art(data)
+    if url is not None:
+        BASE_IMAGES.set(url, im)
+    return im
+
+
 def build_lyric_card(
     cover_art: BytesIO,
     lyrics: str,
@@ -282,6 +659,9 @@ def build_lyric_card(
     rtl_lyrics: bool = False,
     rtl_metadata: bool = False,
     format: str = "PNG",
+    quality: int = CARD_QUALITY,
+    max_bytes: Optional[int] = None,
+    cover_art_url: Optional[str] = None,
 ) -> BytesIO:
     """Builds lyric card
 
@@ -304,33 +684,64 @@ def build_lyric_card(
             characters of said languages. Defaults to False.
         format (str, optional): Format of the final card passed to
             `PIL.Image.Image.save`. Defaults to "PNG".
+        quality (int, optional): Quality of JPEG and WebP cards.
+            Defaults to CARD_QUALITY.
+        max_bytes (Optional[int], optional): Byte budget of JPEG and WebP cards.
+            Defaults to None which means no limit.
+        cover_art_url (Optional[str], optional): URL of the cover art
+            used to cache the prepared cover art. Defaults to None
+            which means the cover art isn't cached.
 
     Returns:
         BytesIO: The lyric card in an in-memory file.
     """
-    im = Image.open(cover_art).convert("RGB")
-    im = change_brightness(im, COVER_ART_BRIGHTNESS)
-    original_size = im.size
-    if original_size != BUILDER_IMAGE_SIZE:
-        im = im.resize(BUILDER_IMAGE_SIZE, Image.BOX)
-        # Blur image to cover the loss in quality caused by resizing
-        # Images bigger than 700px don't seem to suffer noticeably
-        if original_size[0] <= 700:
-            ratio = BUILDER_IMAGE_SIZE[0] / original_size[0]
-            im = im.filter(ImageFilter.BoxBlur(radius=ratio))
+    im = base_image(cover_art, cover_art_url).copy()
     add_double_quotes(im, rtl=rtl_lyrics)
-    draw = ImageDraw.Draw(im)
-    pos_end = add_lyrics(draw, lyrics, rtl=rtl_lyrics)
-    add_metadata(
-        draw,
-        pos_end,
+    layout = layout_card(
+        lyrics,
         song_title,
         primary_artists,
-        featured_artists if featured_artists else [],
-        rtl=rtl_metadata,
+        featured_artists,
+        rtl_lyrics=rtl_lyrics,
+        rtl_metadata=rtl_metadata,
     )
-    lyric_card = BytesIO()
+    draw_layout(im, layout)
+    lyric_card = encode_image(im, format, quality=quality, max_bytes=max_bytes)
     lyric_card.size = im.size  # type: ignore
-    im.save(lyric_card, format=format)
-    lyric_card.seek(0)
     return lyric_card
+
+
+def render_lyric_card(
+    cover_art: bytes,
+    lyrics: str,
+    song_title: str,
+    primary_artists: List[str],
+    featured_artists: Optional[List[str]] = None,
+    rtl_lyrics: bool = False,
+    rtl_metadata: bool = False,
+    format: str = "PNG",
+    quality: int = CARD_QUALITY,
+    max_bytes: Optional[int] = None,
+    cover_art_url: Optional[str] = None,
+) -> bytes:
+    """Builds a lyric card from picklable arguments
+
+    Used to build lyric cards in card_pool. The arguments are the
+    same as build_lyric_card's, except the cover art is bytes.
+
+    Returns:
+        bytes: The lyric card.
+    """
+    return build_lyric_card(
+        BytesIO(cover_art),
+        lyrics,
+        song_title,
+        primary_artists,
+        featured_artists,
+        rtl_lyrics=rtl_lyrics,
+        rtl_metadata=rtl_metadata,
+        format=format,
+        quality=quality,
+        max_bytes=max_bytes,
+        cover_art_url=cover_art_url,
+    ).getvalue()
@@ -209,7 +209,6 @@ def display_song(update: Update, context: CallbackContext) -> int:
             return END
 
     song = genius.song(genius_id)["song"]
-    cover_art = utils.fix_image_format(genius, song["song_art_image_url"])
     caption = song_caption(update, context, song, text["caption"], language)
 
     callback_data = f"song_{song['id']}_lyrics"
@@ -263,10 +262,12 @@ def display_song(update: Update, context: CallbackContext) -> int:
                     )
                 ]
             )
-    bot.send_photo(
+    utils.send_photo(
+        bot,
         chat_id,
-        cover_art,
+        song["song_art_image_url"],
         caption,
+        genius=genius,
         reply_markup=IBKeyboard(buttons),
         reply_to_message_id=reply_to_message_id,
     )
@@ -449,37 +450,19 @@ def song_caption(
         release_date = song["release_date_for_display"]
 
     if song.get("featured_artists"):
-        features = ", ".join(
-            [
-                utils.deep_link(x["name"], x["id"], "artist", "genius")
-                for x in song["featured_artists"]
-            ]
-        )
+        features = utils.deep_links(song["featured_artists"], "artist", sep=", ")
         features = caption["features"].replace("{}", features)
 
     if song.get("albums"):
-        album = ", ".join(
-            utils.deep_link(album["name"], album["id"], "album", "genius")
-            for album in song["albums"]
-        )
+        album = utils.deep_links(song["albums"], "album", sep=", ")
         album = caption["albums"].replace("{}", album)
 
     if song.get("producer_artists"):
-        producers = ", ".join(
-            [
-                utils.deep_link(x["name"], x["id"], "artist", "genius")
-                for x in song["producer_artists"]
-            ]
-        )
+        producers = utils.deep_links(song["producer_artists"], "artist", sep=", ")
         producers = caption["producers"].replace("{}", producers)
 
     if song.get("writer_artists"):
-        writers = ", ".join(
-            [
-                utils.deep_link(x["name"], x["id"], "artist", "genius")
-                for x in song["writer_artists"]
-            ]
-        )
+        writers = utils.deep_links(song["writer_artists"], "artist", sep=", ")
         writers = caption["writers"].replace("{}", writers)
 
     if song.get("song_relationships"):
@@ -489,11 +472,8 @@ def song_caption(
                 type_ = caption[relation["type"]]
             else:
                 type_ = " ".join([x.capitalize() for x in relation["type"].split("_")])
-            songs = ", ".join(
-                [
-                    utils.deep_link(x["title"], x["id"], "song", "genius")
-                    for x in relation["songs"]
-                ]
+            songs = utils.deep_links(
+                relation["songs"], "song", sep=", ", name_key="title"
             )
             string = f"\n<b>{type_}</b>:\n{songs}"
 
@@ -104,7 +104,6 @@ def display_user(update: Update, context: CallbackContext) -> int:
 
     user_id = int(user_id_str)
     user = genius.user(user_id)["user"]
-    cover_art = user["photo_url"]
     caption = user_caption(update, context, user, text["caption"])
 
     buttons: List = [[]]
@@ -116,9 +115,10 @@ def display_user(update: Update, context: CallbackContext) -> int:
         buttons[0].append(IButton(text["header"], callback_data=callback_data))
 
     keyboard = IBKeyboard(buttons) if buttons[0] else None
-    bot.send_photo(
+    utils.send_photo(
+        bot,
         chat_id,
-        cover_art,
+        user["photo_url"],
         caption,
         reply_markup=keyboard,
         reply_to_message_id=reply_to_message_id,
@@ -186,8 +186,8 @@ def display_user_header(update: Update, context: CallbackContext) -> int:
 
     photo = user["custom_header_image_url"]
     caption = text.format(username=user["name"])
-    context.bot.send_photo(
-        chat_id, photo, caption, reply_to_message_id=reply_to_message_id
+    utils.send_photo(
+        context.bot, chat_id, photo, caption, reply_to_message_id=reply_to_message_id
     )
 
     return END
@@ -0,0 +1,288 @@
+"""Memory usage of a running bot
+
+Developers use the /memory command to see the sizes of the in-memory
+stores (user_data, bot_data, the caches and the job queue) and, while
+tracemalloc is tracing, the lines that allocated the most memory
+and how that changed since the previous snapshot.
+"""
+import sys
+import threading
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import PurePath
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Dict, List, Optional, Set, Sized, Tuple
+
+from PIL import Image
+from telegram import Bot
+from telegram.ext import ConversationHandler, Dispatcher, JobQueue
+
+# Number of lines in the allocation sections of a report
+REPORT_LINES = 15
+
+# Types whose objects aren't counted by deep_sizeof. They're shared by
+# the whole bot, so counting them would count (almost) everything.
+SHARED_TYPES: Tuple[type, ...] = (
+    type,
+    ModuleType,
+    FunctionType,
+    MethodType,
+    BuiltinFunctionType,
+    Bot,
+    Dispatcher,
+    JobQueue,
+)
+
+# Size of an empty BytesIO. sys.getsizeof doesn't count the buffers
+# BytesIO objects share with bytes objects, so they're counted separately.
+BYTESIO_SIZE = sys.getsizeof(BytesIO())
+
+# Allocations of tracemalloc itself and the import system aren't reported
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def format_size(size: float, sign: bool = False) -> str:
+    """Returns the size in bytes in a human-readable format (e.g. 1.5 MiB)"""
+    unit = "B"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    precision = 0 if unit == "B" else 1
+    return f"{size:{'+' if sign else ''}.{precision}f} {unit}"
+
+
+def deep_sizeof(obj: Any) -> int:
+    """Returns the approximate size of the object and the objects it refers to
+
+    Containers, the attributes of objects, the buffers of BytesIO objects
+    and the pixels of PIL images are counted. Objects that are referred to
+    more than once are counted once and the objects of SHARED_TYPES
+    aren't counted.
+
+    Args:
+        obj (Any): Object to measure.
+
+    Returns:
+        int: Size in bytes.
+    """
+    seen: Set[int] = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, BytesIO):
+            size += BYTESIO_SIZE + (0 if obj.closed else len(obj.getvalue()))
+        else:
+            size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        elif isinstance(obj, Image.Image):
+            size += obj.width * obj.height * len(obj.getbands())
+
+        if hasattr(obj, "__dict__"):
+            stack.append(vars(obj))
+        for slot in getattr(type(obj), "__slots__", ()):
+            if slot != "__weakref__" and hasattr(obj, slot):
+                stack.append(getattr(obj, slot))
+    return size
+
+
+@dataclass
+class StoreSize:
+    """Size of an in-memory store
+
+    Attributes:
+        name (str): Name of the store.
+        items (Optional[int]): Number of items or None if
+            the store isn't a container.
+        size (Optional[int]): Approximate size in bytes or None if
+            the items can't be measured (e.g. functools.lru_cache caches).
+    """
+
+    name: str
+    items: Optional[int]
+    size: Optional[int]
+
+
+def store_sizes(dispatcher: Dispatcher, caches: Dict[str, Any]) -> List[StoreSize]:
+    """Returns the sizes of the stores of the dispatcher and the caches
+
+    Args:
+        dispatcher (Dispatcher): The bot's dispatcher.
+        caches (Dict[str, Any]): utils.LRUCache objects, functools.lru_cache
+            functions or other containers keyed by their name.
+
+    Returns:
+        List[StoreSize]: Sizes of user_data, chat_data, the conversations,
+        the job queue, the keys of bot_data and the caches.
+    """
+    conversations = [
+        handler.conversations
+        for handlers in dispatcher.handlers.values()
+        for handler in handlers
+        if isinstance(handler, ConversationHandler)
+    ]
+    jobs = dispatcher.job_queue.jobs() if dispatcher.job_queue else ()
+    sizes = [
+        StoreSize(
+            "user_data", len(dispatcher.user_data), deep_sizeof(dispatcher.user_data)
+        ),
+        StoreSize(
+            "chat_data", len(dispatcher.chat_data), deep_sizeof(dispatcher.chat_data)
+        ),
+        StoreSize(
+            "conversations",
+            sum(len(conversation) for conversation in conversations),
+            deep_sizeof(conversations),
+        ),
+        StoreSize("job_queue", len(jobs), deep_sizeof([job.context for job in jobs])),
+    ]
+    for key, value in dispatcher.bot_data.items():
+        items = len(value) if isinstance(value, Sized) else None
+        sizes.append(StoreSize(f"bot_data[{key}]", items, deep_sizeof(value)))
+    for name, cache in caches.items():
+        if hasattr(cache, "cache_info"):
+            sizes.append(StoreSize(name, cache.cache_info().currsize, None))
+        else:
+            sizes.append(StoreSize(name, len(cache), deep_sizeof(cache)))
+    return sizes
+
+
+def format_store_sizes(sizes: List[StoreSize]) -> str:
+    """Returns the sizes as a table"""
+    lines = [f"{'store':<28} {'items':>7} {'size':>10}"]
+    for store in sizes:
+        items = store.items if store.items is not None else "-"
+        size = format_size(store.size) if store.size is not None else "?"
+        lines.append(f"{store.name:<28} {items:>7} {size:>10}")
+    return "\n".join(lines)
+
+
+def location(traceback: tracemalloc.Traceback) -> str:
+    """Returns the last directory, file name and line of the most recent frame"""
+    frame = traceback[0]
+    return f"{PurePath(*PurePath(frame.filename).parts[-2:])}:{frame.lineno}"
+
+
+@dataclass
+class AllocationReport:
+    """Allocations of a tracemalloc snapshot
+
+    Attributes:
+        snapshot (tracemalloc.Snapshot): The snapshot.
+        previous (Optional[tracemalloc.Snapshot]): The previous snapshot
+            of the tracer or None if there wasn't one.
+        traced (int): Size of the traced memory in bytes.
+        peak (int): Peak size of the traced memory in bytes.
+    """
+
+    snapshot: tracemalloc.Snapshot
+    previous: Optional[tracemalloc.Snapshot]
+    traced: int
+    peak: int
+
+    def summary(self, limit: int = REPORT_LINES) -> str:
+        """Returns the lines with the most allocated memory and the most growth
+
+        Args:
+            limit (int, optional): Number of lines in each section.
+                Defaults to REPORT_LINES.
+
+        Returns:
+            str: Summary of the report.
+        """
+        lines = [
+            f"traced {format_size(self.traced)} (peak {format_size(self.peak)})",
+            "",
+            f"{'size':>10} {'blocks':>8} line",
+        ]
+        for stat in self.snapshot.statistics("lineno")[:limit]:
+            lines.append(
+                f"{format_size(stat.size):>10} {stat.count:>8} "
+                f"{location(stat.traceback)}"
+            )
+        if self.previous is not None:
+            lines.extend(["", "since the previous snapshot:"])
+            for diff in self.snapshot.compare_to(self.previous, "lineno")[:limit]:
+                lines.append(
+                    f"{format_size(diff.size_diff, sign=True):>10} "
+                    f"{diff.count_diff:>+8} {location(diff.traceback)}"
+                )
+        return "\n".join(lines)
+
+
+class MemoryTracer:
+    """Traces allocations with tracemalloc and takes snapshots
+
+    Each snapshot is compared with the previous one, so taking them
+    periodically shows where the memory grows. Tracing slows down
+    the bot and uses more memory, so it should be stopped afterwards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> bool:
+        """Starts tracing and takes the first snapshot
+
+        Args:
+            frames (int, optional): Number of frames of the
+                tracebacks. Defaults to 1.
+
+        Returns:
+            bool: False if tracemalloc was already tracing.
+        """
+        with self._lock:
+            if tracemalloc.is_tracing():
+                return False
+            tracemalloc.start(frames)
+            self._snapshot = self._take()
+        return True
+
+    def stop(self) -> None:
+        """Stops tracing and removes the snapshot"""
+        with self._lock:
+            tracemalloc.stop()
+            self._snapshot = None
+
+    def snapshot(self) -> Optional[AllocationReport]:
+        """Takes a snapshot and compares it with the previous one
+
+        Returns:
+            Optional[AllocationReport]: The report or None if tracemalloc
+            isn't tracing.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return None
+            snapshot = self._take()
+            previous, self._snapshot = self._snapshot, snapshot
+            traced, peak = tracemalloc.get_traced_memory()
+        return AllocationReport(snapshot, previous, traced, peak)
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+TRACER = MemoryTracer()
@@ -0,0 +1,280 @@
+"""Metrics of the handlers and the upstream requests
+
+The metrics are kept in memory and exposed in Prometheus' text format
+at the /metrics route of the web server (see server.WebhookThread).
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# Upper bounds of the histogram buckets in seconds
+BUCKETS: Tuple[float, ...] = (
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Path segments kept as they are in the endpoint label of upstream requests.
+# Others (IDs, slugs and file names) are replaced to keep the number
+# of label values low.
+PATH_SEGMENT = re.compile(r"[A-Za-z_]+")
+
+REGISTRY: List["Metric"] = []
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class of the metrics
+
+    Args:
+        name (str): Name of the metric.
+        documentation (str): Description of the metric.
+        labelnames (Sequence[str], optional): Names of the labels.
+        registry (List[Metric], optional): Where the metric is registered.
+            Defaults to REGISTRY.
+    """
+
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: List["Metric"] = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} has the labels {self.labelnames}, not {tuple(labels)}."
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        """Returns the (name, labels, value) samples of the metric"""
+        with self._lock:
+            return [
+                (self.name, tuple(zip(self.labelnames, key)), value)
+                for key, value in self._values.items()
+            ]
+
+    def render(self) -> str:
+        """Returns the metric in Prometheus' text format"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Histogram with cumulative buckets
+
+    Args:
+        buckets (Sequence[float], optional): Upper bounds of the buckets.
+            Defaults to BUCKETS.
+    """
+
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # counts of the buckets, sum and count
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        samples: List[Tuple[str, Sequence[Tuple[str, str]], float]] = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = tuple(zip(self.labelnames, key))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = labels + (("le", format_value(bound)),)
+                    samples.append((f"{self.name}_bucket", bucket_labels, bucket_count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+HANDLER_SECONDS = Histogram(
+    "geniust_handler_seconds", "Time spent in handlers.", ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "geniust_handler_errors_total",
+    "Exceptions raised by handlers.",
+    ("handler", "error"),
+)
+HANDLERS_IN_PROGRESS = Gauge(
+    "geniust_handlers_in_progress", "Handlers running now.", ("handler",)
+)
+UPSTREAM_SECONDS = Histogram(
+    "geniust_upstream_request_seconds",
+    "Time of requests to upstream services.",
+    ("host", "endpoint"),
+)
+UPSTREAM_ERRORS = Counter(
+    "geniust_upstream_errors_total",
+    "Requests to upstream services that failed or had an error status code.",
+    ("host", "endpoint", "error"),
+)
+UPSTREAM_IN_PROGRESS = Gauge(
+    "geniust_upstream_requests_in_progress",
+    "Requests to upstream services waiting for a response.",
+    ("host", "endpoint"),
+)
+JOB_ITEMS = Counter(
+    "geniust_job_items_total",
+    "Items finished by the stages of jobs (e.g. fetched album tracks).",
+    ("job", "stage"),
+)
+
+
+@contextmanager
+def track(
+    histogram: Histogram, errors: Counter, in_progress: Gauge, **labels: Any
+) -> Iterator[None]:
+    """Times the block and counts its exceptions
+
+    Args:
+        histogram (Histogram): Records the duration of the block.
+        errors (Counter): Counts the exceptions by the name of their class.
+        in_progress (Gauge): Number of blocks running now.
+        **labels: Labels of the metrics.
+    """
+    in_progress.inc(**labels)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        errors.inc(error=type(e).__name__, **labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+        in_progress.dec(**labels)
+
+
+def track_handler(handler: str):
+    """Times the handler and counts its exceptions"""
+    return track(HANDLER_SECONDS, HANDLER_ERRORS, HANDLERS_IN_PROGRESS, handler=handler)
+
+
+def upstream_endpoint(url: str) -> Tuple[str, str]:
+    """Returns the host and the endpoint of a URL
+
+    The segments of the path that aren't names (e.g. IDs, slugs
+    and file names) are replaced with :id so that
+    https://api.genius.com/songs/1?text_format=html is ("api.genius.com",
+    "/songs/:id").
+
+    Args:
+        url (str): URL of the request.
+
+    Returns:
+        Tuple[str, str]: Host and endpoint.
+    """
+    parts = urlsplit(url)
+    segments = [
+        segment if PATH_SEGMENT.fullmatch(segment) else ":id"
+        for segment in parts.path.split("/")
+        if segment
+    ]
+    return parts.netloc, "/" + "/".join(segments)
+
+
+def track_upstream(url: str):
+    """Times the request to the URL and counts its exceptions"""
+    host, endpoint = upstream_endpoint(url)
+    return track(
+        UPSTREAM_SECONDS,
+        UPSTREAM_ERRORS,
+        UPSTREAM_IN_PROGRESS,
+        host=host,
+        endpoint=endpoint,
+    )
+
+
+def record_upstream_status(url: str, status_code: int) -> None:
+    """Counts the error status codes of upstream responses"""
+    if status_code >= 400:
+        host, endpoint = upstream_endpoint(url)
+        UPSTREAM_ERRORS.inc(host=host, endpoint=endpoint, error=str(status_code))
+
+
+def record_progress(event: Any) -> None:
+    """Counts the items of utils.ProgressEvent events
+
+    Meant to be added to utils.PROGRESS_LISTENERS.
+    """
+    JOB_ITEMS.inc(job=event.job, stage=event.stage)
+
+
+def render(registry: List[Metric] = REGISTRY) -> str:
+    """Returns the metrics in Prometheus' text format"""
+    return "\n".join(metric.render() for metric in registry) + "\n"
@@ -0,0 +1,194 @@
+"""Profiling the handlers of a running bot
+
+Developers start the profiler with the /profile command. Then the
+handlers (the functions decorated with utils.log) are profiled with
+cProfile until a number of them have finished or some time has passed.
+The results of all the calls are merged into one report.
+"""
+import cProfile
+import logging
+import marshal
+import os
+import pstats
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("geniust")
+
+# Number of functions in the summary of a report
+REPORT_FUNCTIONS = 25
+
+
+@dataclass
+class ProfileReport:
+    """Merged results of the profiled handlers
+
+    Attributes:
+        stats (pstats.Stats): Stats of all the calls.
+        calls (Dict[str, int]): Number of profiled calls of each handler.
+        seconds (float): Seconds the profiler was running.
+    """
+
+    stats: pstats.Stats
+    calls: Dict[str, int]
+    seconds: float
+
+    def summary(self, limit: int = REPORT_FUNCTIONS) -> str:
+        """Returns the handlers and the functions with the most cumulative time
+
+        Args:
+            limit (int, optional): Number of functions. Defaults to
+                REPORT_FUNCTIONS.
+
+        Returns:
+            str: Summary of the report.
+        """
+        lines = [
+            f"{sum(self.calls.values())} calls in {self.seconds:.1f} s",
+            *(
+                f"{count:>5} {name}"
+                for name, count in Counter(self.calls).most_common()
+            ),
+            "",
+            f"{'cumtime':>8} {'tottime':>8} {'ncalls':>7} function",
+        ]
+        functions = sorted(
+            self.stats.stats.items(),  # type: ignore[attr-defined]
+            key=lambda item: item[1][3],
+            reverse=True,
+        )
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in functions[
+            :limit
+        ]:
+            location = f"{os.path.basename(filename)}:{line}" if line else "~"
+            lines.append(f"{cumtime:8.3f} {tottime:8.3f} {ncalls:7} {location}({name})")
+        return "\n".join(lines)
+
+    def dump(self) -> bytes:
+        """Returns the stats in the format of pstats.Stats.dump_stats
+
+        The file can be opened by pstats and tools like snakeviz.
+        """
+        return marshal.dumps(self.stats.stats)  # type: ignore[attr-defined]
+
+
+class HandlerProfiler:
+    """Profiles the handlers that run while it's active
+
+    Only the outermost handler of a thread is profiled,
+    so handlers called by other handlers are part of their caller's
+    profile. Threads and processes started by the handlers aren't profiled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active = False
+        self._stats: Optional[pstats.Stats] = None
+        self._calls: Dict[str, int] = {}
+        self._max_calls: Optional[int] = None
+        self._started = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._on_done: Optional[Callable[[ProfileReport], Any]] = None
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def start(
+        self,
+        on_done: Callable[[ProfileReport], Any],
+        calls: Optional[int] = None,
+        seconds: Optional[float] = None,
+    ) -> bool:
+        """Starts profiling the handlers
+
+        Args:
+            on_done (Callable[[ProfileReport], Any]): Called with the report
+                in a new thread when the profiler stops.
+            calls (Optional[int], optional): Stop after this many handler
+                calls. Defaults to None.
+            seconds (Optional[float], optional): Stop after this many seconds.
+                Defaults to None.
+
+        Returns:
+            bool: False if the profiler was already active.
+        """
+        with self._lock:
+            if self._active:
+                return False
+            self._active = True
+            self._stats = None
+            self._calls = {}
+            self._max_calls = calls
+            self._on_done = on_done
+            self._started = time.monotonic()
+            if seconds is not None:
+                self._timer = threading.Timer(seconds, self.stop)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def stop(self) -> None:
+        """Stops the profiler and sends its report to on_done"""
+        with self._lock:
+            if not self._active:
+                return
+            self._active = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._stats is None:
+                self._stats = pstats.Stats()
+            report = ProfileReport(
+                self._stats, self._calls, time.monotonic() - self._started
+            )
+            on_done = self._on_done
+            self._stats = None
+            self._on_done = None
+        threading.Thread(target=on_done, args=(report,), daemon=True).start()
+
+    def profile(self, name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Calls the function and profiles it if the profiler is active
+
+        Args:
+            name (str): Name of the handler.
+            func (Callable[..., Any]): The handler.
+            *args: Positional arguments of the handler.
+            **kwargs: Keyword arguments of the handler.
+
+        Returns:
+            Any: What the function returns.
+        """
+        if not self._active or getattr(self._local, "profiling", False):
+            return func(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        self._local.profiling = True
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self._local.profiling = False
+            self._add(name, profile)
+
+    def _add(self, name: str, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if not self._active:
+                return
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._calls[name] = self._calls.get(name, 0) + 1
+            finished = (
+                self._max_calls is not None
+                and sum(self._calls.values()) >= self._max_calls
+            )
+        if finished:
+            self.stop()
+
+
+PROFILER = HandlerProfiler()
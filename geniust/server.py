@@ -1,6 +1,8 @@
+import hmac
 import json
 import logging
 import threading
+from typing import Optional
 
 import tekore as tk
 import tornado.ioloop
@@ -11,6 +13,8 @@ from telegram import Bot
 from telegram.utils.webhookhandler import WebhookServer
 from tornado.web import RequestHandler, url
 
+from geniust import metrics
+from geniust.constants import METRICS_TOKEN
 from geniust.db import Database
 from geniust.utils import log
 
@@ -27,6 +31,31 @@ class CronHandler(RequestHandler):
         self.finish()
 
 
+class MetricsHandler(RequestHandler):
+    """Exposes the metrics in Prometheus' text format
+
+    The server is public, so the requests must have the token in their
+    Authorization header ("Bearer <token>"). The metrics aren't served
+    at all if there's no token.
+    """
+
+    def initialize(self, token: Optional[str]) -> None:
+        self.token = token
+
+    def get(self):
+        if not self.token:
+            self.send_error(404)
+            return
+        authorization = self.request.headers.get("Authorization", "")
+        if not hmac.compare_digest(
+            authorization.encode(), f"Bearer {self.token}".encode()
+        ):
+            self.send_error(403)
+            return
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics.render())
+
+
 class TokenHandler(RequestHandler):
     """Handles redirected URLs from Genius
 
@@ -174,6 +203,8 @@ class WebhookThread(threading.Thread):  # pragma: no cover
 
     This webhook is intended to respond to cron jobs that keep the bot from
     going to sleep in Heroku's free plan and receive tokens from Genius.
+    It also serves the metrics of the bot at /metrics to the requests
+    that have METRICS_TOKEN.
     """
 
     def __init__(
@@ -183,6 +214,7 @@ class WebhookThread(threading.Thread):  # pragma: no cover
         app = tornado.web.Application(
             [
                 url(r"/get", CronHandler),
+                url(r"/metrics", MetricsHandler, dict(token=METRICS_TOKEN)),
                 url(
                     r"/callback",
                     TokenHandler,
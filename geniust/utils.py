@@ -1,6 +1,13 @@
 import functools
 import logging
+import multiprocessing
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
 from functools import wraps
 from io import BytesIO
 from itertools import zip_longest
@@ -8,6 +15,8 @@ from typing import (
     Any,
     Callable,
     Dict,
+    Generic,
+    Hashable,
     Iterable,
     Iterator,
     List,
@@ -17,16 +26,20 @@ from typing import (
     TypeVar,
     Union,
 )
+from urllib.parse import urlsplit
 
 import Levenshtein
 from bs4 import BeautifulSoup, Comment, NavigableString
 from bs4.element import Tag
 from lyricsgenius.utils import clean_str
 from PIL import Image, UnidentifiedImageError
+from telegram import Bot, Message
+from telegram.error import BadRequest
 from telegram.utils.helpers import create_deep_linked_url
 
 import geniust
-from geniust.constants import TELEGRAM_HTML_TAGS
+from geniust import metrics, profiling
+from geniust.constants import TELEGRAM_HTML_TAGS, UPSTREAM_URL
 
 # (\[[^\]\n]+\]|\\n|!--![\S\s]*?!__!)|.*[^\x00-\x7F].*
 regex = (
@@ -83,6 +96,19 @@ MESSAGE_ENTITY_TYPES = {
     "MessageEntityUrl": "url",
 }
 RT = TypeVar("RT")
+VT = TypeVar("VT")
+
+# Called with every ProgressEvent of all jobs, e.g. to collect metrics
+PROGRESS_LISTENERS: List[Callable[["ProgressEvent"], Any]] = []
+
+# Max number of photo file IDs to keep
+PHOTO_CACHE_SIZE = 4096
+
+# Max number of deep linked URLs to memoize
+DEEP_LINK_CACHE_SIZE = 4096
+
+# Name of the handler each thread is running (see log)
+_running_handler = threading.local()
 
 
 def check_callback_query_user(func: Callable[..., RT]) -> Optional[Callable[..., RT]]:
@@ -112,6 +138,28 @@ def check_callback_query_user(func: Callable[..., RT]) -> Optional[Callable[...,
     return wrapper
 
 
+def upstream_url(url: str) -> str:
+    """Returns the URL on the upstream stand-in server
+
+    When UPSTREAM_URL is set (e.g. to load test the bot with
+    benchmarks/upstream.py), requests to the real services are sent
+    to it instead with the host as the first part of the path.
+    For example https://api.genius.com/songs/1 becomes
+    UPSTREAM_URL/api.genius.com/songs/1.
+
+    Args:
+        url (str): URL of a real service.
+
+    Returns:
+        str: The URL on UPSTREAM_URL or the URL itself if it isn't set.
+    """
+    if not UPSTREAM_URL or url.startswith(UPSTREAM_URL):
+        return url
+    parts = urlsplit(url)
+    path = f"{UPSTREAM_URL.rstrip('/')}/{parts.netloc}{parts.path}"
+    return f"{path}?{parts.query}" if parts.query else path
+
+
 def check_length(caption: str, limit: int = 1024) -> str:
     """checks length of message against Telegram limits
 
@@ -136,6 +184,37 @@ def check_length(caption: str, limit: int = 1024) -> str:
     return str(soup)
 
 
+@functools.lru_cache(maxsize=DEEP_LINK_CACHE_SIZE)
+def deep_linked_url(
+    type: str,
+    id: str,
+    platform: str = "genius",
+    download: bool = False,
+    bot_username: Optional[str] = None,
+) -> str:
+    """Returns the deep linked URL of an entity.
+
+    The URLs are memoized since the same entities (e.g. popular artists)
+    are linked over and over in captions and track lists.
+
+    Args:
+        type (str): Type of the entity.
+        id (str): ID of the entity.
+        platform (str, optional): Platform which the entity is from.
+        download (bool, optional): Whether user wants to download something or not.
+        bot_username (Optional[str], optional): Username of the bot. Defaults to
+            None which means geniust.username. It's part of the memo key so that
+            a change of username doesn't return stale URLs.
+
+    Returns:
+        str: Deep linked URL.
+    """
+    return create_deep_linked_url(
+        bot_username if bot_username else geniust.username,
+        f"{type}_{id}_{platform}{'_download' if download else ''}",
+    )
+
+
 def deep_link(
     name: str,
     id: str,
@@ -165,12 +244,49 @@ def deep_link(
         str: Deep linked entity
             (e.g. <a href="link">song name</name>)
     """
-    url = create_deep_linked_url(
-        geniust.username, f"{type}_{id}_{platform}{'_download' if download else ''}"
-    )
+    url = deep_linked_url(type, str(id), platform, download, geniust.username)
     return f"""<a href="{url}">{name}</a>"""
 
 
+def deep_links(
+    entities: Iterable[Dict[str, Any]],
+    type: str,
+    template: str = "{link}",
+    sep: str = "",
+    name_key: str = "name",
+    platform: str = "genius",
+) -> str:
+    """Deep links a list of entities and renders them into one string.
+
+    Each entity is rendered using the template and the results
+    are joined in one go.
+
+    Args:
+        entities (Iterable[Dict[str, Any]]): Entities to link. Each one must
+            have an "id" key and a key for its name (name_key).
+        type (str): Type of the entities.
+        template (str, optional): Template of each rendered entity.
+            It's formatted using the deep linked entity as "link" and
+            the entity's own keys. Defaults to "{link}".
+        sep (str, optional): Separator between rendered entities.
+            Defaults to "".
+        name_key (str, optional): Key of the text of the tag. Defaults to "name".
+        platform (str, optional): Platform which the entities are from.
+
+    Returns:
+        str: Rendered entities (e.g. <a href="link">song</a>, <a...>...</a>).
+    """
+    return sep.join(
+        template.format_map(
+            {
+                **entity,
+                "link": deep_link(entity[name_key], entity["id"], type, platform),
+            }
+        )
+        for entity in entities
+    )
+
+
 def remove_unsupported_tags(
     soup: BeautifulSoup, supported: List[str] = TELEGRAM_HTML_TAGS
 ) -> BeautifulSoup:
@@ -308,6 +424,48 @@ def fix_image_format(genius, cover_art_url: str) -> Union[str, BytesIO]:
         return geniust.DEFAULT_COVER_IMAGE
 
 
+def send_photo(
+    bot: Bot,
+    chat_id: int,
+    url: str,
+    caption: Optional[str] = None,
+    genius: Any = None,
+    **kwargs: Any,
+) -> Message:
+    """Sends a photo reusing its Telegram file ID if it was sent before
+
+    Photos sent by their file ID don't need to be downloaded
+    by Telegram again or converted by us.
+
+    Args:
+        bot (Bot): Telegram bot.
+        chat_id (int): Chat ID.
+        url (str): URL of the photo.
+        caption (Optional[str], optional): Photo caption.
+        genius (api.GeniusT, optional): a GeniusT client to fix the format
+            of the photo with (see fix_image_format). Defaults to None
+            which means the URL is sent as it is.
+        **kwargs (Any): Keyword arguments passed to Bot.send_photo.
+
+    Returns:
+        Message: Sent message.
+    """
+    file_id = PHOTO_FILE_IDS.get(url)
+    if file_id is not None:
+        try:
+            return bot.send_photo(chat_id, file_id, caption, **kwargs)
+        except BadRequest as e:
+            logging.getLogger("geniust").debug("Invalid file ID for %s: %s", url, e)
+            PHOTO_FILE_IDS.pop(url)
+
+    photo = fix_image_format(genius, url) if genius is not None else url
+    message = bot.send_photo(chat_id, photo, caption, **kwargs)
+    if message.photo:
+        # the largest size is sent when the file ID is used
+        PHOTO_FILE_IDS.set(url, message.photo[-1].file_id)
+    return message
+
+
 def fix_section_headers(string: str) -> str:
     """Makes sure section headers have two newline characters before them
 
@@ -372,7 +530,7 @@ def format_language(
 
 def format_annotations(
     lyrics: str,
-    annotations: List[Dict[int, str]],
+    annotations: Dict[str, str],
     include_annotations: bool,
     identifiers: Tuple[str, str] = ("!--!", "!__!"),
     format_type: str = "zip",
@@ -385,7 +543,7 @@ def format_annotations(
 
     Args:
         lyrics (str): song lyrics.
-        annotations (List[Tuple[int, str]]): Song annotations.
+        annotations (Dict[str, str]): Song annotations.
             Keys are annotation IDs that point to the annotation text.
             The annotations are found by the href attribute of <a> tags
             in the lyrics.
@@ -594,16 +752,325 @@ def human_format(num: int) -> str:
     return formatter % (num, ["", "K", "M", "G", "T", "P"][magnitude])
 
 
+def progress_bar(done: int, total: int, length: int = 10) -> str:
+    """Returns a text progress bar
+
+    Args:
+        done (int): Number of finished items.
+        total (int): Number of all items.
+        length (int, optional): Length of the bar. Defaults to 10.
+
+    Returns:
+        str: Progress bar (e.g. ▰▰▰▱▱▱▱▱▱▱).
+    """
+    filled = length * done // total if total else length
+    return "▰" * filled + "▱" * (length - filled)
+
+
 def log(func: Callable[..., RT]) -> Callable[..., RT]:
-    """logs entering and exiting functions for debugging."""
+    """logs entering and exiting functions for debugging.
+
+    The calls are also recorded in the handler metrics (see geniust.metrics)
+    with the module and the name of the function (e.g. song.display_lyrics)
+    and profiled when a developer has started the profiler (see /profile).
+    Only the outermost call of a thread is recorded. The functions it
+    calls (e.g. display_song calling display_lyrics) are part of it.
+    """
     logger = logging.getLogger(func.__module__)
+    qualname = getattr(func, "__qualname__", func.__name__)
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{qualname}"
 
     @wraps(func)
     def wrapper(*args, **kwargs) -> RT:
         logger.debug("Entering: %s", func.__name__)
-        result = func(*args, **kwargs)
+        if getattr(_running_handler, "name", None) is not None:
+            result = func(*args, **kwargs)
+        else:
+            _running_handler.name = name
+            try:
+                with metrics.track_handler(name):
+                    result = profiling.PROFILER.profile(name, func, *args, **kwargs)
+            finally:
+                _running_handler.name = None
         # logger.debug(repr(result))
         logger.debug("Exiting: %s", func.__name__)
         return result
 
     return wrapper
+
+
+class LRUCache(Generic[VT]):
+    """A thread-safe LRU cache with optional expiration
+
+    Args:
+        maxsize (int): Max number of items. The least recently
+            used item is removed when the cache is full.
+        ttl (Optional[float], optional): Seconds after which items expire.
+            Defaults to None which means items never expire.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, Tuple[VT, Optional[float]]]"
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[VT] = None) -> Optional[VT]:
+        """Returns the value of key if it's cached and hasn't expired
+
+        Args:
+            key (Hashable): Item key.
+            default (Optional[VT], optional): Returned if the key
+                isn't found. Defaults to None.
+
+        Returns:
+            Optional[VT]: Cached value or default.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: VT, ttl: Optional[float] = None) -> None:
+        """Caches the value
+
+        Args:
+            key (Hashable): Item key.
+            value (VT): Item value.
+            ttl (Optional[float], optional): Seconds after which the item
+                expires. Defaults to None which means the cache's TTL.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Removes the key from the cache if it's cached"""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all items"""
+        with self._lock:
+            self._items.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+# Telegram file IDs of sent photos keyed by their URL
+PHOTO_FILE_IDS: LRUCache[str] = LRUCache(maxsize=PHOTO_CACHE_SIZE)
+
+
+class PoolBusyError(Exception):
+    """Raised when too many jobs are waiting for a worker pool"""
+
+
+class WorkerPool:
+    """A process pool with a limited number of pending jobs
+
+    The processes are spawned (instead of forked from a multi-threaded
+    bot) on the first job. Jobs and their results must be picklable.
+
+    Args:
+        workers (int): Number of worker processes.
+        max_pending (int): Max number of submitted jobs that haven't finished.
+        initializer (Optional[Callable[[], Any]], optional): Called once
+            in each worker when it starts.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        initializer: Optional[Callable[[], Any]] = None,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.initializer = initializer
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Starts the worker processes before the first job
+
+        The workers run the initializer when they start, so the first
+        job doesn't wait for them. The start doesn't take a pending slot.
+        """
+        self.executor.submit(int)
+
+    def submit(
+        self, fn: Callable[..., RT], *args: Any, slot_timeout: float = 0
+    ) -> "Future[RT]":
+        """Submits a job to the pool
+
+        Args:
+            fn (Callable[..., RT]): Module-level function to run.
+            *args (Any): Arguments of the function.
+            slot_timeout (float, optional): Seconds to wait for one of
+                the pending jobs to finish if max_pending jobs are pending.
+                Defaults to 0.
+
+        Raises:
+            PoolBusyError: If max_pending jobs are still pending.
+
+        Returns:
+            Future[RT]: Future of the job.
+        """
+        if not self._pending.acquire(timeout=slot_timeout):
+            raise PoolBusyError(f"{self.max_pending} jobs are already pending.")
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def run(
+        self,
+        fn: Callable[..., RT],
+        *args: Any,
+        timeout: float = None,
+        slot_timeout: float = 0,
+    ) -> RT:
+        """Runs a job in the pool and waits for its result
+
+        Args:
+            fn (Callable[..., RT]): Module-level function to run.
+            *args (Any): Arguments of the function.
+            timeout (float, optional): Seconds to wait for the result.
+                Defaults to None which means no limit.
+            slot_timeout (float, optional): Seconds to wait for one of
+                the pending jobs to finish if max_pending jobs are pending.
+                Defaults to 0.
+
+        Raises:
+            PoolBusyError: If max_pending jobs are still pending.
+            concurrent.futures.TimeoutError: If the job doesn't finish in time.
+                Jobs that haven't started yet are cancelled.
+
+        Returns:
+            RT: Result of the job.
+        """
+        future = self.submit(fn, *args, slot_timeout=slot_timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts down the worker processes"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """Progress of a stage of a job
+
+    Attributes:
+        job (str): Job name (e.g. album).
+        stage (str): Stage name (e.g. fetched).
+        done (int): Number of finished items of the stage.
+        total (int): Total number of items of the stage.
+        time (float): Monotonic time of the event.
+    """
+
+    job: str
+    stage: str
+    done: int
+    total: int
+    time: float
+
+
+class ProgressReporter:
+    """Reports the progress of the stages of a job
+
+    Every event is passed to the listeners and PROGRESS_LISTENERS,
+    but report is called at most once every interval seconds,
+    so that it can edit a Telegram message without hitting the
+    rate limits. Updating the progress is thread-safe and a stage
+    doesn't go back if its updates arrive out of order.
+
+    Args:
+        job (str): Job name.
+        report (Callable[[Dict[str, Tuple[int, int]]], Any]): Called with
+            the done and total items of each stage in the order they started.
+        interval (float): Min seconds between two reports.
+        listeners (Iterable[Callable[[ProgressEvent], Any]], optional):
+            Called with every event of this job.
+    """
+
+    def __init__(
+        self,
+        job: str,
+        report: Callable[[Dict[str, Tuple[int, int]]], Any],
+        interval: float,
+        listeners: Iterable[Callable[[ProgressEvent], Any]] = (),
+    ):
+        self.job = job
+        self.report = report
+        self.interval = interval
+        self.listeners = list(listeners)
+        self.stages: Dict[str, Tuple[int, int]] = {}
+        self._last_report: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, done: int, total: int) -> None:
+        """Updates the progress of a stage
+
+        Args:
+            stage (str): Stage name.
+            done (int): Number of finished items of the stage.
+            total (int): Total number of items of the stage.
+        """
+        now = time.monotonic()
+        event = ProgressEvent(self.job, stage, done, total, now)
+        stages = None
+        with self._lock:
+            # updates of concurrent workers can arrive out of order
+            previous = self.stages.get(stage)
+            if previous is None or done >= previous[0]:
+                self.stages[stage] = (done, total)
+            if self._last_report is None or now - self._last_report >= self.interval:
+                self._last_report = now
+                stages = dict(self.stages)
+
+        for listener in self.listeners + PROGRESS_LISTENERS:
+            try:
+                listener(event)
+            except Exception:
+                logging.getLogger("geniust").exception("Progress listener failed.")
+        if stages is not None:
+            self.report(stages)
@@ -45,6 +45,8 @@ setup(
     version=version,
     packages=find_packages(
         exclude=(
+            "benchmarks",
+            "benchmarks.*",
             "tests",
             "tests.*",
         )
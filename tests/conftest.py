@@ -12,8 +12,9 @@ from lyricsgenius import Genius, OAuth2
 from telegram import Bot, CallbackQuery, Chat, Message, Update, User
 from telegram.ext import CallbackContext
 
-from geniust import api, constants, data, db
+from geniust import api, constants, data, db, utils
 from geniust.constants import Preferences
+from geniust.functions import lyric_card
 
 
 @pytest.fixture(scope="session")
@@ -31,6 +32,19 @@ def song_url():
     return "https://genius.com/Machine-gun-kelly-glass-house-lyrics"
 
 
+@pytest.fixture(autouse=True)
+def clear_photo_file_ids():
+    # file IDs of mocked messages shouldn't leak to other tests
+    yield
+    utils.PHOTO_FILE_IDS.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_lyric_cards():
+    yield
+    lyric_card.LYRIC_CARDS.clear()
+
+
 # ----------------- Data Files Fixtures -----------------
 
 
@@ -45,6 +59,12 @@ def full_album(data_path):
         return json.load(f)
 
 
+@pytest.fixture(scope="session")
+def persian_album(data_path):
+    with open(join(data_path, "persian_album.json"), encoding="utf8") as f:
+        return json.load(f)
+
+
 @pytest.fixture(scope="session")
 def search_albums_dict(data_path):
     with open(join(data_path, "search_albums.json"), encoding="utf8") as f:
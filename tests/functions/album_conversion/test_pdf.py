@@ -1,8 +1,12 @@
+import pickle
+from copy import deepcopy
 from io import BytesIO
 from os.path import join
 from unittest.mock import MagicMock, patch
 
 import pytest
+from bidi.algorithm import get_display
+from rtl import reshaper
 
 from geniust.functions import album_conversion
 
@@ -15,6 +19,39 @@ def test_get_farsi_text(text, arabic):
     assert res_arabic == arabic
 
 
+@pytest.mark.parametrize("long_text", [True, False])
+def test_get_farsi_text_matches_reshaper(persian_album, long_text):
+    lines = {
+        line
+        for track in persian_album["tracks"]
+        for line in track["song"]["lyrics"].split("<br/>\n")
+    }
+    lines.add("English words\tand\n فارسی  کلمات")
+
+    for line in lines:
+        res, arabic = album_conversion.pdf.get_farsi_text(line, long_text)
+
+        if long_text:
+            words = [
+                get_display(reshaper.reshape(word))
+                if reshaper.has_arabic_letters(word)
+                else word
+                for word in reversed(line.split())
+            ]
+            assert res == " ".join(words)
+        else:
+            assert res == get_display(reshaper.reshape(line))
+        assert arabic is reshaper.has_arabic_letters(line)
+
+
+def test_get_farsi_text_no_arabic_letters():
+    album_conversion.pdf.reshape_word.cache_clear()
+    text = "<a>only English text</a>"
+
+    assert album_conversion.pdf.get_farsi_text(text) == (text, False)
+    assert album_conversion.pdf.reshape_word.cache_info().currsize == 0
+
+
 @pytest.fixture(scope="module")
 def cover_art(data_path):
     with open(join(data_path, "cover_art.jpg"), "rb") as f:
@@ -38,3 +75,59 @@ def test_create_pdf(full_album, user_data, cover_art):
     assert isinstance(res, BytesIO)
     assert res.tell() == 0
     assert res.name.endswith(".pdf")
+
+
+def test_pdf_album_writer_close(full_album, cover_art):
+    request = MagicMock()
+    request().content = cover_art
+    user_data = {"lyrics_lang": "English", "include_annotations": True}
+
+    # the PDF is built in the PDF pool
+    writer = album_conversion.PDFAlbumWriter(full_album, user_data)
+    for track in full_album["tracks"]:
+        writer.add_track(track)
+    with patch("requests.get", request):
+        res = writer.close(full_album, timeout=120)
+
+    assert res.getvalue().startswith(b"%PDF")
+    assert res.tell() == 0
+    assert res.name.endswith(".pdf")
+
+
+def test_pdf_payload_is_picklable(full_album, cover_art):
+    request = MagicMock()
+    request().content = cover_art
+    user_data = {"lyrics_lang": "English", "include_annotations": True}
+
+    with patch("requests.get", request):
+        payload = album_conversion.pdf.pdf_payload(full_album, user_data)
+
+    assert pickle.loads(pickle.dumps(payload)) == payload
+    assert len(payload["tracks"]) == len(full_album["tracks"])
+
+
+def test_create_pdf_persian(persian_album, cover_art):
+    request = MagicMock()
+    request().content = cover_art
+    user_data = {"lyrics_lang": "English + Non-English", "include_annotations": True}
+
+    with patch("requests.get", request):
+        res = album_conversion.create_pdf(persian_album, user_data)
+
+    assert res.getvalue().startswith(b"%PDF")
+
+
+def test_pdf_album_writer(full_album):
+    album = deepcopy(full_album)
+    user_data = {"lyrics_lang": "English", "include_annotations": True}
+    writer = album_conversion.PDFAlbumWriter(album, user_data, release_lyrics=True)
+
+    for track in album["tracks"]:
+        writer.add_track(track)
+
+    assert len(writer.tracks) == len(album["tracks"])
+    # the lyrics are released as soon as they are converted
+    assert all("lyrics" not in track["song"] for track in album["tracks"])
+    styles = {style for track in writer.tracks for style, _ in track["lines"]}
+    assert styles <= {"Song Annotated", "Song Annotations", "Song Lyrics"}
+    assert "Song Annotations" in styles
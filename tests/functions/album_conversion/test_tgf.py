@@ -1,8 +1,17 @@
 import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from http.client import IncompleteRead
 from unittest.mock import MagicMock, patch
+from urllib.error import URLError
 
 import pytest
+import telegraph
 
+from geniust import db, utils
 from geniust.functions import album_conversion
 
 users = [
@@ -11,6 +20,17 @@ users = [
 ]
 
 
+# patched in all the tests to avoid mirroring the images
+mirror_cover_arts = album_conversion.tgf.mirror_cover_arts
+
+
+@pytest.fixture(autouse=True)
+def mirror():
+    mirror = MagicMock(side_effect=lambda urls, timeout=None: {x: x for x in urls})
+    with patch("geniust.functions.album_conversion.tgf.mirror_cover_arts", mirror):
+        yield mirror
+
+
 @pytest.mark.parametrize("user_data", users)
 def test_create_album_songs(full_album, user_data):
     account = MagicMock()
@@ -24,20 +44,85 @@ def test_create_album_songs(full_album, user_data):
     assert len(res) == len(full_album["tracks"])
 
     include_annotations = user_data["include_annotations"]
-    for i, song in enumerate(account.create_page.call_args_list):
+    # pages are created concurrently, so they're matched to tracks by title
+    tracks = {
+        utils.format_title(full_album["artist"]["name"], track["song"]["title"]): track
+        for track in full_album["tracks"]
+    }
+    for song in account.create_page.call_args_list:
         lyrics = song[1]["html_content"]
+        track = tracks[song[1]["title"]]
 
         lyrics = lyrics[lyrics.find("<aside>") :]
         annotations_count = len(re.findall("<blockquote>", lyrics))
 
         if include_annotations:
-            assert annotations_count == len(
-                full_album["tracks"][i]["song"]["annotations"]
-            )
+            assert annotations_count == len(track["song"]["annotations"])
         else:
             assert annotations_count == 0
 
 
+def test_create_album_songs_order_and_progress(full_album):
+    account = MagicMock()
+    account.create_page.side_effect = lambda title, html_content: {"path": title}
+    progress = MagicMock()
+
+    res = album_conversion.tgf.create_album_songs(
+        account, full_album, users[0], workers=4, progress=progress
+    )
+
+    artist = full_album["artist"]["name"]
+    for (link, _), track in zip(res, full_album["tracks"]):
+        title = utils.format_title(artist, track["song"]["title"])
+        assert link == f"https://telegra.ph/{title}"
+
+    total = len(full_album["tracks"])
+    # pages are reported outside the lock, so the calls can be out of order
+    assert sorted(call[0] for call in progress.call_args_list) == [
+        (i, total) for i in range(1, total + 1)
+    ]
+
+
+def test_telegraph_album_writer_progress_without_lock(full_album):
+    account = MagicMock()
+    account.create_page.side_effect = lambda title, html_content: {"path": title}
+    locked = []
+    writer = album_conversion.TelegraphAlbumWriter(
+        full_album,
+        users[0],
+        account,
+        progress=lambda done, total: locked.append(writer._lock.locked()),
+    )
+
+    for track in full_album["tracks"]:
+        writer.add_track(track)
+    writer.song_links()
+
+    assert locked == [False] * len(full_album["tracks"])
+
+
+@pytest.mark.parametrize("failures", [0, 2, 5])
+def test_create_page(failures):
+    account = MagicMock()
+    account.create_page.side_effect = [
+        telegraph.TelegraphException("FLOOD_WAIT")
+    ] * failures + [{"path": "test"}]
+
+    with patch("geniust.functions.album_conversion.tgf.sleep") as sleep:
+        if failures < album_conversion.tgf.TELEGRAPH_RETRIES:
+            res = album_conversion.tgf.create_page(account, "title", "content")
+            assert res == {"path": "test"}
+        else:
+            with pytest.raises(telegraph.TelegraphException):
+                album_conversion.tgf.create_page(account, "title", "content")
+
+    attempts = min(failures + 1, album_conversion.tgf.TELEGRAPH_RETRIES)
+    assert account.create_page.call_count == attempts
+    delays = [call[0][0] for call in sleep.call_args_list]
+    assert len(delays) == attempts - 1
+    assert all(x <= album_conversion.tgf.TELEGRAPH_MAX_RETRY_DELAY for x in delays)
+
+
 @pytest.mark.parametrize("user_data", users)
 def test_create_pages(full_album, user_data):
     account = MagicMock()
@@ -55,3 +140,232 @@ def test_create_pages(full_album, user_data):
 
     album_page = account.create_page.call_args[1]["html_content"]
     assert album_page.count("https://telegra.ph/test") == len(full_album["tracks"])
+
+
+def test_create_album_songs_reuses_pages(full_album):
+    database = db.Database("sqlite:///:memory:")
+    account = MagicMock()
+    account.create_page.side_effect = lambda title, html_content: {"path": title}
+    user_data = users[0]
+
+    first = album_conversion.tgf.create_album_songs(
+        account, full_album, user_data, database=database
+    )
+    assert account.create_page.call_count == len(full_album["tracks"])
+
+    # only the changed song is published again
+    account.create_page.reset_mock()
+    album = deepcopy(full_album)
+    album["tracks"][0]["song"]["title"] = "New Title"
+    progress = MagicMock()
+    second = album_conversion.tgf.create_album_songs(
+        account, album, user_data, database=database, progress=progress
+    )
+
+    assert account.create_page.call_count == 1
+    assert second[1:] == first[1:]
+    assert second[0] != first[0]
+    total = len(album["tracks"])
+    assert [call[0] for call in progress.call_args_list] == [
+        (i, total) for i in range(1, total + 1)
+    ]
+
+    # other preferences don't reuse the pages
+    account.create_page.reset_mock()
+    album_conversion.tgf.create_album_songs(
+        account, full_album, users[1], database=database
+    )
+    assert account.create_page.call_count == len(full_album["tracks"])
+
+
+def test_mirror_cover_arts():
+    tgf = album_conversion.tgf
+    tgf.MIRRORED_COVER_ARTS.clear()
+    fetch = MagicMock(
+        side_effect=lambda url: (
+            url,
+            "" if "fail" in url else f"https://telegra.ph/{url}",
+        )
+    )
+    urls = ["a.jpg", "b.jpg", "a.jpg", "fail.jpg", "a.jpg"]
+
+    with patch.object(tgf, "fetch", fetch):
+        res = mirror_cover_arts(urls)
+        # mirrored images are cached
+        cached = mirror_cover_arts(["a.jpg", "b.jpg"])
+
+    assert res == {
+        "a.jpg": "https://telegra.ph/a.jpg",
+        "b.jpg": "https://telegra.ph/b.jpg",
+        "fail.jpg": "fail.jpg",
+    }
+    assert cached == {"a.jpg": res["a.jpg"], "b.jpg": res["b.jpg"]}
+    assert sorted(call[0][0] for call in fetch.call_args_list) == [
+        "a.jpg",
+        "b.jpg",
+        "fail.jpg",
+    ]
+
+
+def test_mirror_cover_arts_error():
+    tgf = album_conversion.tgf
+    tgf.MIRRORED_COVER_ARTS.clear()
+    fetch = MagicMock(
+        side_effect=[ConnectionResetError(), ("a.jpg", "https://telegra.ph/a.jpg")]
+    )
+
+    with patch.object(tgf, "fetch", fetch):
+        failed = mirror_cover_arts(["a.jpg"])
+        # the failed mirroring is removed by its done callback
+        # which can run after wait() returns
+        deadline = time.monotonic() + 5
+        while tgf.MIRRORING_COVER_ARTS and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert tgf.MIRRORING_COVER_ARTS == {}
+        mirrored = mirror_cover_arts(["a.jpg"])
+
+    assert failed == {"a.jpg": "a.jpg"}
+    assert mirrored == {"a.jpg": "https://telegra.ph/a.jpg"}
+    assert fetch.call_count == 2
+
+
+@pytest.mark.parametrize("failures", [0, 1, 3])
+def test_fetch(failures):
+    tgf = album_conversion.tgf
+    response = MagicMock()
+    response.__enter__().read.return_value = b"image"
+    urlopen = MagicMock(side_effect=[socket.timeout()] * failures + [response])
+    upload_file = MagicMock(return_value=["/file/image.jpg"])
+    url = "https://images.genius.com/image.jpg"
+
+    with patch.object(tgf, "urlopen", urlopen), patch(
+        "telegraph.upload.upload_file", upload_file
+    ):
+        res = tgf.fetch(url, timeout=1, retries=3)
+
+    if failures < 3:
+        assert res == (url, "https://telegra.ph/file/image.jpg")
+        assert upload_file.call_args[0][0][1] == "image.jpg"
+    else:
+        assert res == (url, "")
+        upload_file.assert_not_called()
+    assert all(call[1]["timeout"] == 1 for call in urlopen.call_args_list)
+
+
+@pytest.mark.parametrize(
+    "error", [ConnectionResetError(), IncompleteRead(b"ima", 2), URLError("error")]
+)
+def test_fetch_read_error(error):
+    tgf = album_conversion.tgf
+    response = MagicMock()
+    response.__enter__().read.side_effect = [error, b"image"]
+    upload_file = MagicMock(return_value=["/file/image.jpg"])
+    url = "https://images.genius.com/image.jpg"
+
+    with patch.object(tgf, "urlopen", MagicMock(return_value=response)), patch(
+        "telegraph.upload.upload_file", upload_file
+    ):
+        res = tgf.fetch(url, timeout=1, retries=2)
+
+    assert res == (url, "https://telegra.ph/file/image.jpg")
+
+
+def test_create_album_songs_mirrored_cover_arts(full_album, mirror):
+    mirror.side_effect = lambda urls, timeout=None: {x: f"{x}.mirror" for x in urls}
+    account = MagicMock()
+    account.create_page.return_value = {"path": "test"}
+
+    album_conversion.tgf.create_album_songs(account, full_album, users[0])
+
+    # each track's cover art is mirrored as soon as it's added
+    assert mirror.call_count == len(full_album["tracks"])
+    for call in account.create_page.call_args_list:
+        assert '.mirror"><figcaption>' in call[1]["html_content"]
+
+
+def test_mirror_cover_arts_in_flight():
+    tgf = album_conversion.tgf
+    tgf.MIRRORED_COVER_ARTS.clear()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch(url):
+        started.set()
+        release.wait(5)
+        return url, f"https://telegra.ph/{url}"
+
+    fetch = MagicMock(side_effect=fetch)
+    with patch.object(tgf, "fetch", fetch), ThreadPoolExecutor(2) as executor:
+        first = executor.submit(mirror_cover_arts, ["a.jpg"])
+        started.wait(5)
+        # the second call waits for the first mirroring instead of starting another
+        second = executor.submit(mirror_cover_arts, ["a.jpg"])
+        release.set()
+        assert (
+            first.result() == second.result() == {"a.jpg": "https://telegra.ph/a.jpg"}
+        )
+
+    fetch.assert_called_once_with("a.jpg")
+
+
+def test_telegraph_album_writer_failure(full_album):
+    database = MagicMock()
+    database.get_telegraph_pages.return_value = {}
+    account = MagicMock()
+    account.create_page.side_effect = lambda title, html_content: {"path": title}
+    tracks = full_album["tracks"]
+    failed = utils.format_title(
+        full_album["artist"]["name"], tracks[1]["song"]["title"]
+    )
+
+    def create_page(account, title, html_content):
+        if title == failed:
+            raise telegraph.TelegraphException("error")
+        return {"path": title}
+
+    writer = album_conversion.tgf.TelegraphAlbumWriter(
+        full_album, users[0], account, database=database
+    )
+    with patch.object(album_conversion.tgf, "create_page", create_page):
+        for track in tracks:
+            writer.add_track(track)
+        with pytest.raises(telegraph.TelegraphException):
+            writer.song_links()
+
+    # the pages of the album are looked up at once
+    database.get_telegraph_pages.assert_called_once_with(
+        [track["song"]["id"] for track in tracks],
+        users[0]["include_annotations"],
+        users[0]["lyrics_lang"],
+    )
+    # the pages created before the failure can still be reused
+    created = database.add_telegraph_pages.call_args[0][0]
+    assert 0 < len(created) < len(tracks)
+
+
+def test_telegraph_album_writer_abort(full_album):
+    started = threading.Event()
+    release = threading.Event()
+    account = MagicMock()
+
+    def create_page(title, html_content):
+        started.set()
+        release.wait(5)
+        return {"path": title}
+
+    account.create_page.side_effect = create_page
+    writer = album_conversion.TelegraphAlbumWriter(
+        full_album, users[0], account, workers=1
+    )
+    for track in full_album["tracks"][:3]:
+        writer.add_track(track)
+    started.wait(5)
+
+    writer.abort()
+    release.set()
+
+    futures = [future for _, future in writer._pages]
+    # the page being created is finished and the others are cancelled
+    assert futures[0].result(5)
+    assert all(future.cancelled() for future in futures[1:])
+    assert account.create_page.call_count == 1
@@ -1,4 +1,3 @@
-from io import BytesIO
 from zipfile import ZipFile
 
 import pytest
@@ -16,7 +15,7 @@ def files(request, full_album):
     user_data = request.param
     res = album_conversion.create_zip(full_album, user_data)
 
-    assert isinstance(res, BytesIO)
+    assert isinstance(res, album_conversion.zip.AlbumFile)
     assert res.tell() == 0
     assert res.name.endswith(".zip")
 
@@ -41,3 +40,45 @@ def test_create_zip(full_album, files):
                 )
             else:
                 assert annotations_count == 0
+
+
+def test_create_zip_spills_to_disk(full_album):
+    user_data = users[0]
+    res = album_conversion.create_zip(full_album, user_data, max_size=1)
+
+    assert res._rolled
+    assert res.name.endswith(".zip")
+    with ZipFile(res) as zip_file:
+        assert len(zip_file.namelist()) == len(full_album["tracks"])
+
+
+def test_zip_album_writer_release_lyrics(full_album):
+    tracks = [
+        {"number": track["number"], "song": dict(track["song"])}
+        for track in full_album["tracks"]
+    ]
+    writer = album_conversion.ZipAlbumWriter(users[0], release_lyrics=True)
+
+    for track in reversed(tracks):
+        writer.add_track(track)
+    res = writer.close(full_album)
+
+    assert all("lyrics" not in track["song"] for track in tracks)
+    with ZipFile(res) as zip_file:
+        assert len(zip_file.namelist()) == len(tracks)
+
+
+@pytest.mark.parametrize("closed", [True, False])
+def test_zip_album_writer_abort(full_album, closed):
+    writer = album_conversion.ZipAlbumWriter(users[0])
+    writer.add_track(full_album["tracks"][0])
+
+    if closed:
+        res = writer.close(full_album)
+    writer.abort()
+
+    # the file of a closed writer is left to the caller
+    assert writer.file.closed is not closed
+    if closed:
+        with ZipFile(res) as zip_file:
+            assert len(zip_file.namelist()) == 1
@@ -1,11 +1,21 @@
 import json
+import zipfile
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from copy import deepcopy
+from io import BytesIO
 from os.path import join
 from unittest.mock import MagicMock, patch
 
 import pytest
+import requests
+import telegraph
+from bs4 import BeautifulSoup
+from telegram.error import TelegramError, TimedOut, Unauthorized
 
-from geniust import constants
+from benchmarks.upstream import UpstreamServer
+from geniust import api, constants, utils
 from geniust.functions import album
+from geniust.functions.album_conversion.tgf import TELEGRAPH_RETRIES
 
 
 @pytest.mark.parametrize(
@@ -260,33 +270,320 @@ def test_thread_get_album(update_callback_query, context, album_format, develope
 
 
 @pytest.mark.parametrize("album_format", ["pdf", "tgf", "zip", "invalid"])
-def test_get_album(update_callback_query, context, album_format):
+@pytest.mark.parametrize("include_annotations", [True, False])
+def test_get_album(update_callback_query, context, album_format, include_annotations):
     update = update_callback_query
+    context.user_data = {
+        **context.user_data,
+        "include_annotations": include_annotations,
+    }
     language = context.user_data["bot_lang"]
     text = context.bot_data["texts"][language]["get_album"]
     album_id = 1
-    album_search = {"album": "album"}
+    tracks = [{"number": i, "song": {"id": i, "title": f"song {i}"}} for i in (1, 2)]
+    album_stream = {"name": "album", "artist": {"name": "artist"}, "tracks": tracks}
+    context.bot_data["db"].get_album_file.return_value = None
 
     client = MagicMock()
-    client().async_album_search.return_value = album_search
-    convert = MagicMock()
+    client().album_stream.return_value = album_stream
+    writers = {
+        "pdf": MagicMock(),
+        "tgf": MagicMock(),
+        "zip": MagicMock(),
+    }
+
+    listener = MagicMock()
 
     current_module = "geniust.functions.album"
     with patch("geniust.api.GeniusT", client), patch(
-        current_module + ".create_pdf", convert
-    ), patch(current_module + ".create_pages", convert), patch(
-        current_module + ".create_zip", convert
+        current_module + ".PDFAlbumWriter", writers["pdf"]
+    ), patch(current_module + ".TelegraphAlbumWriter", writers["tgf"]), patch(
+        current_module + ".ZipAlbumWriter", writers["zip"]
+    ), patch(
+        current_module + ".ALBUM_PROGRESS_INTERVAL", 0
+    ), patch(
+        "geniust.utils.PROGRESS_LISTENERS", [listener]
     ):
         album.get_album(update, context, album_id, album_format, text)
 
-    if album_search is None or album_format == "invalid":
-        convert.assert_not_called()
-    else:
-        convert.assert_called_once_with(album_search, context.user_data)
+        if album_format == "tgf":
+            # the published pages are reported by the writer
+            writer_kwargs = writers["tgf"].call_args_list[0][1]
+            writer_kwargs["progress"](1, 2)
+
+    for writer_format, writer in writers.items():
+        if writer_format != album_format:
+            writer.assert_not_called()
+            continue
+        # tracks are added in order and then the album is closed
+        writer = writer()
+        assert [call[0][0] for call in writer.add_track.call_args_list] == tracks
+        writer.close.assert_called_once_with(album_stream)
+
+    events = [(x[0][0].stage, x[0][0].done) for x in listener.call_args_list]
+    progress = context.bot.send_message.return_value
+    if album_format == "tgf":
+        writer_kwargs = writers["tgf"].call_args_list[0][1]
+        assert writer_kwargs["database"] == context.bot_data["db"]
+        assert events == [("fetched", 1), ("fetched", 2), ("converted", 1)]
+        assert progress.edit_text.call_args[0][0].split("\n") == [
+            text["progress"]
+            .replace("{stage}", text[stage])
+            .replace("{bar}", utils.progress_bar(done, 2))
+            .replace("{done}", str(done))
+            .replace("{total}", "2")
+            for stage, done in (("downloading", 2), ("publishing", 1))
+        ]
 
-    if album_format == "tgf" and album_search is not None:
-        assert context.bot.send_message.call_args[1]["text"] == convert()
-    elif album_format in ("pdf", "zip") and album_search is not None:
+        link = writers["tgf"]().close()
+        assert context.bot.send_message.call_args[1]["text"] == link
+    elif album_format in ("pdf", "zip"):
+        # the sent file is reused for the same album and preferences
+        # unless it has annotations whose edits don't change the hash
+        add_album_file = context.bot_data["db"].add_album_file
+        if include_annotations:
+            context.bot_data["db"].get_album_file.assert_not_called()
+            add_album_file.assert_not_called()
+        else:
+            add_album_file.assert_called_once_with(
+                album_id,
+                album_format,
+                False,
+                context.user_data["lyrics_lang"],
+                album.album_hash(album_stream),
+                context.bot.send_document.return_value.document.file_id,
+            )
+        assert events == [
+            ("fetched", 1),
+            ("converted", 1),
+            ("fetched", 2),
+            ("converted", 2),
+        ]
         context.bot.send_document.assert_called_once()
     else:
+        client().album_stream.assert_not_called()
         context.bot.send_document.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "error",
+    [utils.PoolBusyError, FutureTimeoutError, requests.HTTPError, requests.Timeout],
+)
+def test_get_album_error(update_callback_query, context, error):
+    update = update_callback_query
+    language = context.user_data["bot_lang"]
+    text = context.bot_data["texts"][language]["get_album"]
+
+    client = MagicMock()
+    client().album_stream.return_value = {
+        "name": "album",
+        "artist": {"name": "artist"},
+        "tracks": [],
+    }
+    context.bot_data["db"].get_album_file.return_value = None
+    writer = MagicMock()
+    writer().close.side_effect = error
+
+    with patch("geniust.api.GeniusT", client), patch(
+        "geniust.functions.album.PDFAlbumWriter", writer
+    ):
+        album.get_album(update, context, 1, "pdf", text)
+
+    progress = context.bot.send_message.return_value
+    if error is utils.PoolBusyError:
+        progress.edit_text.assert_called_with(text["busy"])
+    else:
+        progress.edit_text.assert_called_with(text["failed"])
+    context.bot.send_document.assert_not_called()
+    writer().abort.assert_called_once()
+
+
+@pytest.mark.parametrize("album_format", ["tgf", "zip"])
+def test_get_album_fetch_error(update_callback_query, context, album_format):
+    update = update_callback_query
+    language = context.user_data["bot_lang"]
+    text = context.bot_data["texts"][language]["get_album"]
+
+    client = MagicMock()
+    client().album_stream.return_value = {
+        "name": "album",
+        "artist": {"name": "artist"},
+        "tracks": [{"number": i, "song": {"id": i, "title": "song"}} for i in (1, 2)],
+    }
+    context.bot_data["db"].get_album_file.return_value = None
+    writer = MagicMock()
+    # e.g. the lyrics of the second track couldn't be fetched
+    writer().add_track.side_effect = [None, requests.ConnectionError()]
+    writer_class = "TelegraphAlbumWriter" if album_format == "tgf" else "ZipAlbumWriter"
+
+    with patch("geniust.api.GeniusT", client), patch(
+        "geniust.functions.album." + writer_class, writer
+    ):
+        album.get_album(update, context, 1, album_format, text)
+
+    # the writer is aborted when the album can't be fetched
+    assert writer().add_track.call_count == 2
+    writer().close.assert_not_called()
+    writer().abort.assert_called_once()
+    context.bot.send_message.return_value.edit_text.assert_called_with(text["failed"])
+
+
+def test_get_album_telegraph_error(update_callback_query, context):
+    update = update_callback_query
+    language = context.user_data["bot_lang"]
+    text = context.bot_data["texts"][language]["get_album"]
+    album_stream = {
+        "name": "album",
+        "artist": {"name": "artist"},
+        "cover_art_url": "https://images.genius.com/cover.jpg",
+        "description_annotation": {"annotations": [{"body": {"html": ""}}]},
+        "tracks": [],
+    }
+
+    client = MagicMock()
+    client().album_stream.return_value = album_stream
+    account = MagicMock()
+    account().create_page.side_effect = telegraph.TelegraphException("flood")
+    tgf = "geniust.functions.album_conversion.tgf"
+
+    with patch("geniust.api.GeniusT", client), patch(
+        tgf + ".telegraph.api.Telegraph", account
+    ), patch(tgf + ".TELEGRAPH_RETRY_DELAY", 0), patch(
+        tgf + ".mirror_cover_arts", lambda urls: {url: url for url in urls}
+    ):
+        album.get_album(update, context, 1, "tgf", text)
+
+    assert account().create_page.call_count == TELEGRAPH_RETRIES
+    progress = context.bot.send_message.return_value
+    progress.edit_text.assert_called_with(text["failed"])
+    progress.delete.assert_not_called()
+
+
+@pytest.mark.parametrize("sent", [True, False])
+def test_get_album_cached_file(update_callback_query, context, full_album, sent):
+    update = update_callback_query
+    context.user_data = {**context.user_data, "include_annotations": False}
+    language = context.user_data["bot_lang"]
+    text = context.bot_data["texts"][language]["get_album"]
+    database = context.bot_data["db"]
+    database.get_album_file.return_value = "file_id"
+
+    client = MagicMock()
+    client().album_stream.return_value = full_album
+    writer = MagicMock()
+    if not sent:
+        # e.g. the file was deleted from Telegram
+        context.bot.send_document.side_effect = [TelegramError("error"), MagicMock()]
+
+    with patch("geniust.api.GeniusT", client), patch(
+        "geniust.functions.album.PDFAlbumWriter", writer
+    ):
+        album.get_album(update, context, 1, "pdf", text)
+
+    database.get_album_file.assert_called_once_with(
+        1,
+        "pdf",
+        False,
+        context.user_data["lyrics_lang"],
+        album.album_hash(full_album),
+    )
+    assert context.bot.send_document.call_args_list[0][1]["document"] == "file_id"
+    if sent:
+        writer.assert_not_called()
+        context.bot.send_document.assert_called_once()
+    else:
+        writer().close.assert_called_once()
+        assert context.bot.send_document.call_count == 2
+    context.bot.send_document.side_effect = None
+
+
+def test_album_hash(full_album):
+    album_copy = deepcopy(full_album)
+    assert album.album_hash(album_copy) == album.album_hash(full_album)
+
+    album_copy["tracks"][3]["song"]["lyrics_updated_at"] += 1
+    assert album.album_hash(album_copy) != album.album_hash(full_album)
+
+    # only the tracklist is hashed and not the fetched lyrics
+    tracks = api.AlbumTracks(MagicMock(), full_album["tracks"], False)
+    assert album.album_hash({**full_album, "tracks": tracks}) == album.album_hash(
+        full_album
+    )
+
+
+@pytest.mark.parametrize("error", [TimedOut(), Unauthorized("error")])
+def test_get_album_upload_error(update_callback_query, context, error):
+    update = update_callback_query
+    language = context.user_data["bot_lang"]
+    text = context.bot_data["texts"][language]["get_album"]
+
+    client = MagicMock()
+    client().album_stream.return_value = {
+        "name": "album",
+        "artist": {"name": "artist"},
+        "tracks": [],
+    }
+    context.bot_data["db"].get_album_file.return_value = None
+    writer = MagicMock()
+    file = writer().close.return_value
+    file.name = "album.pdf"
+    context.bot.send_document.side_effect = error
+
+    with patch("geniust.api.GeniusT", client), patch(
+        "geniust.functions.album.PDFAlbumWriter", writer
+    ):
+        if isinstance(error, TimedOut):
+            album.get_album(update, context, 1, "pdf", text)
+        else:
+            with pytest.raises(Unauthorized):
+                album.get_album(update, context, 1, "pdf", text)
+
+    file.close.assert_called_once()
+    progress = context.bot.send_message.return_value
+    if isinstance(error, TimedOut):
+        assert context.bot.send_document.call_count == 5
+        progress.edit_text.assert_called_with(text["failed"])
+    progress.delete.assert_not_called()
+    context.bot_data["db"].add_album_file.assert_not_called()
+    context.bot.send_document.side_effect = None
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    server = UpstreamServer()
+    yield server.start()
+    server.stop()
+
+
+@pytest.mark.parametrize("album_format", ["pdf", "tgf", "zip"])
+def test_get_album_upstream(
+    update_callback_query, context, upstream, full_album, album_format
+):
+    context.user_data = {**context.user_data, "include_annotations": True}
+    language = context.user_data["bot_lang"]
+    text = context.bot_data["texts"][language]["get_album"]
+    context.bot_data["db"].get_telegraph_pages.return_value = {}
+    documents = []
+    context.bot.send_document.side_effect = lambda document, **kwargs: documents.append(
+        document.read()
+    )
+
+    # all the tracks are fetched at the same time
+    with patch("geniust.utils.UPSTREAM_URL", upstream), patch(
+        "geniust.functions.album_conversion.tgf.UPSTREAM_URL", upstream
+    ), patch("geniust.api.available_cores", return_value=len(full_album["tracks"])):
+        album.get_album(update_callback_query, context, 1, album_format, text)
+
+    if album_format == "tgf":
+        pages = context.bot_data["db"].add_telegraph_pages.call_args[0][0]
+        assert len(pages) == len(full_album["tracks"])
+        link = context.bot.send_message.call_args_list[-1][1]["text"]
+        assert link.startswith("https://telegra.ph/")
+    elif album_format == "pdf":
+        assert documents[0].startswith(b"%PDF")
+    else:
+        # the annotations of the lyrics are found
+        with zipfile.ZipFile(BytesIO(documents[0])) as file:
+            lyrics = "".join(file.read(name).decode() for name in file.namelist())
+        annotation = full_album["tracks"][0]["song"]["annotations"]["18612521"]
+        assert BeautifulSoup(annotation, "html.parser").get_text()[:20] in lyrics
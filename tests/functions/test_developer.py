@@ -0,0 +1,139 @@
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import pytest
+
+from geniust.functions import developer
+
+
+@pytest.mark.parametrize(
+    "args, calls, seconds",
+    [
+        ([], developer.PROFILE_CALLS, None),
+        (["5"], 5, None),
+        (["30s"], None, 30.0),
+        (["100000"], developer.PROFILE_MAX_CALLS, None),
+        (["100000s"], None, developer.PROFILE_MAX_SECONDS),
+    ],
+)
+def test_profile(update_message, context, args, calls, seconds):
+    update = update_message
+    context.args = args
+    with patch.object(developer.profiling.PROFILER, "start") as start:
+        developer.profile(update, context)
+
+    kwargs = start.call_args[1]
+    assert kwargs == {"calls": calls, "seconds": seconds}
+    update.message.reply_text.assert_called_once()
+
+
+@pytest.mark.parametrize("active", [True, False])
+def test_profile_stop(update_message, context, active):
+    update = update_message
+    context.args = ["stop"]
+    profiler = developer.profiling.PROFILER
+    active_property = PropertyMock(return_value=active)
+
+    with patch.object(type(profiler), "active", active_property), patch.object(
+        profiler, "stop"
+    ) as stop:
+        developer.profile(update, context)
+
+    if active:
+        stop.assert_called_once()
+    else:
+        stop.assert_not_called()
+        update.message.reply_text.assert_called_once()
+
+
+def test_profile_invalid_argument(update_message, context):
+    update = update_message
+    context.args = ["soon"]
+    with patch.object(developer.profiling.PROFILER, "start") as start:
+        developer.profile(update, context)
+
+    start.assert_not_called()
+    update.message.reply_text.assert_called_once()
+
+
+def test_send_profile_report():
+    bot = MagicMock()
+    report = MagicMock()
+    report.summary.return_value = "<summary>"
+    report.dump.return_value = b"stats"
+
+    developer.send_profile_report(bot, 1, report)
+
+    assert "&lt;summary&gt;" in bot.send_message.call_args[0][1]
+    assert bot.send_document.call_args[0][1].getvalue() == b"stats"
+
+
+@pytest.mark.parametrize(
+    "args, frames", [(["start"], 1), (["start", "5"], 5), (["start", "100"], 25)]
+)
+def test_memory_usage_start(update_message, context, args, frames):
+    update = update_message
+    context.args = args
+    with patch.object(developer.memory.TRACER, "start") as start:
+        developer.memory_usage(update, context)
+
+    start.assert_called_once_with(frames)
+    update.message.reply_text.assert_called_once()
+
+
+@pytest.mark.parametrize("tracing", [True, False])
+def test_memory_usage_stop(update_message, context, tracing):
+    update = update_message
+    context.args = ["stop"]
+    tracer = developer.memory.TRACER
+    tracing_property = PropertyMock(return_value=tracing)
+
+    with patch.object(type(tracer), "tracing", tracing_property), patch.object(
+        tracer, "stop"
+    ) as stop:
+        developer.memory_usage(update, context)
+
+    assert stop.called is tracing
+    update.message.reply_text.assert_called_once()
+
+
+@pytest.mark.parametrize("args", [["soon"], ["start", "0"], ["start", "x"]])
+def test_memory_usage_invalid_argument(update_message, context, args):
+    update = update_message
+    context.args = args
+    with patch.object(developer.memory.TRACER, "start") as start:
+        developer.memory_usage(update, context)
+
+    start.assert_not_called()
+    update.message.reply_text.assert_called_once()
+
+
+@pytest.mark.parametrize("allocations", [None, "<allocations>"])
+def test_memory_usage(update_message, context, allocations):
+    update = update_message
+    report = MagicMock() if allocations else None
+    if report:
+        report.summary.return_value = allocations
+
+    with patch.object(
+        developer.memory, "store_sizes", return_value=[]
+    ) as store_sizes, patch.object(
+        developer.memory.TRACER, "snapshot", return_value=report
+    ):
+        developer.memory_usage(update, context)
+
+    assert store_sizes.call_args[0][1] is developer.MEMORY_CACHES
+    text = context.bot.send_message.call_args[0][1]
+    assert ("&lt;allocations&gt;" in text) is bool(allocations)
+    assert ("/memory start" in text) is not bool(allocations)
+
+
+@pytest.mark.parametrize("length", [10, developer.MESSAGE_MAX_LENGTH + 1])
+def test_send_memory_report(length):
+    bot = MagicMock()
+
+    developer.send_memory_report(bot, 1, "a" * length)
+
+    if length > developer.MESSAGE_MAX_LENGTH:
+        assert bot.send_document.call_args[0][1].getvalue() == b"a" * length
+    else:
+        bot.send_message.assert_called_once()
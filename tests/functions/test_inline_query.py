@@ -1,9 +1,14 @@
-from unittest.mock import create_autospec
+import threading
+from concurrent.futures import Future
+from io import BytesIO
+from unittest.mock import MagicMock, create_autospec, patch
 
 import pytest
+from PIL import Image
 from telegram import InlineQuery, Update
 
-from geniust.functions import inline_query
+from geniust import utils
+from geniust.functions import inline_query, lyric_card
 
 
 @pytest.fixture
@@ -95,3 +100,120 @@ def test_search_users_inline(update, context, query, search_users_dict):
     else:
         articles = update.inline_query.answer.call_args[0][0]
         assert len(articles) == 10
+
+
+def test_lyric_card_inline(update, context, search_lyrics_dict):
+    update.inline_query.query = ".lyric_card throwing stones at my glass house"
+    update.inline_query.offset = ""
+    context.bot_data["genius"].search_lyrics.return_value = search_lyrics_dict
+    slow_card = threading.Event()
+
+    def lyric_card_photo(genius, song_id, found_lyrics, keyboard):
+        assert found_lyrics
+        # the card of the second song isn't ready in time
+        if song_id == 4573439:
+            slow_card.wait(5)
+        return song_id
+
+    with patch(
+        "geniust.functions.inline_query.lyric_card_photo", lyric_card_photo
+    ), patch("geniust.functions.inline_query.LYRIC_CARD_LATENCY_BUDGET", 0.5):
+        inline_query.lyric_card(update, context)
+        slow_card.set()
+        first_page = update.inline_query.answer.call_args
+        update.inline_query.offset = first_page[1]["next_offset"]
+        inline_query.lyric_card(update, context)
+        second_page = update.inline_query.answer.call_args
+        # the pending cards are only sent once
+        inline_query.lyric_card(update, context)
+        third_page = update.inline_query.answer.call_args
+
+    assert 4573439 not in first_page[0][0]
+    assert len(first_page[0][0]) > 0
+    assert second_page[0][0] == [4573439]
+    assert "next_offset" not in second_page[1]
+    assert third_page[0][0] == []
+
+
+def test_answer_lyric_cards_waits_for_first_card(update):
+    busy, slow, slower = Future(), Future(), Future()
+    busy.set_exception(utils.PoolBusyError("busy"))
+    threading.Timer(0.3, slow.set_result, ["card"]).start()
+
+    with patch("geniust.functions.inline_query.LYRIC_CARD_LATENCY_BUDGET", 0.1), patch(
+        "geniust.functions.inline_query.logger"
+    ) as logger:
+        inline_query.answer_lyric_cards(update, [busy, slow, slower], ["article"])
+
+    # the first page isn't empty while the cards are pending
+    args, kwargs = update.inline_query.answer.call_args
+    assert args[0] == ["card"]
+    assert inline_query.PENDING_LYRIC_CARDS.get(kwargs["next_offset"]) == [slower]
+    # a busy pool isn't an error
+    logger.warning.assert_called_once()
+    logger.exception.assert_not_called()
+
+
+def test_answer_lyric_cards_fallback(update):
+    card = Future()
+
+    with patch("geniust.functions.inline_query.LYRIC_CARD_LATENCY_BUDGET", 0.1), patch(
+        "geniust.functions.inline_query.LYRIC_CARD_MAX_LATENCY", 0.2
+    ):
+        inline_query.answer_lyric_cards(update, [card], ["article"])
+
+    args, kwargs = update.inline_query.answer.call_args
+    assert args[0] == ["article"]
+    assert "next_offset" in kwargs
+
+
+def test_lyric_card_photo(context, song_dict, cover_art_path):
+    genius = context.bot_data["genius"]
+    genius.page_data.return_value = {
+        "page_data": {
+            "song": song_dict["song"],
+            "lyrics_data": {
+                "body": {"html": "<p>[Verse]<br>first line<br>second line</p>"}
+            },
+        }
+    }
+    with open(cover_art_path, "rb") as f:
+        genius.download_cover_art.return_value = BytesIO(f.read())
+    card_pool = MagicMock()
+    card_pool.run.side_effect = lambda fn, *args, **kwargs: fn(*args)
+    upload = MagicMock()
+    upload.return_value = {"data": {"url": "url", "thumb": {"url": "thumb"}}}
+
+    with patch("geniust.functions.inline_query.card_pool", card_pool), patch(
+        "geniust.functions.inline_query.upload_to_imgbb", upload
+    ):
+        res = inline_query.lyric_card_photo(genius, 1, ["second line"], None)
+        missing = inline_query.lyric_card_photo(genius, 1, ["missing"], None)
+
+        again = inline_query.lyric_card_photo(genius, 1, ["second line"], None)
+
+    assert res.photo_url == again.photo_url == "url"
+    assert res.thumb_url == "thumb"
+    assert Image.open(upload.call_args[0][0]).format == "JPEG"
+    assert upload.call_args[1]["expiration_date"] == lyric_card.LYRIC_CARD_EXPIRATION
+    assert missing is None
+    # the second card is served from the cache
+    card_pool.run.assert_called_once()
+    # the prepared cover art is cached by its URL in the worker
+    assert card_pool.run.call_args[0][-1] == song_dict["song"]["song_art_image_url"]
+    upload.assert_called_once()
+
+
+def test_lyric_card_photo_cached(context):
+    genius = context.bot_data["genius"]
+    key = lyric_card.lyric_card_key(1, ["Some Line!"], False)
+    card = lyric_card.CachedLyricCard(b"image", url="url", thumb_url="thumb")
+    lyric_card.LYRIC_CARDS.set(key, card)
+
+    res = inline_query.lyric_card_photo(genius, 1, ["some line"], None)
+    card.file_id = "file_id"
+    cached_res = inline_query.lyric_card_photo(genius, 1, ["some line"], None)
+
+    genius.page_data.assert_not_called()
+    assert res.photo_url == "url"
+    assert cached_res.photo_file_id == "file_id"
@@ -0,0 +1,69 @@
+from io import BytesIO
+from unittest.mock import MagicMock
+
+import pytest
+from telegram.error import BadRequest
+
+from geniust.functions import lyric_card
+
+
+@pytest.fixture
+def genius(context, search_lyrics_dict, song_dict, cover_art_path):
+    genius = context.bot_data["genius"]
+    genius.search_lyrics.return_value = search_lyrics_dict
+    genius.page_data.return_value = {
+        "page_data": {
+            "song": song_dict["song"],
+            "lyrics_data": {
+                "body": {
+                    "html": "<p>[Verse]<br>And I'm too fly, Jeff Goldblum<br>"
+                    "Got a glass house in the Palisades, that A-K-A</p>"
+                }
+            },
+        }
+    }
+    with open(cover_art_path, "rb") as f:
+        cover_art = f.read()
+    genius.download_cover_art.side_effect = lambda url: BytesIO(cover_art)
+    return genius
+
+
+def test_lyric_card_key():
+    key = lyric_card.lyric_card_key(1, ["Glass House,", "", "Throwing  stones"], True)
+
+    assert key == (1, ("glass house", "throwing stones"), True, False, "JPEG")
+
+
+def test_search_lyrics_cached(update_message, context, genius):
+    update = update_message
+    update.message.text = "got a glass house in the palisades"
+    update.message.reply_photo.return_value.photo = [MagicMock(file_id="file_id")]
+
+    lyric_card.search_lyrics(update, context)
+    lyric_card.search_lyrics(update, context)
+
+    genius.page_data.assert_called_once()
+    first, second = update.message.reply_photo.call_args_list
+    assert isinstance(first[0][0], BytesIO)
+    assert second[0][0] == "file_id"
+
+
+def test_search_lyrics_invalid_file_id(update_message, context, genius):
+    update = update_message
+    update.message.text = "got a glass house in the palisades"
+    message = MagicMock()
+    message.photo = [MagicMock(file_id="valid")]
+    update.message.reply_photo.side_effect = [
+        message,
+        BadRequest("Wrong file identifier"),
+        message,
+    ]
+
+    lyric_card.search_lyrics(update, context)
+    ((card, _),) = lyric_card.LYRIC_CARDS._items.values()
+    card.file_id = "invalid"
+    lyric_card.search_lyrics(update, context)
+
+    assert update.message.reply_photo.call_args_list[1][0][0] == "invalid"
+    assert isinstance(update.message.reply_photo.call_args[0][0], BytesIO)
+    assert card.file_id == "valid"
@@ -0,0 +1,195 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from geniust.functions import lyric_card_builder as builder
+
+
+@pytest.mark.parametrize("rtl", [builder.LTR, builder.RTL])
+def test_remove_unsupported_glyphs(rtl):
+    text = "Lyrics «ترانه» 😀 漢字\nnext line​"
+    glyphs = builder.ASSETS.load().glyphs[rtl]
+
+    res = builder.remove_unsupported_glyphs(text, rtl)
+
+    expected = "".join(c for c in text if c == "\n" or builder.has_glyphs(glyphs, c))
+    assert res == expected
+    assert "😀" not in res
+    assert "\n" in res
+    # the results are stored in the table
+    assert ord("😀") in builder.ASSETS.glyph_filters[rtl]
+
+
+def test_assets_are_loaded_once():
+    assets = builder.Assets()
+    assert not assets.loaded
+
+    with patch.object(assets, "_load", wraps=assets._load) as load:
+        with ThreadPoolExecutor(4) as executor:
+            res = list(executor.map(lambda _: assets.load(), range(8)))
+
+    load.assert_called_once()
+    assert all(x is assets for x in res)
+    assert set(assets.fonts[builder.RTL]) == set(builder.FONT_SIZES)
+    lyrics_box_offset = assets.offsets[builder.LTR]["lyrics_box_offset"]
+    assert lyrics_box_offset.left > assets.offsets[builder.LTR]["offset"].left
+
+
+def test_font_coverage():
+    coverage = builder.font_coverage(builder.NotoSans)
+
+    assert isinstance(coverage, frozenset)
+    assert ord("A") in coverage
+    assert ord("😀") not in coverage
+
+
+@pytest.mark.parametrize("rtl", [False, True])
+def test_build_lyric_card(cover_art_path, rtl):
+    with open(cover_art_path, "rb") as f:
+        cover_art = f.read()
+    lyrics = "خط اول\nخط دوم" if rtl else "First line\nSecond line 😀"
+
+    res = builder.build_lyric_card(
+        BytesIO(cover_art),
+        lyrics,
+        "Song",
+        ["Artist"],
+        ["Featured Artist"],
+        rtl_lyrics=rtl,
+        rtl_metadata=rtl,
+        format="JPEG",
+    )
+
+    im = Image.open(res)
+    assert im.format == "JPEG"
+    assert im.size == builder.BUILDER_IMAGE_SIZE
+
+
+def test_base_image_is_cached(cover_art_path):
+    builder.BASE_IMAGES.clear()
+    with open(cover_art_path, "rb") as f:
+        cover_art = f.read()
+
+    url = "https://images.genius.com/cover_art.jpg"
+
+    with patch.object(
+        builder, "prepare_cover_art", wraps=builder.prepare_cover_art
+    ) as prepare:
+        for lyrics in ("First card", "Second card"):
+            builder.build_lyric_card(
+                BytesIO(cover_art), lyrics, "Song", ["Artist"], cover_art_url=url
+            )
+        base = builder.base_image(BytesIO(cover_art), url)
+        # cover arts without a URL aren't cached
+        builder.base_image(BytesIO(cover_art))
+
+    assert prepare.call_count == 2
+    assert list(builder.BASE_IMAGES._items) == [url]
+    assert base.size == builder.BUILDER_IMAGE_SIZE
+    # drawing on the cards doesn't change the cached image
+    assert base.tobytes() == builder.prepare_cover_art(cover_art).tobytes()
+
+
+@pytest.mark.parametrize(
+    "size, image_format, decoded_size",
+    [
+        ((512, 512), "JPEG", (512, 512)),
+        ((2000, 2000), "JPEG", (1000, 1000)),
+        ((3000, 3000), "JPEG", (1500, 1500)),
+        ((3000, 3000), "PNG", (1000, 1000)),
+    ],
+)
+def test_decode_cover_art(cover_art_path, size, image_format, decoded_size):
+    data = BytesIO()
+    Image.open(cover_art_path).resize(size).save(data, image_format)
+
+    im, original_size = builder.decode_cover_art(data.getvalue())
+
+    assert original_size == size
+    assert im.size == decoded_size
+    assert im.mode == "RGB"
+    assert builder.prepare_cover_art(data.getvalue()).size == (
+        builder.BUILDER_IMAGE_SIZE
+    )
+
+
+@pytest.mark.parametrize("rtl", [False, True])
+def test_layout_card(rtl):
+    builder.layout_lyrics.cache_clear()
+    builder.layout_metadata.cache_clear()
+    lyrics = "خط اول\nخط دوم" if rtl else "First line\n" + "long line " * 5
+
+    res = builder.layout_card(
+        lyrics, "Song", ["Artist"], ["Featured"], rtl_lyrics=rtl, rtl_metadata=rtl
+    )
+    again = builder.layout_card(
+        lyrics, "Song", ["Artist"], ["Featured"], rtl_lyrics=rtl, rtl_metadata=rtl
+    )
+
+    assert again == res
+    assert builder.layout_lyrics.cache_info().hits == 1
+    assert builder.layout_metadata.cache_info().hits == 1
+    boxes = [x.box for x in res if x.box is not None]
+    # one box for each wrapped line, each one below the previous one
+    assert len(boxes) == (2 if rtl else 3)
+    assert all(a[1].top <= b[0].top for a, b in zip(boxes, boxes[1:]))
+    # the metadata come after the lyrics
+    assert [x.font for x in res[len(boxes) :]] == [
+        "metadata_big",
+        "featured_artists_big",
+    ]
+    assert res[-2].position.top > boxes[-1][1].top
+
+
+def test_layout_reused_across_cover_arts(cover_art_path):
+    builder.layout_lyrics.cache_clear()
+    with open(cover_art_path, "rb") as f:
+        original = f.read()
+    data = BytesIO()
+    Image.open(cover_art_path).resize((600, 600)).save(data, "JPEG")
+
+    for cover_art in (original, data.getvalue()):
+        builder.build_lyric_card(BytesIO(cover_art), "Same lyrics", "Song", ["A"])
+
+    info = builder.layout_lyrics.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "WEBP", "PNG"])
+def test_encode_image(cover_art_path, image_format):
+    im = Image.open(cover_art_path).convert("RGB")
+
+    res = builder.encode_image(im, image_format.lower(), quality=90)
+    low = builder.encode_image(im, image_format, quality=builder.CARD_MIN_QUALITY)
+
+    assert Image.open(res).format == image_format
+    if image_format == "PNG":
+        assert res.getvalue() == low.getvalue()
+    else:
+        assert len(low.getvalue()) < len(res.getvalue())
+
+
+def test_encode_image_byte_budget(cover_art_path):
+    im = Image.open(cover_art_path).convert("RGB")
+    sizes = {
+        quality: len(builder.encode_image(im, "JPEG", quality).getvalue())
+        for quality in (60, builder.CARD_MIN_QUALITY)
+    }
+    plain_sizes = {}
+    for quality in (60, 61):
+        plain = BytesIO()
+        im.save(plain, "JPEG", quality=quality)
+        plain_sizes[quality] = len(plain.getvalue())
+
+    res = builder.encode_image(im, "JPEG", 90, max_bytes=plain_sizes[60])
+    smallest = builder.encode_image(im, "JPEG", 90, max_bytes=1)
+
+    # the highest quality whose plain encoding fits in the budget is chosen
+    # and the optimized encoding of it is smaller
+    assert plain_sizes[61] > plain_sizes[60]
+    assert len(res.getvalue()) == sizes[60] <= plain_sizes[60]
+    assert len(smallest.getvalue()) == sizes[builder.CARD_MIN_QUALITY]
+    assert Image.open(res).info.get("progressive") == 1
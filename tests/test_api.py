@@ -1,9 +1,12 @@
 import json
 import re
+import time
+from copy import deepcopy
 from os.path import join
 from unittest.mock import AsyncMock, MagicMock, create_autospec, patch
 
 import pytest
+import requests
 from bs4 import BeautifulSoup
 from telethon import TelegramClient
 
@@ -64,11 +67,11 @@ def test_song_annotations(referents, text_format):
     assert isinstance(res, dict)
 
     for key, value in res.items():
-        assert isinstance(key, int)
+        assert isinstance(key, str)
         assert isinstance(value, str)
 
     for referent in referents["referents"]:
-        assert referent["id"] in res.keys()
+        assert str(referent["id"]) in res.keys()
 
 
 @pytest.mark.parametrize("include_annotations", [True, False])
@@ -113,6 +116,33 @@ def test_get_channel():
     assert res is not None
 
 
+@pytest.mark.parametrize(
+    "upstream, url",
+    [
+        (None, "https://genius.com/api/songs/1"),
+        ("http://localhost:8000", "http://localhost:8000/genius.com/api/songs/1"),
+    ],
+)
+def test_use_upstream(upstream, url):
+    session = api.use_upstream(requests.Session())
+    response = MagicMock(status_code=200)
+    count = api.metrics.UPSTREAM_SECONDS._values.get(("genius.com", "/api/songs/:id"))
+
+    with patch("geniust.utils.UPSTREAM_URL", upstream), patch(
+        "requests.adapters.HTTPAdapter.send", return_value=response
+    ) as send:
+        request = requests.Request("GET", "https://genius.com/api/songs/1")
+        res = session.get_adapter("https://genius.com").send(request.prepare())
+
+    assert res is response
+    assert send.call_args[0][0].url == url
+    # the request is recorded with its original URL
+    _, _, new_count = api.metrics.UPSTREAM_SECONDS._values[
+        ("genius.com", "/api/songs/:id")
+    ]
+    assert new_count == (count[2] if count else 0) + 1
+
+
 @pytest.fixture
 def album_tracks(data_path):
     with open(join(data_path, "album_tracks.json"), "r") as f:
@@ -157,6 +187,61 @@ def test_async_album_search(album_dict):
     client.search_album.assert_called_once_with(album["id"], True, queue)
 
 
+def test_album_stream(album_dict, album_tracks):
+    client = MagicMock()
+    client.album.return_value = deepcopy(album_dict)
+    client.album_tracks.return_value = album_tracks
+
+    res = api.GeniusT.album_stream(client, album_dict["album"]["id"], True)
+
+    assert res["id"] == album_dict["album"]["id"]
+    assert isinstance(res["tracks"], api.AlbumTracks)
+    assert len(res["tracks"]) == len(album_tracks["tracks"])
+    # no track is fetched until the tracks are iterated
+    client.fetch.assert_not_called()
+
+
+def test_album_tracks(album_tracks):
+    tracks = deepcopy(album_tracks["tracks"])
+    delays = {id(track): 0.01 * (len(tracks) - i) for i, track in enumerate(tracks)}
+    genius = MagicMock()
+
+    def fetch(track, include_annotations):
+        # the first tracks take the longest to fetch
+        time.sleep(delays[id(track)])
+        track["fetched"] = include_annotations
+
+    genius.fetch.side_effect = fetch
+
+    res = list(api.AlbumTracks(genius, tracks, include_annotations=True, workers=4))
+
+    assert res == tracks
+    assert all(track["fetched"] for track in res)
+    assert genius.fetch.call_count == len(tracks)
+
+
+def test_album_tracks_error(album_tracks):
+    tracks = album_tracks["tracks"]
+    genius = MagicMock()
+
+    def fetch(track, include_annotations):
+        if track is tracks[1]:
+            raise requests.HTTPError()
+        elif track is not tracks[0]:
+            time.sleep(0.1)
+
+    genius.fetch.side_effect = fetch
+
+    res = iter(api.AlbumTracks(genius, tracks, include_annotations=False, workers=1))
+
+    assert next(res) == tracks[0]
+    with pytest.raises(requests.HTTPError):
+        next(res)
+    # only the track that was being fetched is waited for
+    # and the pending tracks are cancelled
+    assert genius.fetch.call_count == 3
+
+
 def test_telegram_annotation(annotation):
     annotation = annotation["annotation"]["body"]["html"]
     returned_annotation, preview = api.telegram_annotation(annotation)
@@ -172,7 +172,9 @@ def test_main():
         current_module + ".Database", database
     ), patch(
         current_module + ".Recommender", recommender
-    ):
+    ), patch(
+        current_module + ".lyric_card_builder.card_pool"
+    ) as card_pool:
         warnings.filterwarnings("ignore", category=UserWarning)
         bot.main()
 
@@ -182,3 +184,4 @@ def test_main():
     updater.dispatcher.bot.set_my_commands.assert_called_once()
     updater.start_polling.assert_called_once()
     updater.idle.assert_called_once()
+    card_pool.start.assert_called_once()
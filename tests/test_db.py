@@ -4,7 +4,7 @@ import pytest
 import sqlalchemy
 
 from geniust import db, get_user
-from geniust.db import Preferences, Users
+from geniust.db import Preferences, TelegraphPages, Users
 
 
 @pytest.fixture(scope="function")
@@ -155,3 +155,40 @@ def test_delete_preferences(database):
         pref = session.get(Preferences, 1)
 
     assert pref is None
+
+
+def test_telegraph_pages(database):
+    database.add_telegraph_pages(
+        {(1, "hash"): "page-1", (2, "hash"): "page-2"}, True, "English"
+    )
+    # updating an existing page
+    database.add_telegraph_pages({(1, "hash"): "page-1-new"}, True, "English")
+
+    res = database.get_telegraph_pages([1, 2, 3], True, "English")
+    assert res == {(1, "hash"): "page-1-new", (2, "hash"): "page-2"}
+
+    assert database.get_telegraph_pages([1, 2], False, "English") == {}
+    assert database.get_telegraph_pages([1, 2], True, "Non-English") == {}
+
+    # a new page of a song replaces its old one
+    database.add_telegraph_pages({(1, "new-hash"): "page-1-edited"}, True, "English")
+    res = database.get_telegraph_pages([1], True, "English")
+    assert res == {(1, "new-hash"): "page-1-edited"}
+    with database.Session() as session:
+        assert session.query(TelegraphPages).count() == 2
+
+
+def test_album_files(database):
+    database.add_album_file(1, "pdf", True, "English", "hash", "file-1")
+    database.add_album_file(1, "zip", True, "English", "hash", "file-2")
+
+    assert database.get_album_file(1, "pdf", True, "English", "hash") == "file-1"
+    assert database.get_album_file(1, "zip", True, "English", "hash") == "file-2"
+    assert database.get_album_file(1, "pdf", False, "English", "hash") is None
+    assert database.get_album_file(1, "pdf", True, "Non-English", "hash") is None
+
+    # the album has changed since it was sent
+    assert database.get_album_file(1, "pdf", True, "English", "new-hash") is None
+    database.add_album_file(1, "pdf", True, "English", "new-hash", "file-3")
+    assert database.get_album_file(1, "pdf", True, "English", "new-hash") == "file-3"
+    assert database.get_album_file(1, "pdf", True, "English", "hash") is None
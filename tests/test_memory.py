@@ -0,0 +1,95 @@
+import sys
+from io import BytesIO
+from unittest.mock import MagicMock
+
+import pytest
+from PIL import Image
+from telegram.ext import ConversationHandler
+
+from geniust import memory, utils
+
+
+@pytest.fixture
+def tracer():
+    tracer = memory.MemoryTracer()
+    yield tracer
+    if tracer.tracing:
+        tracer.stop()
+
+
+@pytest.mark.parametrize(
+    "size, sign, expected",
+    [
+        (512, False, "512 B"),
+        (1536, False, "1.5 KiB"),
+        (-3 * 1024 ** 2, True, "-3.0 MiB"),
+        (2 * 1024 ** 4, False, "2048.0 GiB"),
+    ],
+)
+def test_format_size(size, sign, expected):
+    assert memory.format_size(size, sign=sign) == expected
+
+
+def test_deep_sizeof():
+    image = BytesIO(b"0" * 100_000)
+    shared = ["x" * 1000]
+    data = {"lyric_card": image, "a": shared, "b": shared}
+
+    size = memory.deep_sizeof(data)
+
+    assert size > 100_000 + 1000
+    # the shared list is counted once
+    assert size < 100_000 + 2000 + sys.getsizeof(data) + 1000
+    assert memory.deep_sizeof(Image.new("RGB", (100, 100))) >= 30_000
+    assert memory.deep_sizeof(utils.LRUCache(1)) > 0
+
+
+def test_store_sizes():
+    conversation = ConversationHandler([], {}, [])
+    conversation.conversations[(1, 1)] = 0
+    job = MagicMock()
+    job.context = (b"0" * 1000, 1)
+    dispatcher = MagicMock()
+    dispatcher.handlers = {0: [conversation, MagicMock()]}
+    dispatcher.user_data = {1: {"lyric_card": BytesIO(b"0" * 1000)}, 2: {}}
+    dispatcher.chat_data = {}
+    dispatcher.bot_data = {"texts": {"en": {}}, "db": object()}
+    dispatcher.job_queue.jobs.return_value = (job,)
+    cache = utils.LRUCache(10)
+    cache.set("key", "value")
+
+    sizes = memory.store_sizes(
+        dispatcher, {"cache": cache, "deep_links": utils.deep_linked_url}
+    )
+
+    sizes = {store.name: store for store in sizes}
+    assert sizes["user_data"].items == 2
+    assert sizes["user_data"].size > 1000
+    assert sizes["conversations"].items == 1
+    assert sizes["job_queue"].items == 1
+    assert sizes["job_queue"].size > 1000
+    assert sizes["bot_data[texts]"].items == 1
+    assert sizes["bot_data[db]"].items is None
+    assert sizes["cache"].items == 1
+    assert sizes["deep_links"].size is None
+    table = memory.format_store_sizes(list(sizes.values()))
+    assert "bot_data[db]" in table and "?" in table
+
+
+def test_tracer(tracer):
+    assert tracer.snapshot() is None
+    assert tracer.start()
+    assert not tracer.start()
+
+    leak = [bytearray(1000) for _ in range(1000)]
+    report = tracer.snapshot()
+
+    assert report.previous is not None
+    assert report.traced >= 1_000_000
+    summary = report.summary(limit=5)
+    assert "test_memory.py" in summary
+    assert "since the previous snapshot" in summary
+    tracer.stop()
+    assert not tracer.tracing
+    assert tracer.snapshot() is None
+    del leak
@@ -0,0 +1,133 @@
+import pytest
+
+from geniust import metrics, utils
+
+
+def test_counter():
+    registry = []
+    counter = metrics.Counter("test_total", "Test.", ("a",), registry=registry)
+
+    counter.inc(a="x")
+    counter.inc(2, a="x")
+    counter.inc(a='"y"\n')
+
+    assert metrics.render(registry) == (
+        "# HELP test_total Test.\n"
+        "# TYPE test_total counter\n"
+        'test_total{a="x"} 3\n'
+        'test_total{a="\\"y\\"\\n"} 1\n'
+    )
+    with pytest.raises(ValueError):
+        counter.inc(b="x")
+
+
+def test_gauge():
+    registry = []
+    gauge = metrics.Gauge("test", "Test.", registry=registry)
+
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    assert metrics.render(registry).endswith("test 1\n")
+
+
+def test_histogram():
+    registry = []
+    histogram = metrics.Histogram(
+        "test_seconds", "Test.", ("a",), buckets=(1, 0.5), registry=registry
+    )
+
+    histogram.observe(0.25, a="x")
+    histogram.observe(0.75, a="x")
+    histogram.observe(2, a="x")
+
+    lines = metrics.render(registry).splitlines()
+    assert lines[2:] == [
+        'test_seconds_bucket{a="x",le="0.5"} 1',
+        'test_seconds_bucket{a="x",le="1"} 2',
+        'test_seconds_bucket{a="x",le="+Inf"} 3',
+        'test_seconds_sum{a="x"} 3',
+        'test_seconds_count{a="x"} 3',
+    ]
+
+
+def test_track():
+    registry = []
+    histogram = metrics.Histogram("s", "Test.", ("a",), registry=registry)
+    errors = metrics.Counter("e", "Test.", ("a", "error"), registry=registry)
+    in_progress = metrics.Gauge("p", "Test.", ("a",), registry=registry)
+
+    with metrics.track(histogram, errors, in_progress, a="x"):
+        assert in_progress._values[("x",)] == 1
+    with pytest.raises(KeyError):
+        with metrics.track(histogram, errors, in_progress, a="x"):
+            raise KeyError
+
+    assert histogram._values[("x",)][2] == 2
+    assert errors._values == {("x", "KeyError"): 1}
+    assert in_progress._values[("x",)] == 0
+
+
+@pytest.mark.parametrize(
+    "url, endpoint",
+    [
+        ("https://api.genius.com/songs/1?text_format=html", "/songs/:id"),
+        ("https://genius.com/Machine-gun-kelly-glass-house-lyrics", "/:id"),
+        ("https://api.telegra.ph/editPage/t-123", "/editPage/:id"),
+        ("https://genius.com/api/page_data/song", "/api/page_data/song"),
+    ],
+)
+def test_upstream_endpoint(url, endpoint):
+    assert metrics.upstream_endpoint(url)[1] == endpoint
+
+
+def test_log_records_handler():
+    def handler():
+        raise ValueError
+
+    key = ("test_metrics.test_log_records_handler.<locals>.handler",)
+
+    with pytest.raises(ValueError):
+        utils.log(handler)()
+
+    assert metrics.HANDLER_SECONDS._values[key][2] == 1
+    assert metrics.HANDLER_ERRORS._values[key + ("ValueError",)] == 1
+
+
+def test_log_records_outermost_handler():
+    @utils.log
+    def helper():
+        pass
+
+    @utils.log
+    def handler():
+        helper()
+
+    prefix = "test_metrics.test_log_records_outermost_handler.<locals>."
+
+    handler()
+    handler()
+
+    assert metrics.HANDLER_SECONDS._values[(prefix + "handler",)][2] == 2
+    # the nested calls are part of the handler
+    assert (prefix + "helper",) not in metrics.HANDLER_SECONDS._values
+
+
+def test_record_progress():
+    event = utils.ProgressEvent("album", "fetched", 1, 2, 0)
+    key = ("album", "fetched")
+    count = metrics.JOB_ITEMS._values.get(key, 0)
+
+    metrics.record_progress(event)
+
+    assert metrics.JOB_ITEMS._values[key] == count + 1
+
+
+def test_record_upstream_status():
+    url = "https://api.imgbb.com/1/upload"
+
+    metrics.record_upstream_status(url, 200)
+    metrics.record_upstream_status(url, 429)
+
+    assert metrics.UPSTREAM_ERRORS._values[("api.imgbb.com", "/:id/upload", "429")]
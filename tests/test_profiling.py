@@ -0,0 +1,77 @@
+import marshal
+import threading
+
+import pytest
+
+from geniust import profiling, utils
+
+
+@pytest.fixture
+def profiler():
+    profiler = profiling.HandlerProfiler()
+    yield profiler
+    profiler.stop()
+
+
+def start(profiler, **kwargs):
+    reports = []
+    done = threading.Event()
+
+    def on_done(report):
+        reports.append(report)
+        done.set()
+
+    assert profiler.start(on_done, **kwargs)
+    return reports, done
+
+
+def handler(n):
+    return sum(range(n))
+
+
+def test_profiler_calls(profiler):
+    reports, done = start(profiler, calls=2)
+
+    # the nested call is part of its caller's profile
+    assert profiler.profile("outer", profiler.profile, "inner", handler, 10) == 45
+    assert not profiler.start(lambda report: None)
+    profiler.profile("handler", handler, 10)
+    profiler.profile("handler", handler, 10)
+
+    assert done.wait(5)
+    (report,) = reports
+    assert report.calls == {"outer": 1, "handler": 1}
+    assert not profiler.active
+    summary = report.summary(limit=5)
+    assert "2 calls" in summary
+    assert "handler" in summary
+    assert marshal.loads(report.dump()) == report.stats.stats
+
+
+def test_profiler_seconds(profiler):
+    reports, done = start(profiler, seconds=0.1)
+
+    with pytest.raises(ZeroDivisionError):
+        profiler.profile("handler", lambda: 1 / 0)
+
+    assert done.wait(5)
+    assert reports[0].calls == {"handler": 1}
+
+
+def test_profiler_stop_without_calls(profiler):
+    reports, done = start(profiler)
+
+    profiler.stop()
+
+    assert done.wait(5)
+    assert reports[0].calls == {}
+    assert "0 calls" in reports[0].summary()
+
+
+def test_log_profiles_handler():
+    reports, done = start(profiling.PROFILER, calls=1)
+
+    utils.log(handler)(10)
+
+    assert done.wait(5)
+    assert reports[0].calls == {"test_profiling.handler": 1}
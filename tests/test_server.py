@@ -5,7 +5,7 @@ import tekore as tk
 from requests import HTTPError
 
 from geniust.db import Database
-from geniust.server import CronHandler, TokenHandler
+from geniust.server import CronHandler, MetricsHandler, TokenHandler
 
 
 class TestCronHandler:
@@ -17,6 +17,35 @@ class TestCronHandler:
         handler.write.assert_called_once()
 
 
+class TestMetricsHandler:
+    @pytest.mark.parametrize(
+        "token, authorization, status",
+        [
+            ("token", "Bearer token", None),
+            ("token", "Bearer wrong", 403),
+            ("token", None, 403),
+            (None, "Bearer None", 404),
+        ],
+    )
+    def test_metrics_handler(self, token, authorization, status):
+        handler = MagicMock()
+        handler.token = token
+        handler.request.headers = (
+            {"Authorization": authorization} if authorization else {}
+        )
+
+        MetricsHandler.get(handler)
+
+        if status is not None:
+            handler.send_error.assert_called_once_with(status)
+            handler.write.assert_not_called()
+            return
+        handler.write.assert_called_once()
+        assert (
+            "# TYPE geniust_handler_seconds histogram" in handler.write.call_args[0][0]
+        )
+
+
 class TestTokenHandler:
     @pytest.mark.parametrize(
         "state",
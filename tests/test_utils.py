@@ -1,11 +1,16 @@
+import math
 import os
 import re
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from io import BytesIO
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, create_autospec, patch
 
 import pytest
 from bs4 import BeautifulSoup
 from PIL import Image
+from telegram import Bot
+from telegram.error import BadRequest
 from telegram.utils.helpers import create_deep_linked_url
 
 from geniust import api, bot, utils
@@ -65,6 +70,36 @@ def test_deep_link(download, platform):
     assert name in res
 
 
+def test_deep_link_memoized():
+    utils.deep_linked_url.cache_clear()
+
+    with patch("geniust.username", "test_bot"):
+        first = utils.deep_link("name", 1, "artist")
+        second = utils.deep_link("other name", "1", "artist")
+    with patch("geniust.username", "other_bot"):
+        third = utils.deep_link("name", 1, "artist")
+
+    info = utils.deep_linked_url.cache_info()
+    assert first.replace("name", "") == second.replace("other name", "")
+    assert "other_bot" in third
+    assert info.hits == 1
+    assert info.misses == 2
+
+
+def test_deep_links():
+    entities = [{"id": 1, "title": "a"}, {"id": 2, "title": "b"}]
+
+    with patch("geniust.username", "test_bot"):
+        res = utils.deep_links(
+            entities, "song", template="{id}. {link}", sep="\n", name_key="title"
+        )
+
+    lines = res.split("\n")
+    assert len(lines) == 2
+    assert lines[0].startswith("1. <a") and lines[0].endswith(">a</a>")
+    assert lines[1].startswith("2. <a") and lines[1].endswith(">b</a>")
+
+
 def test_remove_unsupported_tags():
     html = "<a>t</a>" "<b>t</b>" "<img>" "<u>t</u>" "<invalid>t</invalid>"
     soup = BeautifulSoup(html, "html.parser")
@@ -237,3 +272,169 @@ def test_log():
 
     func.assert_called_once_with(1, 2, a="a")
     assert logger().debug.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "done, total, bar", [(0, 4, "▱▱▱▱"), (2, 4, "▰▰▱▱"), (4, 4, "▰▰▰▰")]
+)
+def test_progress_bar(done, total, bar):
+    assert utils.progress_bar(done, total, length=4) == bar
+
+
+def test_lru_cache():
+    cache = utils.LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # "a" becomes the most recently used item, so "b" is evicted
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+    cache.pop("a")
+    assert cache.get("a", "default") == "default"
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_cache_expiration():
+    cache = utils.LRUCache(maxsize=10, ttl=10)
+
+    with patch("time.monotonic", return_value=0):
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=100)
+
+    with patch("time.monotonic", return_value=50):
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_worker_pool():
+    pool = utils.WorkerPool(workers=1, max_pending=1)
+    try:
+        pool.start()
+        future = pool.submit(time.sleep, 0.5)
+        # the only slot is taken by the pending job
+        with pytest.raises(utils.PoolBusyError):
+            pool.submit(math.factorial, 5)
+        # the job waits for the pending one to finish
+        assert pool.run(math.factorial, 5, slot_timeout=30) == 120
+        assert future.done()
+
+        assert pool.run(math.factorial, 5, timeout=30) == 120
+        with pytest.raises(FutureTimeoutError):
+            pool.run(time.sleep, 1, timeout=0.1)
+    finally:
+        pool.shutdown()
+
+
+def test_progress_reporter():
+    report = MagicMock()
+    listener = MagicMock()
+    reporter = utils.ProgressReporter("job", report, interval=10, listeners=[listener])
+
+    with patch("time.monotonic", return_value=0):
+        reporter.update("fetched", 1, 3)
+        reporter.update("converted", 1, 3)
+    with patch("time.monotonic", return_value=5):
+        reporter.update("fetched", 2, 3)
+    with patch("time.monotonic", return_value=10):
+        reporter.update("fetched", 3, 3)
+
+    # reports are throttled, but the listener gets all the events
+    assert [call[0][0] for call in report.call_args_list] == [
+        {"fetched": (1, 3)},
+        {"fetched": (3, 3), "converted": (1, 3)},
+    ]
+    events = [call[0][0] for call in listener.call_args_list]
+    assert [(x.stage, x.done, x.time) for x in events] == [
+        ("fetched", 1, 0),
+        ("converted", 1, 0),
+        ("fetched", 2, 5),
+        ("fetched", 3, 10),
+    ]
+    assert all(x.job == "job" and x.total == 3 for x in events)
+
+
+def test_progress_reporter_out_of_order():
+    report = MagicMock()
+    reporter = utils.ProgressReporter("job", report, interval=0)
+
+    reporter.update("converted", 2, 3)
+    reporter.update("converted", 1, 3)
+
+    assert report.call_args[0][0] == {"converted": (2, 3)}
+    assert reporter.stages == {"converted": (2, 3)}
+
+
+def test_progress_reporter_listener_error():
+    report = MagicMock()
+    listener = MagicMock(side_effect=ValueError)
+
+    with patch("geniust.utils.PROGRESS_LISTENERS", [listener]):
+        utils.ProgressReporter("job", report, interval=0).update("fetched", 1, 1)
+
+    listener.assert_called_once()
+    report.assert_called_once_with({"fetched": (1, 1)})
+
+
+def test_send_photo():
+    bot = create_autospec(Bot, spec_set=True)
+    genius = MagicMock()
+    url = "https://images.genius.com/image.webp"
+    bot.send_photo.return_value.photo = [
+        MagicMock(file_id="small"),
+        MagicMock(file_id="large"),
+    ]
+
+    with patch("geniust.utils.fix_image_format") as fix_image_format:
+        utils.send_photo(bot, 1, url, "caption", genius=genius, reply_markup=None)
+        utils.send_photo(bot, 2, url, "caption", genius=genius)
+
+    # the photo is only converted the first time
+    fix_image_format.assert_called_once_with(genius, url)
+    first, second = bot.send_photo.call_args_list
+    assert first[0] == (1, fix_image_format.return_value, "caption")
+    assert first[1] == {"reply_markup": None}
+    assert second[0] == (2, "large", "caption")
+
+
+def test_send_photo_invalid_file_id():
+    bot = create_autospec(Bot, spec_set=True)
+    url = "https://images.genius.com/image.jpg"
+    utils.PHOTO_FILE_IDS.set(url, "invalid")
+    message = MagicMock()
+    message.photo = [MagicMock(file_id="valid")]
+    bot.send_photo.side_effect = [BadRequest("Wrong file identifier"), message]
+
+    res = utils.send_photo(bot, 1, url)
+
+    assert res is message
+    assert bot.send_photo.call_args[0][1] == url
+    assert utils.PHOTO_FILE_IDS.get(url) == "valid"
+
+
+@pytest.mark.parametrize(
+    "url, result",
+    [
+        (
+            "https://api.genius.com/songs/1",
+            "http://localhost:8000/api.genius.com/songs/1",
+        ),
+        (
+            "https://genius.com/api/search?q=a",
+            "http://localhost:8000/genius.com/api/search?q=a",
+        ),
+        ("http://localhost:8000/genius.com/", "http://localhost:8000/genius.com/"),
+    ],
+)
+def test_upstream_url(url, result):
+    assert utils.upstream_url(url) == url
+
+    with patch("geniust.utils.UPSTREAM_URL", "http://localhost:8000/"):
+        assert utils.upstream_url(url) == result